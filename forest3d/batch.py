@@ -0,0 +1,317 @@
+"""Functions for processing many forest inventory plots in parallel."""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+import traceback
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+from rasterio.errors import RasterioError
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.optimization import RegistrationObjective, _read_raster_window
+from forest3d.utils.elevation import cache_raster
+from forest3d.utils.raster import CrownRasterizer, RasterGrid
+
+STEPS = ("clip", "normalize", "simulate", "register")
+
+PlotResult = namedtuple(
+    "PlotResult", ["plot_id", "status", "seconds", "outputs", "error"]
+)
+
+# errors caused by the data of a single plot, e.g., a plot without trees or
+# outside the rasters, or a raster that cannot be read. These are recorded
+# for the plot, and the remaining plots are still processed, while any other
+# error is a bug that stops the whole run.
+PLOT_ERRORS = (ValueError, OSError, RasterioError)
+
+# tree list and settings shared by every plot a worker process runs, see
+# `_init_batch_worker`
+_worker_config = None
+
+
+def _write_raster(
+    path: str | os.PathLike, values: np.ndarray, grid: RasterGrid, crs
+) -> None:
+    """Writes a single-band GeoTIFF, with NaN as nodata."""
+    profile = {
+        "driver": "GTiff",
+        "height": grid.shape[0],
+        "width": grid.shape[1],
+        "count": 1,
+        "dtype": "float32",
+        "transform": grid.transform,
+        "crs": crs,
+        "nodata": np.nan,
+        "compress": "deflate",
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(values.astype(np.float32), 1)
+
+
+def _init_batch_worker(config: dict) -> None:
+    """Keeps the tree list and settings in a worker process for every plot."""
+    global _worker_config
+    _worker_config = config
+
+
+def _run_pipeline(plot_id: str, plot: shapely.Geometry, outputs: dict) -> None:
+    """Runs the steps of the pipeline for a plot, recording output paths."""
+    config = _worker_config
+    steps = config["steps"]
+    plot_dir = outputs["plot_dir"]
+
+    trees = config["trees"]
+    if "clip" in steps:
+        trees = trees[shapely.contains_xy(plot, trees["stem_x"], trees["stem_y"])]
+        if trees.empty:
+            message = f"No trees fall within plot {plot_id}."
+            raise ValueError(message)
+        outputs["trees"] = os.path.join(plot_dir, "trees.csv")
+        trees.to_csv(outputs["trees"], index=False)
+
+    bounds = plot.buffer(config["buffer"]).bounds
+    chm, grid = _read_raster_window(
+        config["surface_path"], bounds, config["memmap"], config["cache_dir"]
+    )
+    if chm.size == 0:
+        message = f"Plot {plot_id} does not overlap {config['surface_path']}."
+        raise ValueError(message)
+    if "normalize" in steps:
+        dem, dem_grid = _read_raster_window(
+            config["dem_path"], bounds, config["memmap"], config["cache_dir"]
+        )
+        if dem_grid.shape != grid.shape or not np.allclose(
+            (*dem_grid.origin, dem_grid.cell_size), (*grid.origin, grid.cell_size)
+        ):
+            message = "The DEM must have the same grid as the surface raster."
+            raise ValueError(message)
+        chm -= dem
+        outputs["chm"] = os.path.join(plot_dir, "chm.tif")
+        _write_raster(outputs["chm"], chm, grid, config["crs"])
+
+    if "simulate" not in steps and "register" not in steps:
+        return
+    rasterizer = CrownRasterizer.from_tree_list(trees)
+    center = np.array(plot.centroid.coords[0])
+
+    if "simulate" in steps:
+        outputs["simulated"] = os.path.join(plot_dir, "simulated.tif")
+        simulated = rasterizer.rasterize(grid, center=center)
+        _write_raster(outputs["simulated"], simulated, grid, config["crs"])
+
+    if "register" in steps:
+        objective = RegistrationObjective(rasterizer, chm, grid, center=center)
+        result = objective.pyramid_search(**config["search"])
+        outputs["registration"] = os.path.join(plot_dir, "registration.json")
+        with open(outputs["registration"], "w") as f:
+            json.dump(
+                {
+                    "dx": result.dx,
+                    "dy": result.dy,
+                    "rotation": result.rotation,
+                    "correlation": result.correlation,
+                    "center": center.tolist(),
+                    "levels": [level._asdict() for level in result.levels],
+                },
+                f,
+                indent=2,
+            )
+
+
+def _process_plot(plot_id: str, plot: shapely.Geometry) -> PlotResult:
+    """Processes a single plot, recording rather than raising PLOT_ERRORS."""
+    start_time = time.perf_counter()
+    plot_dir = os.path.join(_worker_config["output_dir"], str(plot_id))
+    os.makedirs(plot_dir, exist_ok=True)
+    outputs = {"plot_dir": plot_dir}
+    try:
+        _run_pipeline(plot_id, plot, outputs)
+    except PLOT_ERRORS as error:
+        # keep the full traceback for the plot, so that one bad plot does not
+        # stop a run of hundreds
+        with open(os.path.join(plot_dir, "error.txt"), "w") as f:
+            f.write(traceback.format_exc())
+        return PlotResult(
+            plot_id,
+            "failed",
+            time.perf_counter() - start_time,
+            outputs,
+            f"{type(error).__name__}: {error}",
+        )
+    return PlotResult(plot_id, "ok", time.perf_counter() - start_time, outputs, None)
+
+
+def process_plots(
+    plots: gpd.GeoDataFrame | str | os.PathLike,
+    trees: TreeListDataFrameModel,
+    surface_path: str | os.PathLike,
+    output_dir: str | os.PathLike,
+    dem_path: str | os.PathLike | None = None,
+    steps: tuple[str, ...] | None = None,
+    plot_id_column: str | None = None,
+    buffer: float = 25.0,
+    search: dict | None = None,
+    max_workers: int | None = None,
+    memmap: bool = False,
+    cache_dir: str | os.PathLike | None = None,
+) -> pd.DataFrame:
+    """Runs a pipeline of processing steps on every plot in a layer.
+
+    The steps run for each plot, in order, are any of STEPS:
+
+        - "clip": keeps only the trees with stems within the plot, and writes
+          them to trees.csv. Without this step, every tree is used, e.g., for
+          a stem map of a single plot.
+        - "normalize": subtracts the DEM from the surface raster to give a
+          canopy height model, and writes it to chm.tif. Without this step,
+          the surface raster is used as a canopy height model.
+        - "simulate": rasterizes the trees at their measured locations onto
+          the grid of the canopy height model, and writes simulated.tif.
+        - "register": finds the plot location that best matches the canopy
+          height model with `RegistrationObjective.pyramid_search`, and
+          writes the result to registration.json.
+
+    Rasters are read within the plot buffered by `buffer`, which bounds the
+    offsets searched when registering the plot. Trees are rotated about the
+    plot centroid.
+
+    Plots are processed in a pool of worker processes. The tree list is
+    sent to each worker once when it starts, so each plot only sends its
+    geometry. Outputs of each plot are written to a folder named for the
+    plot within output_dir. When a step fails for a plot, the traceback is
+    written to error.txt in that folder, and the remaining plots are still
+    processed, and a warning lists the plots that failed. Errors other than
+    PLOT_ERRORS, which come from bugs rather than data, are raised, after the
+    results of every plot that finished are written to results.csv.
+
+    Parameters
+    -----------
+    plots : GeoDataFrame, or string or path to file
+        polygons of the plots to process, or a file of them in any format
+        recognized by GeoPandas. Plots are reprojected to the coordinate
+        system of the surface raster.
+    trees : TreeListDataFrameModel
+        a validated dataframe or geodataframe, with stem_x and stem_y in the
+        coordinate system of the surface raster
+    surface_path : string, path to file
+        a lidar canopy height model, or a lidar surface model when a DEM is
+        given, in a format that can be read by rasterio
+    output_dir : string, path to folder
+        folder to write the outputs of each plot to
+    dem_path : string, path to file, or None
+        a DEM on the same grid as the surface raster
+    steps : tuple of strings, or None
+        steps to run for each plot, from STEPS. If None, every step is run,
+        except "normalize" when no DEM is given.
+    plot_id_column : string, or None
+        column of plots with a unique name for each plot. If None, the index
+        of plots is used.
+    buffer : numeric
+        distance around each plot within which rasters are read
+    search : dict, or None
+        keyword arguments of `RegistrationObjective.pyramid_search`
+    max_workers : int, or None
+        number of worker processes. If None, one per processor.
+    memmap : bool
+        if True, the surface raster and DEM are converted once, before any
+        plot is processed, into uncompressed copies with
+        `forest3d.utils.elevation.cache_raster`, which every worker process
+        memory-maps, rather than each worker decoding windows of them
+    cache_dir : string, path to folder, or None
+        folder of the memory-mapped copies, as for `cache_raster`
+
+    Returns:
+    --------
+    results : DataFrame
+        one row per plot with the plot_id, status ("ok" or "failed"),
+        seconds taken to process it, outputs (paths of the files written),
+        and error, if any. The results are also written to results.csv in
+        output_dir.
+    """
+    if steps is None:
+        steps = tuple(step for step in STEPS if step != "normalize" or dem_path)
+    unknown = set(steps) - set(STEPS)
+    if unknown:
+        message = f"steps must be among {STEPS}, not {sorted(unknown)}."
+        raise ValueError(message)
+    if "normalize" in steps and dem_path is None:
+        message = "A DEM is required to normalize the surface raster."
+        raise ValueError(message)
+
+    if not isinstance(plots, gpd.GeoDataFrame):
+        plots = gpd.read_file(plots)
+    with rasterio.open(surface_path) as src:
+        crs = src.crs
+    if plots.crs is not None and crs is not None:
+        plots = plots.to_crs(crs)
+    plot_ids = plots.index if plot_id_column is None else plots[plot_id_column]
+    if not plot_ids.is_unique:
+        message = "Plots must have unique ids."
+        raise ValueError(message)
+
+    output_dir = os.fspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    config = {
+        "trees": pd.DataFrame(trees).drop(columns="geometry", errors="ignore"),
+        "surface_path": os.fspath(surface_path),
+        "dem_path": None if dem_path is None else os.fspath(dem_path),
+        "output_dir": output_dir,
+        "steps": tuple(steps),
+        "buffer": float(buffer),
+        "search": dict(search or {}),
+        "crs": crs,
+        "memmap": memmap,
+        "cache_dir": cache_dir,
+    }
+    if memmap:
+        for path in (config["surface_path"], config["dem_path"]):
+            if path is not None:
+                cache_raster(path, cache_dir)
+
+    with ProcessPoolExecutor(
+        max_workers, initializer=_init_batch_worker, initargs=(config,)
+    ) as executor:
+        futures = [
+            executor.submit(_process_plot, plot_id, plot)
+            for plot_id, plot in zip(plot_ids.astype(str), plots.geometry)
+        ]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            # an error that is not a PLOT_ERROR stops the run, but plots that
+            # are already running finish first
+            executor.shutdown(cancel_futures=True)
+            raise
+        finally:
+            # results of every plot that finished are written, even when the
+            # run is stopped, so that finished plots are not lost
+            results = pd.DataFrame(
+                [
+                    future.result()
+                    for future in futures
+                    if future.done()
+                    and not future.cancelled()
+                    and future.exception() is None
+                ],
+                columns=PlotResult._fields,
+            )
+            results.to_csv(os.path.join(output_dir, "results.csv"), index=False)
+
+    failed = results.loc[results["status"] == "failed", "plot_id"]
+    if not failed.empty:
+        warnings.warn(
+            f"{len(failed)} of {len(results)} plots failed: "
+            f"{', '.join(failed)}. See error.txt in each plot's folder.",
+            stacklevel=2,
+        )
+    return results
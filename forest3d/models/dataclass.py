@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+from typing import Literal
+
 import numpy as np
 import numpy.typing as npt
-from forest3d.utils.geometry import _make_crown_hull
+from forest3d.utils.geometry import CrownShapeCache, _make_crown_hull
 from numpydantic import NDArray, Shape
-from pydantic import BaseModel, ConfigDict, Field, computed_field, model_validator
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    computed_field,
+    field_validator,
+    model_validator,
+)
 
 
 class Coordinate3D(BaseModel):
@@ -73,6 +82,16 @@ class Tree(BaseModel):
     top_only : bool
         if True, will only return the top portion of the crown, i.e., the
         points above the maximum crown width
+    resolution : string, or tuple of two ints
+        level of detail of the crown, either the name of a preset in
+        CROWN_RESOLUTIONS ("coarse", "default", or "fine") or the (number of
+        heights, number of angles) at which to sample the crown surface
+    crown_cache : CrownShapeCache, or None
+        if provided, crowns are retrieved from or added to this cache rather
+        than always being calculated from scratch
+    dtype : string
+        floating point type of the crown coordinates, "float64" (default) or
+        "float32"
     """
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -93,6 +112,14 @@ class Tree(BaseModel):
     )
     crown_shapes: NDArray[Shape["2, 4"], float] = np.full((2, 4), fill_value=2.0)  # noqa: UP037
     top_only: bool = False
+    resolution: str | tuple[int, int] = "default"
+    crown_cache: CrownShapeCache | None = Field(default=None, exclude=True)
+    dtype: Literal["float32", "float64"] = "float64"
+
+    @field_validator("dtype", mode="before")
+    def dtype_name(cls, value):
+        """Accepts NumPy types, e.g. np.float32, as well as their names."""
+        return np.dtype(value).name
 
     @model_validator(mode="before")
     def crown_radii_from_radius(self):
@@ -126,7 +153,12 @@ class Tree(BaseModel):
     @property
     def crown(self) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
         """Generate a hull for this tree."""
-        return _make_crown_hull(
+        make_crown_hull = (
+            _make_crown_hull
+            if self.crown_cache is None
+            else self.crown_cache.make_crown_hull
+        )
+        return make_crown_hull(
             self.stem_base,
             self.top_height,
             self.crown_ratio,
@@ -136,4 +168,6 @@ class Tree(BaseModel):
             self.crown_edge_heights,
             self.crown_shapes,
             self.top_only,
+            self.resolution,
+            dtype=self.dtype,
         )
@@ -4,8 +4,12 @@ import os
 from typing import Any
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import pandera as pa
+from forest3d.models.dataclass import Tree
+
+DIRECTIONS = ("east", "north", "west", "south")
 
 
 class TreeListDataFrameModel(pa.DataFrameModel):
@@ -79,3 +83,64 @@ class TreeListGeoDataFrameModel(TreeListDataFrameModel):
                 crs=crs,
             )
         )
+
+
+def _get_crown_parameters(trees: TreeListDataFrameModel) -> dict[str, np.ndarray]:
+    """Gathers the crown parameters of a tree list as arrays, one row per tree.
+
+    Optional columns follow the argument names of
+    `forest3d.visualize._make_tree_all_params`, e.g., crown_radius_east or
+    shape_top_north. When optional columns are missing, the same defaults as
+    the `Tree` model are used.
+
+    Args:
+        trees (TreeListDataFrameModel): a validated dataframe or geodataframe.
+
+    Returns:
+        params (dict): arrays keyed by the argument names of
+            `forest3d.utils.geometry._make_crown_hulls`.
+    """
+    num_trees = len(trees)
+
+    def column(name, default):
+        if name in trees.columns:
+            return trees[name].to_numpy(dtype=float)
+        return np.full(num_trees, default, dtype=float)
+
+    def columns(names, default):
+        if all(name in trees.columns for name in names):
+            return trees[list(names)].to_numpy(dtype=float)
+        return np.broadcast_to(default, (num_trees, len(names))).astype(float)
+
+    top_heights = trees["top_height"].to_numpy(dtype=float)
+    if all(f"crown_radius_{direction}" in trees.columns for direction in DIRECTIONS):
+        crown_radii = columns([f"crown_radius_{d}" for d in DIRECTIONS], np.nan)
+    elif "crown_radius" in trees.columns:
+        crown_radii = np.repeat(column("crown_radius", np.nan)[:, np.newaxis], 4, 1)
+    else:
+        crown_radii = np.repeat(0.25 * top_heights[:, np.newaxis], 4, axis=1)
+
+    default_shapes = Tree.model_fields["crown_shapes"].default
+    crown_shapes = np.stack(
+        (
+            columns([f"shape_top_{d}" for d in DIRECTIONS], default_shapes[0]),
+            columns([f"shape_bottom_{d}" for d in DIRECTIONS], default_shapes[1]),
+        ),
+        axis=1,
+    )
+
+    return {
+        "stem_bases": np.stack(
+            (column("stem_x", 0), column("stem_y", 0), column("stem_z", 0)), axis=-1
+        ),
+        "top_heights": top_heights,
+        "crown_ratios": column("crown_ratio", 0.65),
+        "lean_directions": column("lean_direction", 0),
+        "lean_severities": column("lean_severity", 0),
+        "crown_radii": crown_radii,
+        "crown_edge_heights": columns(
+            [f"crown_edgeht_{d}" for d in DIRECTIONS],
+            Tree.model_fields["crown_edge_heights"].default,
+        ),
+        "crown_shapes": crown_shapes,
+    }
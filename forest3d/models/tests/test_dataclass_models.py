@@ -1,5 +1,6 @@
 import numpy as np
 from forest3d.models.dataclass import Tree
+from forest3d.utils.geometry import CROWN_RESOLUTIONS
 
 TREE_WITH_RADIUS = {
     "species": "abc",
@@ -30,4 +31,14 @@ def test_crown_radius_to_radii():
 def test_tree_with_radius_and_radii():
     tree = Tree.model_validate(TREE_WITH_RADIUS_AND_RADII)
     assert tree.crown_radius == TREE_WITH_RADIUS_AND_RADII["crown_radius"]
-    assert np.array_equal(tree.crown_radii, TREE_WITH_RADIUS_AND_RADII["crown_radii"])
\ No newline at end of file
+    assert np.array_equal(tree.crown_radii, TREE_WITH_RADIUS_AND_RADII["crown_radii"])
+
+def test_tree_crown_resolution():
+    num_heights, num_angles = CROWN_RESOLUTIONS["coarse"]
+    tree = Tree.model_validate({**TREE_WITH_RADIUS, "resolution": "coarse"})
+    x, y, z = tree.crown
+    assert x.shape == y.shape == z.shape == (num_heights * num_angles,)
+
+    tree = Tree.model_validate({**TREE_WITH_RADIUS, "resolution": (10, 20)})
+    x, y, z = tree.crown
+    assert x.shape == (200,)
@@ -1,8 +1,10 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import pytest
 from forest3d.models.dataframe import (TreeListDataFrameModel,
-                                       TreeListGeoDataFrameModel)
+                                       TreeListGeoDataFrameModel,
+                                       _get_crown_parameters)
 from pandera.errors import SchemaError
 
 TEST_GEO_FILENAME = "test.geojson"
@@ -77,4 +79,26 @@ def test_gdf_from_df():
 def test_gdf_without_geometry():
     """SchemaError when geometry missing."""
     with pytest.raises(SchemaError):
-        TreeListGeoDataFrameModel(gdf.drop("geometry", axis=1))
\ No newline at end of file
+        TreeListGeoDataFrameModel(gdf.drop("geometry", axis=1))
+
+def test_crown_parameters_defaults():
+    """Crown parameters use Tree defaults when optional columns are missing."""
+    params = _get_crown_parameters(TreeListDataFrameModel(df))
+    assert params["stem_bases"].shape == (3, 3)
+    assert np.allclose(params["stem_bases"][:, 2], 0)
+    assert np.allclose(params["crown_radii"], 0.25 * df.top_height.to_numpy()[:, None])
+    assert np.allclose(params["crown_edge_heights"], 0.3)
+    assert params["crown_shapes"].shape == (3, 2, 4)
+
+def test_crown_parameters_from_columns():
+    """Crown parameters are read from optional columns when present."""
+    test_df = df.copy()
+    test_df["crown_radius"] = [1.0, 2.0, 3.0]
+    test_df["shape_top_east"] = 1.0
+    test_df["shape_top_north"] = 1.5
+    test_df["shape_top_west"] = 2.5
+    test_df["shape_top_south"] = 3.0
+    params = _get_crown_parameters(TreeListDataFrameModel(test_df))
+    assert np.allclose(params["crown_radii"][:, 0], [1.0, 2.0, 3.0])
+    assert np.allclose(params["crown_shapes"][:, 0], [1.0, 1.5, 2.5, 3.0])
+    assert np.allclose(params["crown_shapes"][:, 1], 2.0)
@@ -0,0 +1,964 @@
+"""Functions for co-registering stem maps with lidar-derived rasters."""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import numpy.typing as npt
+import rasterio
+import shapely
+from rasterio.windows import Window
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.utils.elevation import open_cached_raster
+from forest3d.utils.raster import CrownRasterizer, RasterGrid
+
+METRICS = ("rmse", "correlation", "iou")
+
+OffsetSearchResult = namedtuple(
+    "OffsetSearchResult", ["dx", "dy", "rotation", "correlation", "correlations"]
+)
+PyramidLevel = namedtuple(
+    "PyramidLevel",
+    [
+        "factor",
+        "cell_size",
+        "dx",
+        "dy",
+        "rotation",
+        "correlation",
+        "num_rotations",
+        "seconds",
+    ],
+)
+PyramidSearchResult = namedtuple(
+    "PyramidSearchResult", ["dx", "dy", "rotation", "correlation", "levels"]
+)
+
+PARAMETERS = ("dx", "dy", "rotation", "distance_scale")
+SamplerResult = namedtuple(
+    "SamplerResult",
+    ["samples", "acceptance_rates", "seconds", "samples_per_second_per_core"],
+)
+
+# posterior of the sampler in each worker process, see `_init_sampler_worker`
+_worker_posterior = None
+
+
+def _box_sums(values: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """Sums of values over every placement of a box within an array.
+
+    Parameters
+    -----------
+    values : array with shape (H, W)
+        values to sum
+    shape : tuple of two ints
+        (h, w) size of the box
+
+    Returns:
+    --------
+    sums : array with shape (H - h + 1, W - w + 1)
+        sum of values within the box with its upper left corner at each cell
+    """
+    height, width = shape
+    integral = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+    np.cumsum(np.cumsum(values, axis=0), axis=1, out=integral[1:, 1:])
+    return (
+        integral[height:, width:]
+        - integral[:-height, width:]
+        - integral[height:, :-width]
+        + integral[:-height, :-width]
+    )
+
+
+def _downsample(values: np.ndarray, factor: int) -> np.ndarray:
+    """Averages values over blocks of factor by factor cells, ignoring NaN.
+
+    Partial blocks at the bottom and right edges are averaged over the cells
+    they contain, and blocks without any finite values are NaN.
+
+    Parameters
+    -----------
+    values : array with shape (H, W)
+        values to downsample
+    factor : int
+        number of cells along each side of a block
+
+    Returns:
+    --------
+    means : array with shape (ceil(H / factor), ceil(W / factor))
+        mean of the finite values in each block
+    """
+    if factor == 1:
+        return values
+    rows, cols = -(-values.shape[0] // factor), -(-values.shape[1] // factor)
+    blocks = np.full((rows * factor, cols * factor), np.nan)
+    blocks[: values.shape[0], : values.shape[1]] = values
+    blocks = blocks.reshape(rows, factor, cols, factor)
+    counts = np.count_nonzero(np.isfinite(blocks), axis=(1, 3))
+    sums = np.nansum(blocks, axis=(1, 3))
+    return np.divide(sums, counts, out=np.full(sums.shape, np.nan), where=counts > 0)
+
+
+def _crop(
+    values: np.ndarray, start: tuple[int, int], shape: tuple[int, int]
+) -> np.ndarray:
+    """Copies a window of an array, with NaN where it extends past the array.
+
+    Parameters
+    -----------
+    values : array with shape (H, W)
+        values to copy
+    start : tuple of two ints
+        row and column of the first cell of the window, which may be negative
+    shape : tuple of two ints
+        number of rows and columns in the window
+
+    Returns:
+    --------
+    window : array with shape shape
+        values within the window
+    """
+    window = np.full(shape, np.nan)
+    bounds = [
+        (max(first, 0), min(first + size, limit))
+        for first, size, limit in zip(start, shape, values.shape)
+    ]
+    (first_row, stop_row), (first_col, stop_col) = bounds
+    if first_row < stop_row and first_col < stop_col:
+        window[
+            first_row - start[0] : stop_row - start[0],
+            first_col - start[1] : stop_col - start[1],
+        ] = values[first_row:stop_row, first_col:stop_col]
+    return window
+
+
+def _normalized_cross_correlation(
+    image: np.ndarray, template: np.ndarray
+) -> np.ndarray:
+    """Correlates a template with every window of an image of the same size.
+
+    Cells of the image that are NaN are treated as 0.
+
+    Parameters
+    -----------
+    image : array with shape (H, W)
+        image to search
+    template : array with shape (h, w)
+        template to search for, no larger than the image
+
+    Returns:
+    --------
+    correlations : array with shape (H - h + 1, W - w + 1)
+        Pearson correlation of the template with the window of the image with
+        its upper left corner at each cell, or 0 where either is constant
+    """
+    shape = image.shape
+    if template.shape[0] > shape[0] or template.shape[1] > shape[1]:
+        message = "The CHM must be larger than the crowns of the trees."
+        raise ValueError(message)
+    image = np.nan_to_num(image)
+    template = template - template.mean()
+    template_norm = np.sqrt(np.sum(template**2))
+    num_cells = template.size
+
+    # correlation of the template with the image at every offset, of which
+    # only those that keep the template within the image are kept
+    spectrum = np.fft.rfft2(image) * np.conj(np.fft.rfft2(template, s=shape))
+    products = np.fft.irfft2(spectrum, s=shape)
+    products = products[
+        : shape[0] - template.shape[0] + 1, : shape[1] - template.shape[1] + 1
+    ]
+
+    # normalized by the variability of the image under the template
+    sums = _box_sums(image, template.shape)
+    sums_of_squares = _box_sums(image**2, template.shape)
+    image_norms = np.sqrt(np.maximum(sums_of_squares - sums**2 / num_cells, 0))
+    denominators = template_norm * image_norms
+    return np.divide(
+        products,
+        denominators,
+        out=np.zeros_like(products),
+        where=denominators > 1e-9 * template_norm,
+    )
+
+
+def _refine_peak(values: np.ndarray, peak: tuple[int, int]) -> np.ndarray:
+    """Locates the peak of a surface to sub-cell precision.
+
+    Fits a parabola through the peak and its neighbors along each axis. Peaks
+    on the edge of the surface are not refined along that axis.
+
+    Parameters
+    -----------
+    values : array with shape (rows, cols)
+        surface with a maximum at peak
+    peak : tuple of two ints
+        row and column of the maximum
+
+    Returns:
+    --------
+    location : array with shape (2,)
+        fractional row and column of the peak
+    """
+    location = np.array(peak, dtype=float)
+    for axis in range(2):
+        index = peak[axis]
+        if 0 < index < values.shape[axis] - 1:
+            before, center, after = np.take(
+                values[peak[0]] if axis else values[:, peak[1]],
+                (index - 1, index, index + 1),
+            )
+            curvature = before - 2 * center + after
+            if curvature < 0:
+                location[axis] += (before - after) / (2 * curvature)
+    return location
+
+
+def _read_raster_window(
+    path: str | os.PathLike,
+    bounds: tuple[float, float, float, float] | shapely.Geometry | None = None,
+    memmap: bool = False,
+    cache_dir: str | os.PathLike | None = None,
+) -> (np.ndarray, RasterGrid):
+    """Reads the first band of a raster within bounds, with nodata as NaN.
+
+    Parameters
+    -----------
+    path : string, path to file
+        a raster in a format that can be read by rasterio
+    bounds : tuple of four numerics, shapely geometry, or None
+        (left, bottom, right, top) coordinates of the area to read, or a
+        geometry whose bounds are read. If None, the whole raster is read.
+    memmap : bool
+        if True, the window is copied from a memory-mapped copy of the raster
+        made by `forest3d.utils.elevation.cache_raster`, rather than decoded
+    cache_dir : string, path to folder, or None
+        folder of the memory-mapped copy, as for `cache_raster`
+
+    Returns:
+    --------
+    values : array with shape (rows, cols)
+        raster values as floats, with nodata cells set to NaN
+    grid : RasterGrid
+        grid of the cells read
+    """
+    if isinstance(bounds, shapely.Geometry):
+        bounds = bounds.bounds
+
+    if memmap:
+        cached, metadata = open_cached_raster(path, cache_dir)
+        grid = RasterGrid.from_profile(
+            {
+                "transform": rasterio.Affine(*metadata["transform"]),
+                "height": cached.shape[0],
+                "width": cached.shape[1],
+            }
+        )
+        rows, cols = (slice(None), slice(None))
+        if bounds is not None:
+            rows, cols = grid.window(bounds)
+            grid = grid.subgrid(rows, cols)
+        values = cached[rows, cols].astype(float)
+        if metadata["nodata"] is not None:
+            values[values == metadata["nodata"]] = np.nan
+        return values, grid
+
+    with rasterio.open(path) as src:
+        grid = RasterGrid.from_profile(src.profile)
+        rows, cols = (slice(None), slice(None))
+        if bounds is not None:
+            rows, cols = grid.window(bounds)
+            grid = grid.subgrid(rows, cols)
+        values = src.read(
+            1, window=Window.from_slices(rows, cols, *src.shape), masked=True
+        )
+
+    return values.astype(float).filled(np.nan), grid
+
+
+class RegistrationObjective:
+    """Scores candidate plot locations against a lidar canopy height model.
+
+    The trees of a stem map are moved as a rigid body, rasterized onto the
+    grid of the lidar canopy height model (CHM), and compared to it. Scores
+    are divergences, so that lower scores are better for every metric:
+
+        - "rmse": root mean squared difference in height
+        - "correlation": one minus the Pearson correlation of heights
+        - "iou": one minus the intersection over union of canopy cover,
+          i.e., cells with heights of at least `canopy_height`
+
+    The lidar CHM is read once, and the crowns are tabulated once, so that
+    each evaluation only rasterizes the moved crowns into a reused buffer.
+
+    Attributes:
+    -----------
+    chm : array with shape (rows, cols)
+        lidar canopy height model, with NaN where there is no data
+    grid : RasterGrid
+        grid of the lidar canopy height model
+    metric : str
+        name of the metric used to score plot locations
+    center : array with shape (2,)
+        (x,y) coordinates about which trees are rotated
+    canopy_height : float
+        minimum height of cells counted as canopy cover
+    """
+
+    def __init__(
+        self,
+        rasterizer: CrownRasterizer,
+        chm: npt.NDArray,
+        grid: RasterGrid,
+        metric: str = "rmse",
+        center: npt.ArrayLike | None = None,
+        canopy_height: float = 2.0,
+    ):
+        """Prepares to score plot locations.
+
+        Parameters
+        -----------
+        rasterizer : CrownRasterizer
+            crowns of the trees in the stem map
+        chm : array with shape grid.shape
+            lidar canopy height model, with NaN where there is no data
+        grid : RasterGrid
+            grid of the lidar canopy height model
+        metric : str
+            one of METRICS
+        center : array with shape (2,), or None
+            (x,y) coordinates about which trees are rotated. If None, the mean
+            location of the crowns is used.
+        canopy_height : numeric
+            minimum height of cells counted as canopy cover
+        """
+        if metric not in METRICS:
+            message = f"metric must be one of {METRICS}, not {metric!r}."
+            raise ValueError(message)
+        chm = np.asarray(chm, dtype=float)
+        if chm.shape != grid.shape:
+            message = f"chm must have the shape of the grid, {grid.shape}."
+            raise ValueError(message)
+
+        self.rasterizer = rasterizer
+        self.chm = chm
+        self.grid = grid
+        self.metric = metric
+        if center is None:
+            bounds = rasterizer.bounds
+            center = (bounds[:, 0:2] + bounds[:, 3:5]).mean(axis=0) / 2
+        self.center = np.array(center, dtype=float)
+        self.canopy_height = float(canopy_height)
+
+        # everything about the lidar CHM that the metrics need is computed
+        # once, and only over cells with data
+        self._valid = np.isfinite(chm)
+        self._observed = chm[self._valid]
+        self._observed_anomalies = self._observed - self._observed.mean()
+        self._observed_norm = np.sqrt(np.sum(self._observed_anomalies**2))
+        self._observed_canopy = self._observed >= self.canopy_height
+        self._buffer = np.empty(grid.shape, dtype=float)
+
+    @classmethod
+    def from_tree_list(
+        cls,
+        trees: TreeListDataFrameModel,
+        chm_path: str | os.PathLike,
+        bounds: tuple[float, float, float, float] | shapely.Geometry | None = None,
+        metric: str = "rmse",
+        center: npt.ArrayLike | None = None,
+        canopy_height: float = 2.0,
+    ) -> RegistrationObjective:
+        """Prepares to score locations of a tree list against a CHM raster.
+
+        Parameters
+        -----------
+        trees : TreeListDataFrameModel
+            a validated dataframe or geodataframe
+        chm_path : string, path to file
+            a lidar canopy height model in a format that can be read by
+            rasterio, in the same coordinate system as the tree list
+        bounds : tuple of four numerics, shapely geometry, or None
+            (left, bottom, right, top) coordinates of the area of the CHM to
+            compare against, or a geometry whose bounds are used, e.g., the
+            plot buffered by the largest offset that will be evaluated, as in
+            the plots_extended25m layers. If None, the whole raster is read.
+        metric, center, canopy_height
+            as for `RegistrationObjective`
+        """
+        chm, grid = _read_raster_window(chm_path, bounds)
+        return cls(
+            CrownRasterizer.from_tree_list(trees),
+            chm,
+            grid,
+            metric,
+            center,
+            canopy_height,
+        )
+
+    def simulate(
+        self,
+        dx: float = 0,
+        dy: float = 0,
+        rotation: float = 0,
+        out: np.ndarray | None = None,
+        tree_offsets: npt.ArrayLike | None = None,
+    ) -> np.ndarray:
+        """Rasterizes the trees at a plot location onto the grid of the CHM.
+
+        Parameters
+        -----------
+        dx, dy : numeric
+            distance to move the trees in the x and y directions
+        rotation : numeric
+            angle of rotation of the trees about the center, in degrees
+            counter-clockwise
+        out : array with shape grid.shape, or None
+            array to write the simulated CHM to
+        tree_offsets : array with shape (N, 2), or None
+            (x,y) distance to move each tree before the plot is moved
+
+        Returns:
+        --------
+        chm : array with shape grid.shape
+            simulated canopy height model
+        """
+        return self.rasterizer.rasterize(
+            self.grid,
+            dx,
+            dy,
+            rotation=rotation,
+            center=self.center,
+            out=out,
+            tree_offsets=tree_offsets,
+        )
+
+    def score(self, dx: float = 0, dy: float = 0, rotation: float = 0) -> float:
+        """Scores a single plot location.
+
+        Parameters
+        -----------
+        dx, dy : numeric
+            distance to move the trees in the x and y directions
+        rotation : numeric
+            angle of rotation of the trees about the center, in degrees
+            counter-clockwise
+
+        Returns:
+        --------
+        score : float
+            divergence between simulated and lidar CHMs; lower is better
+        """
+        simulated = self.simulate(dx, dy, rotation, out=self._buffer)[self._valid]
+
+        if self.metric == "rmse":
+            return float(np.sqrt(np.mean((simulated - self._observed) ** 2)))
+
+        if self.metric == "correlation":
+            anomalies = simulated - simulated.mean()
+            norm = np.sqrt(np.sum(anomalies**2)) * self._observed_norm
+            if norm == 0:
+                return 1.0
+            return float(1 - np.dot(anomalies, self._observed_anomalies) / norm)
+
+        canopy = simulated >= self.canopy_height
+        union = np.count_nonzero(canopy | self._observed_canopy)
+        if union == 0:
+            return 1.0
+        return 1 - np.count_nonzero(canopy & self._observed_canopy) / union
+
+    __call__ = score
+
+    def evaluate(self, candidates: npt.ArrayLike) -> np.ndarray:
+        """Scores many plot locations.
+
+        This is a convenience wrapper that calls `score` for each candidate
+        in turn, rasterizing the trees once per candidate, so it is no faster
+        than scoring the candidates one at a time. To search every offset of
+        the trees at once, use `fft_search` or `pyramid_search`, which
+        rasterize the trees once per rotation and correlate them with the CHM
+        using FFTs.
+
+        Parameters
+        -----------
+        candidates : array with shape (K, 2) or (K, 3)
+            (dx, dy) offsets of each candidate plot location, optionally
+            followed by a rotation in degrees counter-clockwise
+
+        Returns:
+        --------
+        scores : array with shape (K,)
+            divergence between simulated and lidar CHMs for each candidate;
+            lower is better
+        """
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))
+        if candidates.ndim != 2 or candidates.shape[-1] not in (2, 3):
+            message = "candidates must have shape (K, 2) or (K, 3)."
+            raise ValueError(message)
+
+        return np.array([self.score(*candidate) for candidate in candidates])
+
+    def _get_template_window(
+        self, grid: RasterGrid, rotation: float
+    ) -> (int, int, int, int):
+        """Rows and columns of a grid covering the rotated crowns, unclipped."""
+        bounds = self.rasterizer._get_moved_bounds(0, 0, rotation, self.center)
+        left, bottom = bounds[:, 0:2].min(axis=0)
+        right, top = bounds[:, 2:4].max(axis=0)
+        cols = (np.array((left, right)) - grid.origin[0]) / grid.cell_size
+        rows = (grid.origin[1] - np.array((top, bottom))) / grid.cell_size
+        return (
+            int(np.floor(rows[0])),
+            int(np.ceil(rows[1])),
+            int(np.floor(cols[0])),
+            int(np.ceil(cols[1])),
+        )
+
+    def _match_template(
+        self,
+        image: np.ndarray,
+        image_start: tuple[int, int],
+        factor: int,
+        rotation: float,
+    ) -> OffsetSearchResult:
+        """Finds the offset of the trees that best matches part of a CHM.
+
+        Parameters
+        -----------
+        image : array with shape (rows, cols)
+            part of the lidar CHM, downsampled by factor, with NaN where there
+            is no data
+        image_start : tuple of two ints
+            row and column of the first cell of image in the downsampled grid
+        factor : int
+            downsampling factor of image
+        rotation : numeric
+            angle of rotation of the trees about the center, in degrees
+            counter-clockwise
+
+        Returns:
+        --------
+        result : OffsetSearchResult
+            as for `fft_search`
+        """
+        grid = self.grid.coarsen(factor)
+        first_row, stop_row, first_col, stop_col = self._get_template_window(
+            grid, rotation
+        )
+
+        # the template is rasterized at full resolution and downsampled the
+        # same way as the lidar CHM
+        template_grid = RasterGrid(
+            grid.origin + (first_col * grid.cell_size, -first_row * grid.cell_size),
+            self.grid.cell_size,
+            ((stop_row - first_row) * factor, (stop_col - first_col) * factor),
+        )
+        template = _downsample(
+            self.rasterizer.rasterize(
+                template_grid, rotation=rotation, center=self.center
+            ),
+            factor,
+        )
+        correlations = _normalized_cross_correlation(image, template)
+
+        peak = np.unravel_index(np.argmax(correlations), correlations.shape)
+        row, col = _refine_peak(correlations, peak)
+        return OffsetSearchResult(
+            (image_start[1] + col - first_col) * grid.cell_size,
+            (first_row - image_start[0] - row) * grid.cell_size,
+            rotation,
+            float(correlations[peak]),
+            correlations,
+        )
+
+    def fft_search(self, rotation: float = 0) -> OffsetSearchResult:
+        """Finds the plot offset that best matches the CHM by cross-correlation.
+
+        The trees are rasterized once, as a template covering their crowns,
+        and the normalized cross-correlation of the template with the lidar
+        CHM is calculated for every offset of a whole number of cells that
+        keeps the template within the CHM, all at once using FFTs. The best
+        offset is then refined to a fraction of a cell by fitting parabolas
+        to the correlation peak. The CHM therefore defines the search window,
+        e.g., when read within the bounds of a plot buffered by 25 m.
+
+        Cells without data are treated as having no canopy.
+
+        Parameters
+        -----------
+        rotation : numeric
+            angle of rotation of the trees about the center, in degrees
+            counter-clockwise
+
+        Returns:
+        --------
+        result : OffsetSearchResult
+            dx and dy, the best offset of the trees; rotation; correlation,
+            the normalized cross-correlation at the best whole-cell offset;
+            and correlations, the normalized cross-correlation at every
+            whole-cell offset, with the template at the upper left corner of
+            the CHM in the first entry
+        """
+        return self._match_template(self.chm, (0, 0), 1, rotation)
+
+    def pyramid_search(
+        self,
+        levels: tuple[int, ...] = (4, 2, 1),
+        max_rotation: float = 10.0,
+        rotation_step: float = 2.0,
+        translation_tolerance: int = 3,
+        rotation_tolerance: float | None = None,
+    ) -> PyramidSearchResult:
+        """Finds the plot offset and rotation that best match the CHM.
+
+        The lidar CHM and the simulated CHM are both averaged over blocks of
+        cells to build image pyramids. On the coarsest level, every rotation
+        from -max_rotation to max_rotation in steps of rotation_step is
+        searched over every offset within the CHM with `fft_search`. Each
+        finer level only searches offsets within translation_tolerance cells
+        of the previous estimate, and rotations within rotation_tolerance of
+        it, in steps half as large as on the previous level. Rotations are
+        never searched beyond max_rotation, so a max_rotation of 0 only
+        searches offsets.
+
+        Parameters
+        -----------
+        levels : tuple of ints
+            downsampling factor of each level of the pyramid, from coarsest to
+            finest
+        max_rotation : numeric
+            largest rotation searched on the coarsest level, in degrees
+        rotation_step : numeric
+            spacing of rotations searched on the coarsest level, in degrees
+        translation_tolerance : int
+            number of cells on each side of the previous estimate searched on
+            finer levels
+        rotation_tolerance : numeric, or None
+            largest difference in rotation from the previous estimate searched
+            on finer levels, in degrees. If None, the rotation step of the
+            previous level is used.
+
+        Returns:
+        --------
+        result : PyramidSearchResult
+            dx, dy, rotation, and correlation of the best plot location on the
+            finest level, and a PyramidLevel with the estimate, number of
+            rotations searched, and time taken, in seconds, for each level
+        """
+        levels = [int(factor) for factor in levels]
+        if not levels or min(levels) < 1 or np.any(np.diff(levels) > 0):
+            message = "levels must be positive integers from coarsest to finest."
+            raise ValueError(message)
+        if rotation_step <= 0 or max_rotation < 0:
+            message = "rotation_step must be positive and max_rotation non-negative."
+            raise ValueError(message)
+
+        reports = []
+        best = None
+        for index, factor in enumerate(levels):
+            start_time = time.perf_counter()
+            chm = _downsample(self.chm, factor)
+            if best is None:
+                tolerance, step = max_rotation, rotation_step
+            else:
+                tolerance = step if rotation_tolerance is None else rotation_tolerance
+                step = rotation_step / 2**index
+
+            num_steps = int(np.floor(tolerance / step + 1e-9))
+            rotations = np.arange(-num_steps, num_steps + 1) * step
+            if best is not None:
+                # refine around the previous estimate, but never past the
+                # rotations allowed on the coarsest level
+                rotations += best.rotation
+                rotations = rotations[np.abs(rotations) <= max_rotation + 1e-9]
+
+            results = []
+            for rotation in rotations:
+                if best is None:
+                    results.append(self._match_template(chm, (0, 0), factor, rotation))
+                    continue
+                # search near the previous estimate, padding with nodata
+                # where the window extends past the CHM
+                cell_size = self.grid.cell_size * factor
+                first_row, stop_row, first_col, stop_col = self._get_template_window(
+                    self.grid.coarsen(factor), rotation
+                )
+                start = (
+                    first_row + round(-best.dy / cell_size) - translation_tolerance,
+                    first_col + round(best.dx / cell_size) - translation_tolerance,
+                )
+                shape = (
+                    stop_row - first_row + 2 * translation_tolerance,
+                    stop_col - first_col + 2 * translation_tolerance,
+                )
+                results.append(
+                    self._match_template(
+                        _crop(chm, start, shape), start, factor, rotation
+                    )
+                )
+
+            best = max(results, key=lambda result: result.correlation)
+            reports.append(
+                PyramidLevel(
+                    factor,
+                    self.grid.cell_size * factor,
+                    best.dx,
+                    best.dy,
+                    best.rotation,
+                    best.correlation,
+                    len(rotations),
+                    time.perf_counter() - start_time,
+                )
+            )
+
+        return PyramidSearchResult(
+            best.dx, best.dy, best.rotation, best.correlation, reports
+        )
+
+
+class PlotLocationPosterior:
+    """Posterior probability of a plot location given a lidar CHM.
+
+    A plot location is described by the four PARAMETERS, each with an
+    independent normal prior centered on no measurement error:
+
+        - "dx", "dy": error in the location of the plot center
+        - "rotation": error in the azimuths measured from the plot center, in
+          degrees counter-clockwise
+        - "distance_scale": ratio of the true to the measured distances of
+          trees from the plot center
+
+    Differences between the simulated and lidar canopy height models are
+    treated as independent normal errors.
+
+    Attributes:
+    -----------
+    objective : RegistrationObjective
+        trees and lidar CHM compared at each plot location
+    center_sd : float
+        standard deviation of the error in the location of the plot center
+    rotation_sd : float
+        standard deviation of the error in azimuths, in degrees
+    distance_sd : float
+        standard deviation of the proportional error in distances
+    noise_sd : float
+        standard deviation of the difference in height between the
+        simulated and lidar CHMs in each cell
+    """
+
+    def __init__(
+        self,
+        objective: RegistrationObjective,
+        center_sd: float = 5.0,
+        rotation_sd: float = 5.0,
+        distance_sd: float = 0.02,
+        noise_sd: float = 2.0,
+    ):
+        self.objective = objective
+        self.center_sd = float(center_sd)
+        self.rotation_sd = float(rotation_sd)
+        self.distance_sd = float(distance_sd)
+        self.noise_sd = float(noise_sd)
+        self._tree_locations = (
+            objective.rasterizer._surfaces.translate[:, :2] - objective.center
+        )
+
+    def log_prior(self, params: npt.ArrayLike) -> float:
+        """Log prior probability of a plot location, up to a constant."""
+        dx, dy, rotation, distance_scale = params
+        if distance_scale <= 0:
+            return -np.inf
+        return -0.5 * (
+            (dx**2 + dy**2) / self.center_sd**2
+            + (rotation / self.rotation_sd) ** 2
+            + ((distance_scale - 1) / self.distance_sd) ** 2
+        )
+
+    def log_likelihood(self, params: npt.ArrayLike) -> float:
+        """Log likelihood of the lidar CHM at a plot location, up to a constant."""
+        dx, dy, rotation, distance_scale = params
+        objective = self.objective
+        simulated = objective.simulate(
+            dx,
+            dy,
+            rotation,
+            out=objective._buffer,
+            tree_offsets=(distance_scale - 1) * self._tree_locations,
+        )[objective._valid]
+        residuals = simulated - objective._observed
+        return -0.5 * float(np.dot(residuals, residuals)) / self.noise_sd**2
+
+    def __call__(self, params: npt.ArrayLike) -> float:
+        """Log posterior probability of a plot location, up to a constant.
+
+        Parameters
+        -----------
+        params : array with shape (4,)
+            values of PARAMETERS at the plot location
+
+        Returns:
+        --------
+        log_posterior : float
+            log of the unnormalized posterior probability
+        """
+        log_prior = self.log_prior(params)
+        if not np.isfinite(log_prior):
+            return log_prior
+        return log_prior + self.log_likelihood(params)
+
+
+def _init_sampler_worker(posterior: PlotLocationPosterior):
+    """Keeps the posterior in a worker process for every chain it runs."""
+    global _worker_posterior
+    _worker_posterior = posterior
+
+
+def _run_chain(
+    path: str,
+    chain: int,
+    seed: np.random.SeedSequence,
+    initial: np.ndarray,
+    step_sizes: np.ndarray,
+    flush_every: int,
+) -> (int, float):
+    """Runs one Metropolis chain, writing samples to its row of a .npy file.
+
+    Returns:
+    --------
+    num_accepted : int
+        number of proposals accepted
+    seconds : float
+        time taken to run the chain
+    """
+    posterior = _worker_posterior
+    rng = np.random.default_rng(seed)
+    samples = np.load(path, mmap_mode="r+")
+    num_samples = samples.shape[1]
+    buffer = np.empty((flush_every, samples.shape[2]))
+
+    start_time = time.perf_counter()
+    state = initial + rng.normal(size=initial.shape) * step_sizes
+    log_posterior = posterior(state)
+    num_accepted = 0
+    for index in range(num_samples):
+        proposal = state + rng.normal(size=state.shape) * step_sizes
+        proposal_log_posterior = posterior(proposal)
+        if np.log(rng.uniform()) < proposal_log_posterior - log_posterior:
+            state, log_posterior = proposal, proposal_log_posterior
+            num_accepted += 1
+
+        row = index % flush_every
+        buffer[row, :-1] = state
+        buffer[row, -1] = log_posterior
+        if row == flush_every - 1 or index == num_samples - 1:
+            samples[chain, index - row : index + 1] = buffer[: row + 1]
+            samples.flush()
+
+    return num_accepted, time.perf_counter() - start_time
+
+
+def sample_plot_location(
+    posterior: PlotLocationPosterior,
+    path: str | os.PathLike,
+    num_samples: int = 1000,
+    num_chains: int = 4,
+    initial: npt.ArrayLike | None = None,
+    step_sizes: npt.ArrayLike = (0.5, 0.5, 0.5, 0.005),
+    seed: int | None = None,
+    max_workers: int | None = None,
+    flush_every: int = 100,
+) -> SamplerResult:
+    """Samples the posterior of a plot location with parallel MCMC chains.
+
+    Each chain is a random-walk Metropolis sampler run in its own process,
+    with a random number generator spawned from a single seed so that chains
+    are independent and reproducible. The posterior, including the lidar CHM,
+    is sent to each worker process once when it starts, rather than with
+    every chain.
+
+    Samples are written to a .npy file as they are produced, in blocks of
+    flush_every samples, so that long runs can be monitored, e.g., with
+    ``np.load(path, mmap_mode="r")``. Samples that have not been drawn yet
+    are NaN.
+
+    Parameters
+    -----------
+    posterior : PlotLocationPosterior
+        posterior probability of a plot location
+    path : string, path to file
+        .npy file to write samples to
+    num_samples : int
+        number of samples drawn by each chain, including any burn-in
+    num_chains : int
+        number of chains
+    initial : array with shape (4,), or None
+        values of PARAMETERS about which chains start, jittered by a step in
+        each chain, e.g., from `RegistrationObjective.pyramid_search`. If
+        None, chains start about no measurement error.
+    step_sizes : array with shape (4,)
+        standard deviation of the proposed change in each parameter
+    seed : int, or None
+        seed of the random number generators of the chains
+    max_workers : int, or None
+        number of worker processes. If None, one per chain, up to the number
+        of processors.
+    flush_every : int
+        number of samples each chain draws between writes to disk
+
+    Returns:
+    --------
+    result : SamplerResult
+        samples, an array with shape (num_chains, num_samples, 5) read from
+        path, with the values of PARAMETERS and the log posterior of each
+        sample; acceptance_rates, the proportion of proposals accepted by
+        each chain; seconds, the time taken to run all chains; and
+        samples_per_second_per_core, the number of samples drawn per second
+        of time spent running chains
+    """
+    path = os.fspath(path)
+    initial = np.array((0, 0, 0, 1) if initial is None else initial, dtype=float)
+    step_sizes = np.array(step_sizes, dtype=float)
+    if initial.shape != (len(PARAMETERS),) or step_sizes.shape != initial.shape:
+        message = (
+            f"initial and step_sizes must have one value for each of {PARAMETERS}."
+        )
+        raise ValueError(message)
+    if max_workers is None:
+        max_workers = min(num_chains, os.cpu_count() or 1)
+
+    samples = np.lib.format.open_memmap(
+        path,
+        mode="w+",
+        dtype=float,
+        shape=(num_chains, num_samples, len(PARAMETERS) + 1),
+    )
+    samples[:] = np.nan
+    samples.flush()
+    del samples
+
+    seeds = np.random.SeedSequence(seed).spawn(num_chains)
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers,
+        initializer=_init_sampler_worker,
+        initargs=(posterior,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _run_chain, path, chain, seeds[chain], initial, step_sizes, flush_every
+            )
+            for chain in range(num_chains)
+        ]
+        num_accepted, seconds = np.array([future.result() for future in futures]).T
+    elapsed = time.perf_counter() - start_time
+
+    return SamplerResult(
+        np.load(path, mmap_mode="r"),
+        num_accepted / num_samples,
+        elapsed,
+        num_chains * num_samples / seconds.sum(),
+    )
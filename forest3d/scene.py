@@ -0,0 +1,202 @@
+"""A forest scene holding the crown geometry of a whole tree list."""
+
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+from forest3d.models.dataframe import TreeListDataFrameModel, _get_crown_parameters
+from forest3d.utils.geometry import _make_crown_hulls, _make_forest_mesh
+
+
+class ForestScene:
+    """Crown hulls of a tree list that can be moved as a rigid body.
+
+    All crown vertices are held in a single contiguous array with shape
+    (3, N, heights, angles), so that the x, y, and z coordinates of every
+    crown are each contiguous in memory. Translations and rotations of the
+    whole plot are applied to this array in place, without rebuilding any
+    crowns.
+
+    Attributes:
+    -----------
+    vertices : array with shape (3, N, heights, angles)
+        x, y, and z coordinates of the crown surfaces of N trees
+    stem_bases : array with shape (N, 3)
+        (x,y,z) coordinates of stem bases
+    center : array with shape (2,)
+        (x,y) coordinates of the plot center, about which rotations are applied
+    """
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        stem_bases: np.ndarray,
+        center: np.ndarray | None = None,
+    ):
+        self.vertices = np.ascontiguousarray(vertices)
+        self.stem_bases = np.array(stem_bases, dtype=self.vertices.dtype)
+        if center is None:
+            center = self.stem_bases[:, :2].mean(axis=0)
+        self.center = np.array(center, dtype=float)
+
+        # an untouched copy, so that transforms can always start from the
+        # original geometry instead of accumulating rounding error
+        self._original = (
+            self.vertices.copy(),
+            self.stem_bases.copy(),
+            self.center.copy(),
+        )
+        self._buffers = None
+
+    @classmethod
+    def from_tree_list(
+        cls,
+        trees: TreeListDataFrameModel,
+        center: np.ndarray | None = None,
+        resolution: str | tuple[int, int] = "default",
+        dtype: npt.DTypeLike = float,
+    ) -> ForestScene:
+        """Builds the crowns of every tree in a tree list.
+
+        Parameters
+        -----------
+        trees : TreeListDataFrameModel
+            a validated dataframe or geodataframe
+        center : array with shape (2,), or None
+            (x,y) coordinates of the plot center. If None, the mean location
+            of the stems is used.
+        resolution : string, or tuple of two ints
+            name of a level of detail in CROWN_RESOLUTIONS, or the (number of
+            heights, number of angles) at which to sample each crown surface
+        dtype : data-type
+            floating point type of the crown vertices, e.g., np.float32 to
+            halve memory use and double the speed of transforms
+        """
+        params = _get_crown_parameters(trees)
+        crowns = _make_crown_hulls(**params, resolution=resolution, dtype=dtype)
+        return cls(np.stack(crowns), params["stem_bases"], center)
+
+    @property
+    def num_trees(self) -> int:
+        """Number of trees in the scene."""
+        return self.vertices.shape[1]
+
+    @property
+    def xs(self) -> np.ndarray:
+        """x-coordinates of crown vertices, with shape (N, heights, angles)."""
+        return self.vertices[0]
+
+    @property
+    def ys(self) -> np.ndarray:
+        """y-coordinates of crown vertices, with shape (N, heights, angles)."""
+        return self.vertices[1]
+
+    @property
+    def zs(self) -> np.ndarray:
+        """z-coordinates of crown vertices, with shape (N, heights, angles)."""
+        return self.vertices[2]
+
+    def to_mesh(self) -> (np.ndarray, np.ndarray):
+        """Combines all crowns into a single triangle mesh.
+
+        Returns:
+        --------
+        vertices : array with shape (N * heights * angles, 3)
+            (x,y,z) coordinates of the vertices of all crowns
+        faces : integer array with shape (N * F, 3)
+            indices into vertices of the three vertices of each triangle
+        """
+        return _make_forest_mesh(*self.vertices)
+
+    def reset(self) -> ForestScene:
+        """Restores the scene to the geometry it was created with."""
+        vertices, stem_bases, center = self._original
+        np.copyto(self.vertices, vertices)
+        np.copyto(self.stem_bases, stem_bases)
+        np.copyto(self.center, center)
+        return self
+
+    def translate(self, dx: float = 0, dy: float = 0, dz: float = 0) -> ForestScene:
+        """Moves the whole scene in place.
+
+        Parameters
+        -----------
+        dx, dy, dz : numeric
+            distance to move the scene in the x, y, and z directions
+        """
+        # plain floats keep operations at the precision of the vertices
+        for axis, delta in enumerate((float(dx), float(dy), float(dz))):
+            if delta:
+                self.vertices[axis] += delta
+                self.stem_bases[:, axis] += delta
+        self.center += (dx, dy)
+        return self
+
+    def rotate(self, rotation: float) -> ForestScene:
+        """Rotates the whole scene in place about the plot center.
+
+        Parameters
+        -----------
+        rotation : numeric
+            angle of rotation, in degrees counter-clockwise, i.e., rotating
+            east (0 degrees) towards north (90 degrees)
+        """
+        if not rotation:
+            return self
+
+        # plain floats keep operations at the precision of the vertices
+        theta = np.deg2rad(rotation)
+        cos_theta, sin_theta = float(np.cos(theta)), float(np.sin(theta))
+        center_x, center_y = (float(coord) for coord in self.center)
+
+        if self._buffers is None:
+            self._buffers = (
+                np.empty_like(self.vertices[0]),
+                np.empty_like(self.vertices[0]),
+            )
+        x_sin, y_sin = self._buffers
+        xs, ys = self.vertices[0], self.vertices[1]
+
+        # x' = cos * (x - cx) - sin * (y - cy) + cx
+        # y' = sin * (x - cx) + cos * (y - cy) + cy
+        xs -= center_x
+        ys -= center_y
+        np.multiply(xs, sin_theta, out=x_sin)
+        np.multiply(ys, sin_theta, out=y_sin)
+        xs *= cos_theta
+        xs -= y_sin
+        xs += center_x
+        ys *= cos_theta
+        ys += x_sin
+        ys += center_y
+
+        stem_xs = self.stem_bases[:, 0] - center_x
+        stem_ys = self.stem_bases[:, 1] - center_y
+        self.stem_bases[:, 0] = cos_theta * stem_xs - sin_theta * stem_ys + center_x
+        self.stem_bases[:, 1] = sin_theta * stem_xs + cos_theta * stem_ys + center_y
+        return self
+
+    def transform(
+        self, dx: float = 0, dy: float = 0, dz: float = 0, rotation: float = 0
+    ) -> ForestScene:
+        """Rotates the scene about the plot center, then moves it, in place.
+
+        Parameters
+        -----------
+        dx, dy, dz : numeric
+            distance to move the scene in the x, y, and z directions
+        rotation : numeric
+            angle of rotation about the plot center, in degrees
+            counter-clockwise
+        """
+        return self.rotate(rotation).translate(dx, dy, dz)
+
+    def set_transform(
+        self, dx: float = 0, dy: float = 0, dz: float = 0, rotation: float = 0
+    ) -> ForestScene:
+        """Places the scene at a transform relative to its original geometry.
+
+        Unlike `transform`, transforms do not accumulate across calls, which
+        suits evaluating many candidate plot locations in turn.
+        """
+        return self.reset().transform(dx, dy, dz, rotation)
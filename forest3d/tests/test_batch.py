@@ -0,0 +1,113 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+import shapely
+from forest3d import batch
+from forest3d.batch import process_plots
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.utils.raster import CrownRasterizer, RasterGrid
+
+RNG = np.random.default_rng(13)
+NUM_TREES = 60
+df = pd.DataFrame({
+    "stem_x": RNG.uniform(0, 100, NUM_TREES),
+    "stem_y": RNG.uniform(0, 40, NUM_TREES),
+    "species": ["A"] * NUM_TREES,
+    "crown_ratio": RNG.uniform(0.3, 0.8, NUM_TREES),
+    "dbh": RNG.uniform(10, 50, NUM_TREES),
+    "top_height": RNG.uniform(10, 35, NUM_TREES),
+    "crown_radius": RNG.uniform(2, 4, NUM_TREES),
+})
+TREES = TreeListDataFrameModel(df)
+GRID = RasterGrid(origin=(-40, 80), cell_size=1.0, shape=(120, 180))
+TRUE_OFFSET = (2.0, -1.0)
+PLOTS = gpd.GeoDataFrame(
+    {"name": ["west", "east", "empty"]},
+    geometry=[shapely.box(0, 0, 40, 40), shapely.box(60, 0, 100, 40),
+              shapely.box(0, 60, 10, 70)],
+    crs="EPSG:26910",
+)
+
+
+@pytest.fixture
+def lidar_rasters(tmp_path):
+    """A lidar surface model of the trees at a known offset, and its DEM."""
+    rasterizer = CrownRasterizer.from_tree_list(TREES)
+    chm = rasterizer.rasterize(GRID, *TRUE_OFFSET, center=(50, 20))
+    profile = {
+        "driver": "GTiff", "height": GRID.shape[0], "width": GRID.shape[1],
+        "count": 1, "dtype": "float64", "transform": GRID.transform,
+        "crs": "EPSG:26910",
+    }
+    paths = tmp_path / "dsm.tif", tmp_path / "dem.tif"
+    for path, values in zip(paths, (chm + 100, np.full(GRID.shape, 100.0))):
+        with rasterio.open(path, "w", **profile) as dst:
+            dst.write(values, 1)
+    return paths
+
+
+@pytest.mark.parametrize("memmap", [False, True])
+def test_process_plots(lidar_rasters, tmp_path, memmap):
+    """Every plot is processed, and a failing plot does not stop the run."""
+    dsm_path, dem_path = lidar_rasters
+    output_dir = tmp_path / "plots"
+
+    with pytest.warns(UserWarning, match="1 of 3 plots failed: empty"):
+        results = process_plots(PLOTS, TREES, dsm_path, output_dir,
+                                dem_path=dem_path, plot_id_column="name",
+                                buffer=10, search={"max_rotation": 0},
+                                max_workers=2, memmap=memmap,
+                                cache_dir=tmp_path / "cache")
+
+    assert results["status"].tolist() == ["ok", "ok", "failed"]
+    assert "No trees" in results["error"].iloc[2]
+    assert (output_dir / "empty" / "error.txt").exists()
+    assert (output_dir / "results.csv").exists()
+
+    for name in ("west", "east"):
+        plot_dir = output_dir / name
+        trees = pd.read_csv(plot_dir / "trees.csv")
+        assert trees["stem_x"].between(*PLOTS.set_index("name").loc[name]
+                                       .geometry.bounds[::2]).all()
+        with rasterio.open(plot_dir / "chm.tif") as src:
+            assert np.nanmax(src.read(1)) < 40
+        assert (plot_dir / "simulated.tif").exists()
+        with open(plot_dir / "registration.json") as f:
+            registration = json.load(f)
+        assert np.allclose((registration["dx"], registration["dy"]),
+                           TRUE_OFFSET, atol=0.5)
+
+
+def test_process_plots_rejects_steps(lidar_rasters, tmp_path):
+    """Normalizing requires a DEM, and steps must be known."""
+    dsm_path, _ = lidar_rasters
+    with pytest.raises(ValueError):
+        process_plots(PLOTS, TREES, dsm_path, tmp_path, steps=("normalize",))
+    with pytest.raises(ValueError):
+        process_plots(PLOTS, TREES, dsm_path, tmp_path, steps=("mesh",))
+
+
+def test_process_plots_raises_bugs(lidar_rasters, tmp_path, monkeypatch):
+    """Errors that are not caused by the data of a plot stop the run, after
+    the plots that finished are written to results.csv."""
+    dsm_path, _ = lidar_rasters
+    run_pipeline = batch._run_pipeline
+
+    def broken_pipeline(plot_id, plot, outputs):
+        if plot_id == "empty":
+            raise KeyError("stem_x")
+        run_pipeline(plot_id, plot, outputs)
+
+    # worker processes are forked, so they run the patched pipeline
+    monkeypatch.setattr(batch, "_run_pipeline", broken_pipeline)
+    with pytest.raises(KeyError):
+        process_plots(PLOTS, TREES, dsm_path, tmp_path, steps=("clip",),
+                      plot_id_column="name", max_workers=1)
+
+    results = pd.read_csv(tmp_path / "results.csv")
+    assert results["plot_id"].tolist() == ["west", "east"]
+    assert results["status"].tolist() == ["ok", "ok"]
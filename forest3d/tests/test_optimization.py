@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+import shapely
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.optimization import (
+    METRICS,
+    PARAMETERS,
+    PlotLocationPosterior,
+    RegistrationObjective,
+    sample_plot_location,
+)
+from forest3d.utils.raster import CrownRasterizer, RasterGrid
+
+RNG = np.random.default_rng(3)
+NUM_TREES = 30
+df = pd.DataFrame({
+    "stem_x": RNG.uniform(0, 40, NUM_TREES),
+    "stem_y": RNG.uniform(0, 40, NUM_TREES),
+    "species": ["A"] * NUM_TREES,
+    "crown_ratio": RNG.uniform(0.3, 0.8, NUM_TREES),
+    "dbh": RNG.uniform(10, 50, NUM_TREES),
+    "top_height": RNG.uniform(10, 35, NUM_TREES),
+    "crown_radius": RNG.uniform(2, 4, NUM_TREES),
+})
+TREES = TreeListDataFrameModel(df)
+GRID = RasterGrid(origin=(-20, 60), cell_size=1.0, shape=(80, 80))
+TRUE_OFFSET = (3.0, -2.0)
+
+
+@pytest.fixture
+def lidar_chm(tmp_path):
+    """A CHM raster of the tree list at a known offset, with some nodata."""
+    rasterizer = CrownRasterizer.from_tree_list(TREES)
+    chm = rasterizer.rasterize(GRID, *TRUE_OFFSET, center=(20, 20))
+    chm[:5] = -9999
+    path = tmp_path / "chm.tif"
+    profile = {
+        "driver": "GTiff", "height": GRID.shape[0], "width": GRID.shape[1],
+        "count": 1, "dtype": "float64", "transform": GRID.transform,
+        "nodata": -9999,
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(chm, 1)
+    return path
+
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_objective_finds_offset(lidar_chm, metric):
+    """The true plot offset scores best among candidates, and perfectly."""
+    objective = RegistrationObjective.from_tree_list(
+        TREES, lidar_chm, bounds=(-10, -10, 50, 50), metric=metric,
+        center=(20, 20))
+    offsets = np.stack(np.meshgrid(np.arange(-4.0, 5.0), np.arange(-4.0, 5.0)),
+                       axis=-1).reshape(-1, 2)
+
+    scores = objective.evaluate(offsets)
+
+    assert objective.chm.shape == (60, 60)
+    assert scores.shape == (len(offsets),)
+    assert np.allclose(offsets[scores.argmin()], TRUE_OFFSET)
+    assert np.isclose(objective(*TRUE_OFFSET), 0, atol=1e-9)
+
+
+def test_objective_scores_rotation(lidar_chm):
+    """Rotating the trees away from their true orientation is penalized."""
+    objective = RegistrationObjective.from_tree_list(
+        TREES, lidar_chm, metric="iou", center=(20, 20))
+
+    scores = objective.evaluate([[*TRUE_OFFSET, 0], [*TRUE_OFFSET, 10]])
+
+    assert scores[0] < scores[1]
+
+
+def test_objective_rejects_unknown_metric():
+    """Only supported metrics can be used."""
+    with pytest.raises(ValueError):
+        RegistrationObjective(CrownRasterizer.from_tree_list(TREES),
+                              np.zeros(GRID.shape), GRID, metric="mae")
+
+
+def test_fft_search_finds_offset(lidar_chm):
+    """Cross-correlation finds the plot offset within the search window."""
+    window = shapely.box(-10, -10, 50, 50)
+    objective = RegistrationObjective.from_tree_list(
+        TREES, lidar_chm, bounds=window, center=(20, 20))
+
+    result = objective.fft_search()
+
+    assert np.allclose((result.dx, result.dy), TRUE_OFFSET, atol=0.1)
+    assert result.correlation > 0.99
+    assert result.correlations.ndim == 2
+
+
+def test_fft_search_sub_cell_offset():
+    """Offsets are refined to a fraction of a cell."""
+    rasterizer = CrownRasterizer.from_tree_list(TREES)
+    offset = (-6.4, 2.7)
+    chm = rasterizer.rasterize(GRID, *offset, center=(20, 20))
+    objective = RegistrationObjective(rasterizer, chm, GRID, center=(20, 20))
+
+    result = objective.fft_search()
+
+    assert np.allclose((result.dx, result.dy), offset, atol=0.25)
+
+
+def test_pyramid_search_finds_offset_and_rotation():
+    """Coarse-to-fine search recovers both the offset and the rotation."""
+    rasterizer = CrownRasterizer.from_tree_list(TREES)
+    chm = rasterizer.rasterize(GRID, *TRUE_OFFSET, rotation=4.0, center=(20, 20))
+    objective = RegistrationObjective(rasterizer, chm, GRID, center=(20, 20))
+
+    result = objective.pyramid_search(levels=(4, 2, 1), rotation_step=2.0)
+
+    assert np.allclose((result.dx, result.dy), TRUE_OFFSET, atol=0.25)
+    assert np.isclose(result.rotation, 4.0)
+    assert [level.factor for level in result.levels] == [4, 2, 1]
+    assert [level.num_rotations for level in result.levels] == [11, 5, 5]
+    assert all(level.seconds >= 0 for level in result.levels)
+
+
+def test_pyramid_search_without_rotation():
+    """Refined levels never search rotations beyond max_rotation."""
+    rasterizer = CrownRasterizer.from_tree_list(TREES)
+    chm = rasterizer.rasterize(GRID, *TRUE_OFFSET, center=(20, 20))
+    objective = RegistrationObjective(rasterizer, chm, GRID, center=(20, 20))
+    searched = []
+    match_template = objective._match_template
+
+    def record_rotation(image, image_start, factor, rotation):
+        searched.append(rotation)
+        return match_template(image, image_start, factor, rotation)
+
+    objective._match_template = record_rotation
+    result = objective.pyramid_search(levels=(4, 2, 1), max_rotation=0)
+
+    assert searched == [0, 0, 0]
+    assert [level.num_rotations for level in result.levels] == [1, 1, 1]
+    assert np.allclose((result.dx, result.dy), TRUE_OFFSET, atol=0.25)
+
+    searched.clear()
+    objective.pyramid_search(levels=(4, 2), max_rotation=1.0, rotation_step=1.0)
+    assert max(np.abs(searched)) <= 1.0
+
+
+def test_pyramid_search_rejects_levels():
+    """Levels must go from coarse to fine."""
+    objective = RegistrationObjective(CrownRasterizer.from_tree_list(TREES),
+                                      np.zeros(GRID.shape), GRID)
+    with pytest.raises(ValueError):
+        objective.pyramid_search(levels=(1, 2))
+
+
+def test_posterior_prefers_true_location(lidar_chm):
+    """The true plot location is more probable than a displaced one."""
+    objective = RegistrationObjective.from_tree_list(
+        TREES, lidar_chm, center=(20, 20))
+    posterior = PlotLocationPosterior(objective)
+
+    assert posterior((*TRUE_OFFSET, 0, 1)) > posterior((0, 0, 0, 1))
+    assert posterior((*TRUE_OFFSET, 0, 1)) > posterior((*TRUE_OFFSET, 0, 1.05))
+    assert posterior((*TRUE_OFFSET, 0, -1)) == -np.inf
+
+
+def test_sampler_streams_reproducible_chains(lidar_chm, tmp_path):
+    """Chains are written to disk and reproducible from a seed."""
+    objective = RegistrationObjective.from_tree_list(
+        TREES, lidar_chm, center=(20, 20))
+    posterior = PlotLocationPosterior(objective)
+    kwargs = {'num_samples': 30, 'num_chains': 2, 'initial': (*TRUE_OFFSET, 0, 1),
+              'seed': 42, 'max_workers': 2, 'flush_every': 7}
+
+    first = sample_plot_location(posterior, tmp_path / 'first.npy', **kwargs)
+    sample_plot_location(posterior, tmp_path / 'second.npy', **kwargs)
+
+    assert first.samples.shape == (2, 30, len(PARAMETERS) + 1)
+    assert np.all(np.isfinite(first.samples))
+    assert np.array_equal(first.samples, np.load(tmp_path / 'second.npy'))
+    assert not np.array_equal(first.samples[0], first.samples[1])
+    assert np.all((0 <= first.acceptance_rates) & (first.acceptance_rates <= 1))
+    assert first.samples_per_second_per_core > 0
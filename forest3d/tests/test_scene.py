@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.scene import ForestScene
+
+df = pd.DataFrame({
+    "stem_x": [x**2 for x in range(1, 4)],
+    "stem_y": [x for x in range(1, 4)],
+    "species": ["A", "b", "C"],
+    "crown_ratio": [x / 4.0 for x in range(1, 4)],
+    "dbh": [x * 1.20 for x in range(1, 4)],
+    "top_height": [x * 2 for x in range(1, 4)]
+})
+
+
+def test_scene_from_tree_list():
+    """ForestScene holds all crowns in one contiguous array."""
+    scene = ForestScene.from_tree_list(TreeListDataFrameModel(df))
+    assert scene.vertices.shape == (3, 3, 50, 32)
+    assert scene.vertices.flags.c_contiguous
+    assert scene.num_trees == 3
+    assert np.allclose(scene.center, (df.stem_x.mean(), df.stem_y.mean()))
+
+def test_scene_translate():
+    """Translating a scene moves every vertex and stem base."""
+    scene = ForestScene.from_tree_list(TreeListDataFrameModel(df))
+    original = scene.vertices.copy()
+    scene.translate(1.0, -2.0, 3.0)
+
+    assert np.allclose(scene.xs, original[0] + 1.0)
+    assert np.allclose(scene.ys, original[1] - 2.0)
+    assert np.allclose(scene.zs, original[2] + 3.0)
+    assert np.allclose(scene.stem_bases[:, 0], df.stem_x + 1.0)
+
+def test_scene_rotate_about_center():
+    """Rotating a scene preserves distances to the plot center."""
+    scene = ForestScene.from_tree_list(TreeListDataFrameModel(df), center=(0, 0))
+    original = scene.vertices.copy()
+    scene.rotate(90)
+
+    assert np.allclose(scene.xs, -original[1])
+    assert np.allclose(scene.ys, original[0])
+    assert np.allclose(scene.zs, original[2])
+    assert np.allclose(scene.stem_bases[:, 0], -df.stem_y)
+
+def test_scene_set_transform_does_not_accumulate():
+    """set_transform places the scene relative to its original geometry."""
+    scene = ForestScene.from_tree_list(TreeListDataFrameModel(df))
+    original = scene.vertices.copy()
+    scene.set_transform(5.0, 5.0, rotation=30)
+    scene.set_transform(5.0, 5.0, rotation=30)
+    twice = scene.vertices.copy()
+    scene.set_transform(5.0, 5.0, rotation=30)
+
+    assert np.allclose(scene.vertices, twice)
+    scene.set_transform()
+    assert np.allclose(scene.vertices, original)
+
+def test_scene_float32_agrees_with_float64():
+    """Single precision scenes agree with double precision within tolerance."""
+    scene64 = ForestScene.from_tree_list(TreeListDataFrameModel(df))
+    scene32 = ForestScene.from_tree_list(TreeListDataFrameModel(df), dtype=np.float32)
+    scene64.transform(2.0, -1.0, 0.5, rotation=15)
+    scene32.transform(2.0, -1.0, 0.5, rotation=15)
+
+    assert scene32.vertices.dtype == np.float32
+    assert np.allclose(scene32.vertices, scene64.vertices, atol=1e-3)
+
+def test_scene_to_mesh():
+    """A scene can be exported as a single triangle mesh."""
+    scene = ForestScene.from_tree_list(TreeListDataFrameModel(df), resolution="coarse")
+    vertices, faces = scene.to_mesh()
+    assert vertices.shape == (scene.vertices[0].size, 3)
+    assert faces.max() < len(vertices)
@@ -0,0 +1,252 @@
+"""Functions for indexing the footprints of lidar and raster tiles."""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+import rasterio
+import shapely
+
+# file extensions of tiles, by kind of tile
+EXTENSIONS = {
+    "lidar": (".las", ".laz"),
+    "raster": (".tif", ".tiff", ".img", ".vrt"),
+}
+
+# name of the file a catalog is saved to within the folder it indexes
+CATALOG_NAME = "forest3d_catalog.json"
+
+# the public header block of LAS files, which LAZ files keep uncompressed,
+# gives the extent of the points as max x, min x, max y, min y, max z, min z
+# starting at this byte
+LAS_EXTENT_OFFSET = 179
+
+TileRecord = namedtuple("TileRecord", ["path", "kind", "bounds", "mtime_ns", "size"])
+
+
+def _get_kind(path: str) -> str | None:
+    """Kind of tile a file is, from its extension, or None if not a tile."""
+    extension = os.path.splitext(path)[1].lower()
+    for kind, extensions in EXTENSIONS.items():
+        if extension in extensions:
+            return kind
+    return None
+
+
+def _read_las_bounds(path: str | os.PathLike) -> tuple[float, float, float, float]:
+    """Reads the extent of the points in a LAS or LAZ file from its header.
+
+    Parameters
+    -----------
+    path : string, path to file
+        a LAS or LAZ file
+
+    Returns:
+    --------
+    bounds : tuple of four floats
+        (left, bottom, right, top) coordinates of the points
+    """
+    with open(path, "rb") as f:
+        header = f.read(LAS_EXTENT_OFFSET + 48)
+    if len(header) < LAS_EXTENT_OFFSET + 48 or header[:4] != b"LASF":
+        message = f"{path} is not a LAS or LAZ file."
+        raise ValueError(message)
+    max_x, min_x, max_y, min_y = struct.unpack_from("<4d", header, LAS_EXTENT_OFFSET)
+    return min_x, min_y, max_x, max_y
+
+
+def _read_raster_bounds(path: str | os.PathLike) -> tuple[float, float, float, float]:
+    """Reads the extent of a raster from its header.
+
+    Parameters
+    -----------
+    path : string, path to file
+        a raster in a format that can be read by rasterio
+
+    Returns:
+    --------
+    bounds : tuple of four floats
+        (left, bottom, right, top) coordinates of the corners of the raster
+    """
+    with rasterio.open(path) as src:
+        transform = src.transform
+        height, width = src.shape
+    cols = np.array([0, width, width, 0])
+    rows = np.array([0, 0, height, height])
+    xs = transform.a * cols + transform.b * rows + transform.c
+    ys = transform.d * cols + transform.e * rows + transform.f
+    return xs.min(), ys.min(), xs.max(), ys.max()
+
+
+class TileCatalog:
+    """An index of the footprints of lidar and raster tiles in a folder.
+
+    The footprint of each tile is read from its header alone: the public
+    header block of LAS and LAZ files, or the transform of rasters. The
+    footprints are saved to a JSON file in the folder, and held in an STRtree
+    for querying, which is rebuilt from the saved footprints without reading
+    any tiles. When the catalog is refreshed, only tiles that are new, or
+    whose modification time or size changed, are read again.
+
+    Attributes:
+    -----------
+    directory : string
+        folder of tiles, searched recursively
+    path : string
+        path of the JSON file the catalog is saved to
+    tiles : list of TileRecord
+        path, kind ("lidar" or "raster"), bounds, modification time, and size
+        of each tile, sorted by path
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        path: str | os.PathLike | None = None,
+        refresh: bool = True,
+    ):
+        """Opens the catalog of a folder of tiles.
+
+        Parameters
+        -----------
+        directory : string, path to folder
+            folder of tiles, searched recursively for files with extensions
+            in EXTENSIONS
+        path : string, path to file, or None
+            JSON file the catalog is saved to. If None, CATALOG_NAME within
+            directory.
+        refresh : bool
+            if True, tiles added or changed since the catalog was saved are
+            read, and the catalog is saved if any were
+        """
+        self.directory = os.path.abspath(directory)
+        if path is None:
+            path = os.path.join(self.directory, CATALOG_NAME)
+        self.path = os.path.abspath(path)
+        self.tiles = []
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                saved = json.load(f)
+            self.tiles = [
+                TileRecord(
+                    os.path.join(self.directory, tile["path"]),
+                    tile["kind"],
+                    tuple(tile["bounds"]),
+                    tile["mtime_ns"],
+                    tile["size"],
+                )
+                for tile in saved["tiles"]
+            ]
+        self._build_index()
+        if refresh:
+            self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    def _build_index(self) -> None:
+        """Builds the STRtree of the footprints of the tiles."""
+        bounds = np.array([tile.bounds for tile in self.tiles]).reshape(-1, 4)
+        self._tree = shapely.STRtree(shapely.box(*bounds.T))
+
+    def _scan(self) -> dict[str, os.stat_result]:
+        """Paths and file status of every tile in the folder."""
+        found = {}
+        folders = [self.directory]
+        while folders:
+            with os.scandir(folders.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        folders.append(entry.path)
+                    elif _get_kind(entry.name) and entry.path != self.path:
+                        found[entry.path] = entry.stat()
+        return found
+
+    def refresh(self) -> int:
+        """Reads the headers of tiles added or changed since the last refresh.
+
+        Tiles that were removed are dropped from the catalog, and the catalog
+        is saved if any tile was added, changed, or removed.
+
+        Returns:
+        --------
+        num_changed : int
+            number of tiles added, changed, or removed
+        """
+        found = self._scan()
+        known = {tile.path: tile for tile in self.tiles}
+        tiles = []
+        num_changed = len(set(known) - set(found))
+        for path, stat in found.items():
+            tile = known.get(path)
+            if tile is None or (tile.mtime_ns, tile.size) != (
+                stat.st_mtime_ns,
+                stat.st_size,
+            ):
+                kind = _get_kind(path)
+                if kind == "lidar":
+                    bounds = _read_las_bounds(path)
+                else:
+                    bounds = _read_raster_bounds(path)
+                tile = TileRecord(
+                    path,
+                    kind,
+                    tuple(float(b) for b in bounds),
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+                num_changed += 1
+            tiles.append(tile)
+
+        if num_changed:
+            self.tiles = sorted(tiles)
+            self._build_index()
+            self.save()
+        return num_changed
+
+    def save(self) -> None:
+        """Saves the catalog, with paths relative to its folder."""
+        tiles = [
+            {
+                **tile._asdict(),
+                "path": os.path.relpath(tile.path, self.directory),
+            }
+            for tile in self.tiles
+        ]
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"tiles": tiles}, f)
+        os.replace(temp_path, self.path)
+
+    def query(
+        self,
+        geometry: shapely.Geometry | tuple[float, float, float, float],
+        kind: str | None = None,
+    ) -> list[str]:
+        """Finds the tiles whose footprints intersect an area.
+
+        Parameters
+        -----------
+        geometry : shapely geometry, or tuple of four numerics
+            area to search, e.g., a plot buffered by the distance to read
+            around it, or its (left, bottom, right, top) bounds
+        kind : string, or None
+            kind of tiles to find, "lidar" or "raster", or None for both
+
+        Returns:
+        --------
+        paths : list of strings
+            paths of the tiles intersecting the area, sorted
+        """
+        if not isinstance(geometry, shapely.Geometry):
+            geometry = shapely.box(*geometry)
+        indices = np.sort(self._tree.query(geometry, predicate="intersects"))
+        return [
+            self.tiles[i].path
+            for i in indices
+            if kind is None or self.tiles[i].kind == kind
+        ]
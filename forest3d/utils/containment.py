@@ -0,0 +1,557 @@
+"""Functions for testing which points fall inside modeled tree crowns."""
+
+from __future__ import annotations
+
+from collections import namedtuple
+
+import numpy as np
+import numpy.typing as npt
+from forest3d.models.dataframe import TreeListDataFrameModel, _get_crown_parameters
+from forest3d.utils.geometry import (
+    _get_crown_profiles,
+    _get_hull_apex_and_base,
+    _get_peripheral_points,
+    _get_treetop_location,
+)
+
+# number of points evaluated at a time, which bounds the size of temporary
+# arrays to a few hundred megabytes regardless of how many points are tested
+CHUNK_SIZE = 2**20
+
+CrownSurfaces = namedtuple(
+    "CrownSurfaces",
+    [
+        "translate",
+        "hull_apex",
+        "hull_base",
+        "top_table",
+        "bottom_table",
+        "bounds",
+    ],
+)
+
+PeriodicTable = namedtuple("PeriodicTable", ["keys", "starts", "values"])
+
+
+def _make_periodic_table(thetas: np.ndarray, *values: np.ndarray) -> PeriodicTable:
+    """Tabulates functions of angle for many trees, to be searched at once.
+
+    Angles are kept from decreasing from the angle of the first entry, and
+    are offset by 4 * pi for each tree, so that the tables
+    of every tree form one sorted array that can be searched with a single
+    call to `np.searchsorted`.
+
+    Parameters
+    -----------
+    thetas : array with shape (N, K)
+        unwrapped angles of the entries for each of N trees, in order around
+        the tree and with the last entry one full turn from the first
+    values : arrays with shape (N, K)
+        values of each function at those angles
+
+    Returns:
+    --------
+    table : PeriodicTable
+        keys, the offset angles with shape (N * K,); starts, the angle of the
+        first entry of each tree with shape (N,); and values, the function
+        values with shape (len(values), N * K)
+    """
+    thetas = np.maximum.accumulate(thetas, axis=-1)
+    starts = thetas[:, 0]
+    offsets = 4 * np.pi * np.arange(len(thetas))
+    keys = thetas - starts[:, np.newaxis] + offsets[:, np.newaxis]
+    return PeriodicTable(
+        keys.reshape(-1), starts, np.stack([arr.reshape(-1) for arr in values])
+    )
+
+
+def _lookup_periodic_table(
+    table: PeriodicTable, thetas: np.ndarray, tree_ids: np.ndarray
+) -> np.ndarray:
+    """Linearly interpolates tabulated functions of angle.
+
+    Parameters
+    -----------
+    table : PeriodicTable
+        tabulated functions of N trees
+    thetas : array with shape (M,)
+        angles at which to interpolate
+    tree_ids : integer array with shape (M,)
+        index of the tree each angle refers to
+
+    Returns:
+    --------
+    values : array with shape (len(table.values), M)
+        interpolated values of each function
+    """
+    num_angles = len(table.keys) // len(table.starts)
+    first = tree_ids * num_angles
+    keys = np.mod(thetas - table.starts[tree_ids], 2 * np.pi)
+    keys += 4 * np.pi * tree_ids
+
+    idx = np.searchsorted(table.keys, keys, side="right") - 1
+    np.clip(idx, first, first + num_angles - 2, out=idx)
+
+    key_left = table.keys[idx]
+    spacing = table.keys[idx + 1] - key_left
+    weights = np.divide(
+        keys - key_left, spacing, out=np.zeros_like(keys), where=spacing > 0
+    )
+
+    values_left = table.values[:, idx]
+    return values_left + weights * (table.values[:, idx + 1] - values_left)
+
+
+def _expand_counts(counts: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Enumerates a run of consecutive items for each of several owners.
+
+    Parameters
+    -----------
+    counts : integer array with shape (K,)
+        number of items belonging to each owner
+
+    Returns:
+    --------
+    owners, offsets : integer arrays with shape (sum(counts),)
+        index of the owner of each item, and position of each item within the
+        items of its owner
+    """
+    owners = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, offsets
+
+
+def _get_crown_surfaces(
+    tree_params: dict[str, npt.NDArray], num_angles: int = 361
+) -> CrownSurfaces:
+    """Gathers what is needed to evaluate the crown surfaces of many trees.
+
+    The top of each crown is interpolated by angle about the apex between the
+    four peripheral points, so only those points are tabulated. The bottom of
+    each crown is described by angle about the crown base, which is not
+    linear in the angle about the apex, so the peripheral line is tabulated
+    at many angles instead. Where the base is close to the peripheral line,
+    the line can fold back on itself as seen from the base, and only the
+    outermost part of the fold is kept.
+
+    Parameters
+    -----------
+    tree_params : dict
+        arrays describing N trees, keyed by the argument names of
+        `forest3d.utils.geometry._make_crown_hulls`
+    num_angles : int
+        number of angles at which to tabulate the bottom of each crown
+
+    Returns:
+    --------
+    surfaces : CrownSurfaces
+        translate, hull_apex, and hull_base with shape (N, 3); top_table, the
+        horizontal distance from the apex to the peripheral line, height of
+        the peripheral line, and shape of the top of the crown by angle about
+        the apex; bottom_table, the same for the bottom of the crown by
+        angle about the crown base; and bounds with shape (N, 6), the
+        (xmin, ymin, zmin, xmax, ymax, zmax) bounding box of each crown
+    """
+    top_heights = np.asanyarray(tree_params["top_heights"], dtype=float)
+    crown_ratios = np.asanyarray(tree_params["crown_ratios"], dtype=float)
+    crown_radii = np.asanyarray(tree_params["crown_radii"], dtype=float)
+    crown_edge_heights = np.asanyarray(tree_params["crown_edge_heights"], dtype=float)
+    crown_shapes = np.asanyarray(tree_params["crown_shapes"], dtype=float)
+    stem_bases = np.asanyarray(tree_params["stem_bases"], dtype=float)
+
+    translate = _get_treetop_location(
+        stem_bases.T,
+        top_heights,
+        tree_params.get("lean_directions"),
+        tree_params.get("lean_severities"),
+    ).T
+    periph_points = _get_peripheral_points(
+        crown_radii, crown_edge_heights, top_heights, crown_ratios
+    )
+    hull_apex, hull_base = _get_hull_apex_and_base(
+        crown_radii, top_heights, crown_ratios
+    )
+
+    # peripheral points in order of angle about the apex, closing the loop
+    top_xs = periph_points[..., 0] - hull_apex[:, 0:1]
+    top_ys = periph_points[..., 1] - hull_apex[:, 1:2]
+    top_thetas = np.arctan2(top_ys, top_xs)
+    order = np.argsort(top_thetas, axis=-1)
+    order = np.concatenate((order, order[:, :1]), axis=-1)
+    top_thetas = np.take_along_axis(top_thetas, order, axis=-1)
+    top_thetas[:, -1] += 2 * np.pi
+    top_table = _make_periodic_table(
+        top_thetas,
+        *(
+            np.take_along_axis(arr, order, axis=-1)
+            for arr in (
+                np.hypot(top_xs, top_ys),
+                periph_points[..., 2],
+                crown_shapes[:, 0],
+            )
+        ),
+    )
+
+    profiles = _get_crown_profiles(
+        top_heights,
+        crown_ratios,
+        crown_radii,
+        crown_edge_heights,
+        crown_shapes,
+        np.linspace(0, 2 * np.pi, num_angles),
+    )
+    bottom_table = _make_periodic_table(
+        np.unwrap(profiles.bottom_thetas, axis=-1),
+        profiles.bottom_radii,
+        profiles.periph_line_zs,
+        profiles.bottom_shapes,
+    )
+
+    # crowns are widest at the peripheral line
+    periph_line = (
+        np.stack((profiles.periph_line_xs, profiles.periph_line_ys), axis=-1)
+        + translate[:, np.newaxis, :2]
+    )
+    bounds = np.column_stack(
+        (
+            periph_line.min(axis=1),
+            hull_base[:, 2] + translate[:, 2],
+            periph_line.max(axis=1),
+            hull_apex[:, 2] + translate[:, 2],
+        )
+    )
+
+    return CrownSurfaces(
+        translate, hull_apex, hull_base, top_table, bottom_table, bounds
+    )
+
+
+def _profile_heights(
+    radii: np.ndarray, max_radii: np.ndarray, shapes: np.ndarray
+) -> np.ndarray:
+    """Proportion of the crown profile length at a radius along the profile.
+
+    Inverts the crown profile r = R * (1 - t**p)**(1/p) for t, the
+    proportion of the distance from the peripheral line to the apex or base,
+    at radii no further out than the peripheral line.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        proportions = np.clip(radii / max_radii, 0, 1)
+    np.nan_to_num(proportions, copy=False, nan=1.0)
+    return (1 - proportions**shapes) ** (1 / shapes)
+
+
+def _get_crown_tops(
+    xs: np.ndarray, ys: np.ndarray, tree_ids: np.ndarray, surfaces: CrownSurfaces
+) -> (np.ndarray, np.ndarray):
+    """Evaluates the top surface of crowns at horizontal locations.
+
+    Parameters
+    -----------
+    xs, ys : arrays with shape (M,)
+        horizontal coordinates relative to the crown translation, i.e., with
+        `surfaces.translate` already subtracted
+    tree_ids : integer array with shape (M,)
+        index of the tree each location refers to
+    surfaces : CrownSurfaces
+        tabulated crown surfaces
+
+    Returns:
+    --------
+    covered : boolean array with shape (M,)
+        whether each location falls within the peripheral line of its crown
+    zs : array with shape (M,)
+        height of the top of the crown, relative to the crown translation,
+        which is the height of the peripheral line where not covered
+    """
+    apex_x, apex_y, apex_z = surfaces.hull_apex[tree_ids].T
+
+    # the top of the crown, by angle about the apex
+    top_dists = np.hypot(xs - apex_x, ys - apex_y)
+    top_radii, periph_zs, top_shapes = _lookup_periodic_table(
+        surfaces.top_table, np.arctan2(ys - apex_y, xs - apex_x), tree_ids
+    )
+    top_zs = periph_zs + (apex_z - periph_zs) * _profile_heights(
+        top_dists, top_radii, top_shapes
+    )
+    return top_dists <= top_radii, top_zs
+
+
+def _points_in_crown_chunk(
+    points: np.ndarray, tree_ids: np.ndarray, surfaces: CrownSurfaces
+) -> np.ndarray:
+    """Tests whether each point is inside the crown of its tree."""
+    xs, ys, zs = (points[:, i] - surfaces.translate[tree_ids, i] for i in range(3))
+    base_x, base_y, base_z = surfaces.hull_base[tree_ids].T
+
+    covered, top_zs = _get_crown_tops(xs, ys, tree_ids, surfaces)
+
+    # the bottom of the crown, by angle about the crown base
+    bottom_dists = np.hypot(xs - base_x, ys - base_y)
+    bottom_radii, periph_zs, bottom_shapes = _lookup_periodic_table(
+        surfaces.bottom_table, np.arctan2(ys - base_y, xs - base_x), tree_ids
+    )
+    bottom_zs = periph_zs - (periph_zs - base_z) * _profile_heights(
+        bottom_dists, bottom_radii, bottom_shapes
+    )
+
+    return covered & (zs <= top_zs) & (zs >= bottom_zs)
+
+
+def points_in_crown(
+    points: npt.NDArray,
+    tree_params: dict[str, npt.NDArray],
+    tree_ids: npt.NDArray | None = None,
+    num_angles: int = 361,
+) -> np.ndarray:
+    """Tests whether points fall inside the crowns of trees.
+
+    The crown surface is evaluated directly at the angle and height of each
+    point. Seen from above, a point must fall within the peripheral line (the
+    line of maximum crown width), where the top and bottom of the crown are
+    each a single surface height. The point is inside the crown when it lies
+    between those two heights. No crown hull or mesh is built, so memory use
+    grows with the number of trees and not the number of points.
+
+    Strongly asymmetric crowns, e.g., with radii differing more than
+    three-fold, can place the crown base or apex near or beyond the
+    peripheral line, where the modeled crown surface folds over itself and
+    containment is only approximate.
+
+    Parameters
+    -----------
+    points : array with shape (M, 3)
+        (x,y,z) coordinates of points, e.g., lidar returns
+    tree_params : dict
+        arrays describing N trees, keyed by the argument names of
+        `forest3d.utils.geometry._make_crown_hulls`, e.g., as returned by
+        `forest3d.models.dataframe._get_crown_parameters`. Lean directions
+        and severities are optional.
+    tree_ids : integer array with shape (M,), or None
+        index of the tree that each point is tested against, with negative
+        values for points that are not tested, which are reported as outside
+        every crown. May only be None when tree_params describe a single
+        tree.
+    num_angles : int
+        number of angles at which the bottom of each crown is tabulated
+
+    Returns:
+    --------
+    inside : boolean array with shape (M,)
+        whether each point falls inside the crown of its tree
+    """
+    points = np.asanyarray(points, dtype=float)
+    if points.ndim != 2 or points.shape[-1] != 3:
+        message = "points must have shape (M, 3)."
+        raise ValueError(message)
+
+    num_trees = len(tree_params["top_heights"])
+    if tree_ids is None:
+        if num_trees != 1:
+            message = "tree_ids must be provided when testing more than one tree."
+            raise ValueError(message)
+        tree_ids = np.zeros(len(points), dtype=np.intp)
+    tree_ids = np.asanyarray(tree_ids, dtype=np.intp)
+    if tree_ids.shape != points.shape[:1]:
+        message = "tree_ids must have one entry for each point."
+        raise ValueError(message)
+    if np.any(tree_ids >= num_trees):
+        message = f"tree_ids must be less than the number of trees, {num_trees}."
+        raise ValueError(message)
+
+    surfaces = _get_crown_surfaces(tree_params, num_angles)
+    inside = np.zeros(len(points), dtype=bool)
+    for start in range(0, len(points), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        tested = np.flatnonzero(tree_ids[chunk] >= 0) + start
+        inside[tested] = _points_in_crown_chunk(
+            points[tested], tree_ids[tested], surfaces
+        )
+
+    return inside
+
+
+class CrownIndex:
+    """A grid over the crowns of a tree list for assigning points to trees.
+
+    Each crown is listed in every cell of a regular horizontal grid that its
+    bounding box overlaps, so that each point is only tested against the
+    crowns listed in its cell whose bounding box it also falls within, rather
+    than against every crown. Candidate crowns are then tested exactly with
+    the same crown surfaces as `points_in_crown`.
+
+    Attributes:
+    -----------
+    num_trees : int
+        number of trees in the index
+    bounds : array with shape (N, 6)
+        (xmin, ymin, zmin, xmax, ymax, zmax) bounding box of each crown
+    origin : array with shape (2,)
+        (x,y) coordinates of the lower left corner of the grid
+    cell_size : float
+        width and height of grid cells
+    shape : tuple of two ints
+        number of grid cells in the y and x directions
+    """
+
+    def __init__(
+        self,
+        tree_params: dict[str, npt.NDArray],
+        cell_size: float | None = None,
+        num_angles: int = 361,
+    ):
+        """Builds an index over the crowns of many trees.
+
+        Parameters
+        -----------
+        tree_params : dict
+            arrays describing N trees, keyed by the argument names of
+            `forest3d.utils.geometry._make_crown_hulls`
+        cell_size : numeric, or None
+            width and height of grid cells. If None, the mean crown width is
+            used, so that each crown overlaps about four cells.
+        num_angles : int
+            number of angles at which the bottom of each crown is tabulated
+        """
+        self._surfaces = _get_crown_surfaces(tree_params, num_angles)
+        self.bounds = self._surfaces.bounds
+        self.num_trees = len(self.bounds)
+
+        widths = self.bounds[:, 3:5] - self.bounds[:, 0:2]
+        if cell_size is None:
+            cell_size = widths.mean() if self.num_trees else 1.0
+        if not cell_size > 0:
+            message = "cell_size must be greater than 0."
+            raise ValueError(message)
+        self.cell_size = float(cell_size)
+
+        if self.num_trees:
+            self.origin = self.bounds[:, 0:2].min(axis=0)
+            upper = self.bounds[:, 3:5].max(axis=0)
+        else:
+            self.origin = upper = np.zeros(2)
+        num_x, num_y = (np.floor((upper - self.origin) / self.cell_size) + 1).astype(
+            np.intp
+        )
+        self.shape = (int(num_y), int(num_x))
+
+        # cells overlapped by the bounding box of each crown
+        first_x, first_y = self._get_cells(self.bounds[:, 0:2]).T
+        last_x, last_y = self._get_cells(self.bounds[:, 3:5]).T
+        widths_in_cells = last_x - first_x + 1
+        counts = widths_in_cells * (last_y - first_y + 1)
+        tree_ids, offsets = _expand_counts(counts)
+        cell_xs = first_x[tree_ids] + offsets % widths_in_cells[tree_ids]
+        cell_ys = first_y[tree_ids] + offsets // widths_in_cells[tree_ids]
+        cells = cell_ys * num_x + cell_xs
+
+        # crowns are listed by cell, and from the highest crown top down, so
+        # that the first crown found to contain a point is the highest
+        order = np.lexsort((-self.bounds[tree_ids, 5], cells))
+        self._cell_trees = tree_ids[order]
+        self._cell_starts = np.searchsorted(cells[order], np.arange(num_x * num_y + 1))
+
+    @classmethod
+    def from_tree_list(
+        cls,
+        trees: TreeListDataFrameModel,
+        cell_size: float | None = None,
+        num_angles: int = 361,
+    ) -> CrownIndex:
+        """Builds an index over the crowns of every tree in a tree list.
+
+        Parameters
+        -----------
+        trees : TreeListDataFrameModel
+            a validated dataframe or geodataframe
+        cell_size : numeric, or None
+            width and height of grid cells, or None for the mean crown width
+        num_angles : int
+            number of angles at which the bottom of each crown is tabulated
+        """
+        return cls(_get_crown_parameters(trees), cell_size, num_angles)
+
+    def _get_cells(self, xys: np.ndarray) -> np.ndarray:
+        """Column and row of the grid cells containing (x,y) coordinates."""
+        return np.floor((xys - self.origin) / self.cell_size).astype(np.intp)
+
+    def query(self, points: npt.NDArray) -> np.ndarray:
+        """Finds the crown that each point falls inside.
+
+        Where crowns overlap, points are assigned to the crown with the
+        highest top.
+
+        Parameters
+        -----------
+        points : array with shape (M, 3)
+            (x,y,z) coordinates of points, e.g., lidar returns
+
+        Returns:
+        --------
+        tree_ids : integer array with shape (M,)
+            index of the tree whose crown each point falls inside, or -1 for
+            points outside every crown
+        """
+        points = np.asanyarray(points, dtype=float)
+        if points.ndim != 2 or points.shape[-1] != 3:
+            message = "points must have shape (M, 3)."
+            raise ValueError(message)
+
+        # number of candidate crowns listed in the cell of each point
+        cell_xs, cell_ys = self._get_cells(points[:, :2]).T
+        num_y, num_x = self.shape
+        on_grid = (
+            (cell_xs >= 0) & (cell_xs < num_x) & (cell_ys >= 0) & (cell_ys < num_y)
+        )
+        cells = np.where(on_grid, cell_ys * num_x + cell_xs, 0)
+        counts = np.where(
+            on_grid, self._cell_starts[cells + 1] - self._cell_starts[cells], 0
+        )
+
+        # split points into chunks with a bounded number of candidates
+        ends = np.cumsum(counts)
+        splits = np.searchsorted(
+            ends, np.arange(CHUNK_SIZE, ends[-1] if len(ends) else 0, CHUNK_SIZE)
+        )
+        breaks = np.unique(np.concatenate(([0], splits, [len(points)])))
+
+        tree_ids = np.full(len(points), -1, dtype=np.intp)
+        for start, stop in zip(breaks[:-1], breaks[1:]):
+            chunk = slice(start, stop)
+            tree_ids[chunk] = self._query_chunk(
+                points[chunk], cells[chunk], counts[chunk]
+            )
+
+        return tree_ids
+
+    def _query_chunk(
+        self, points: np.ndarray, cells: np.ndarray, counts: np.ndarray
+    ) -> np.ndarray:
+        """Finds the crown that each point falls inside, for a chunk of points."""
+        # every pairing of a point with a crown listed in its cell
+        point_ids, offsets = _expand_counts(counts)
+        candidates = self._cell_trees[
+            np.repeat(self._cell_starts[cells], counts) + offsets
+        ]
+
+        # discard crowns whose bounding box does not contain the point
+        candidate_points = points[point_ids]
+        candidate_bounds = self.bounds[candidates]
+        in_box = np.all(
+            (candidate_points >= candidate_bounds[:, :3])
+            & (candidate_points <= candidate_bounds[:, 3:]),
+            axis=-1,
+        )
+        point_ids, candidates = point_ids[in_box], candidates[in_box]
+
+        inside = _points_in_crown_chunk(
+            candidate_points[in_box], candidates, self._surfaces
+        )
+        point_ids, candidates = point_ids[inside], candidates[inside]
+
+        # candidates are in order from the highest crown down, so the first
+        # crown containing each point is kept
+        tree_ids = np.full(len(points), -1, dtype=np.intp)
+        _, first = np.unique(point_ids, return_index=True)
+        tree_ids[point_ids[first]] = candidates[first]
+        return tree_ids
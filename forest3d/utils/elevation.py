@@ -0,0 +1,692 @@
+"""Functions for sampling elevations from digital elevation models."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import numpy.typing as npt
+import rasterio
+from rasterio.windows import Window
+
+# what happens to points outside the DEM or on cells without data
+MISSING_POLICIES = ("raise", "nan", "mask")
+
+# methods of interpolating elevations between the centers of cells
+METHODS = ("nearest", "bilinear", "bicubic")
+
+# shape of the blocks that memory-mapped rasters are sampled in
+MEMMAP_BLOCK_SHAPE = (512, 512)
+
+# cells read beyond each side of a block, enough for the neighbors of every
+# point in the block for any method
+HALO = 2
+
+BlockCacheInfo = namedtuple(
+    "BlockCacheInfo", ["hits", "misses", "maxbytes", "currbytes"]
+)
+
+
+def _get_weights(fractions: np.ndarray, method: str) -> (np.ndarray, np.ndarray):
+    """Weights of neighboring cells for interpolating along one axis.
+
+    Parameters
+    -----------
+    fractions : array with shape (M,)
+        distance of each point past the center of the cell before it, as a
+        proportion of the cell size
+    method : str
+        "bilinear" or "bicubic"
+
+    Returns:
+    --------
+    offsets : array with shape (K,)
+        offsets from the cell before each point of the K neighboring cells
+    weights : array with shape (M, K)
+        weight of each neighboring cell
+    """
+    t = fractions[:, np.newaxis]
+    if method == "bilinear":
+        return np.array([0, 1]), np.hstack((1 - t, t))
+
+    # cubic convolution with a = -0.5 (Catmull-Rom), which reproduces the
+    # cell values at cell centers and has a continuous first derivative
+    return np.array([-1, 0, 1, 2]), np.hstack(
+        (
+            ((-0.5 * t + 1.0) * t - 0.5) * t,
+            (1.5 * t - 2.5) * t * t + 1,
+            ((-1.5 * t + 2.0) * t + 0.5) * t,
+            (0.5 * t - 0.5) * t * t,
+        )
+    )
+
+
+def _invert_transform(transform: rasterio.Affine) -> np.ndarray:
+    """Coefficients of the inverse of an affine transform.
+
+    Parameters
+    -----------
+    transform : rasterio.Affine
+        transform from (col, row) to (x,y) coordinates
+
+    Returns:
+    --------
+    coefficients : array with shape (2, 3)
+        (a, b, c) and (d, e, f) such that col = a * x + b * y + c and
+        row = d * x + e * y + f
+    """
+    a, b, c = transform.a, transform.b, transform.c
+    d, e, f = transform.d, transform.e, transform.f
+    determinant = a * e - b * d
+    if determinant == 0:
+        message = "The transform of the DEM cannot be inverted."
+        raise ValueError(message)
+    return (
+        np.array(
+            [
+                [e, -b, b * f - e * c],
+                [-d, a, d * c - a * f],
+            ]
+        )
+        / determinant
+    )
+
+
+def _get_cache_paths(
+    path: str | os.PathLike, cache_dir: str | os.PathLike | None, band: int
+) -> (str, str):
+    """Paths of the array and sidecar caching a band of a raster."""
+    path = os.path.abspath(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(tempfile.gettempdir(), "forest3d_rasters")
+    digest = hashlib.sha1(f"{path}:{band}".encode()).hexdigest()[:16]
+    name = f"{os.path.splitext(os.path.basename(path))[0]}-{digest}"
+    return (
+        os.path.join(cache_dir, f"{name}.npy"),
+        os.path.join(cache_dir, f"{name}.json"),
+    )
+
+
+def _read_sidecar(sidecar_path: str, source_path: str) -> dict | None:
+    """Metadata of a cached raster, or None if the cache is missing or stale."""
+    try:
+        with open(sidecar_path) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(source_path)
+    if (metadata["mtime_ns"], metadata["size"]) != (stat.st_mtime_ns, stat.st_size):
+        return None
+    return metadata
+
+
+def cache_raster(
+    path: str | os.PathLike,
+    cache_dir: str | os.PathLike | None = None,
+    band: int = 1,
+) -> (str, dict):
+    """Converts a band of a raster into an uncompressed, memory-mappable array.
+
+    The band is written, one block at a time, to a .npy file, with a JSON
+    sidecar holding its transform, CRS, and nodata value, and the
+    modification time and size of the source raster. The cache is reused
+    until the source raster changes, so the raster is only decoded once, and
+    every process that memory-maps the array shares the same pages of
+    memory. Files are written under temporary names and then renamed, so that
+    processes caching the same raster at once never read partial files.
+
+    Parameters
+    -----------
+    path : string, path to file
+        a raster in a format that can be read by rasterio
+    cache_dir : string, path to folder, or None
+        folder to write cached rasters to. If None, a folder within the
+        system's temporary directory is used.
+    band : int
+        band of the raster to cache
+
+    Returns:
+    --------
+    array_path : string
+        path to the .npy file of the band
+    metadata : dict
+        contents of the sidecar: shape, dtype, transform (the six
+        coefficients of the affine transform), crs (as WKT, or None), nodata,
+        band, source, mtime_ns, and size
+    """
+    path = os.path.abspath(path)
+    array_path, sidecar_path = _get_cache_paths(path, cache_dir, band)
+    metadata = _read_sidecar(sidecar_path, path)
+    if metadata is not None and os.path.exists(array_path):
+        return array_path, metadata
+
+    os.makedirs(os.path.dirname(array_path), exist_ok=True)
+    stat = os.stat(path)
+    with rasterio.open(path) as src:
+        transform = src.transform
+        metadata = {
+            "source": path,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "band": band,
+            "shape": list(src.shape),
+            "dtype": src.dtypes[band - 1],
+            "transform": [
+                transform.a,
+                transform.b,
+                transform.c,
+                transform.d,
+                transform.e,
+                transform.f,
+            ],
+            "crs": src.crs.to_wkt() if src.crs else None,
+            "nodata": src.nodata,
+        }
+        temp_path = f"{array_path}.{os.getpid()}.tmp"
+        values = np.lib.format.open_memmap(
+            temp_path, mode="w+", dtype=metadata["dtype"], shape=src.shape
+        )
+        for _, window in src.block_windows(band):
+            values[window.toslices()] = src.read(band, window=window)
+        values.flush()
+        del values
+
+    os.replace(temp_path, array_path)
+    temp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(metadata, f)
+    os.replace(temp_path, sidecar_path)
+    return array_path, metadata
+
+
+def open_cached_raster(
+    path: str | os.PathLike,
+    cache_dir: str | os.PathLike | None = None,
+    band: int = 1,
+) -> (np.memmap, dict):
+    """Memory-maps a band of a raster, caching it first if needed.
+
+    Parameters
+    -----------
+    path, cache_dir, band
+        as for `cache_raster`
+
+    Returns:
+    --------
+    values : read-only memory-mapped array with shape (rows, cols)
+        values of the band
+    metadata : dict
+        metadata of the cached band, as for `cache_raster`
+    """
+    array_path, metadata = cache_raster(path, cache_dir, band)
+    return np.load(array_path, mmap_mode="r"), metadata
+
+
+def _check_method(method: str) -> None:
+    """Raises if a method of interpolation is not recognized."""
+    if method not in METHODS:
+        message = f"method must be one of {METHODS}, not {method!r}."
+        raise ValueError(message)
+
+
+class DemSampler:
+    """Samples elevations from a digital elevation model at many points.
+
+    The DEM is opened once, and coordinates are converted to rows and
+    columns using the inverse of the affine transform of the DEM for all
+    points at once. Only the blocks of the DEM (e.g., the tiles of a tiled
+    GeoTIFF) that contain query points are read, and decoded blocks are kept
+    in a least-recently-used cache of at most `cache_bytes`, so memory use
+    depends on the extent of the queries rather than the size of the DEM.
+
+    Elevations are interpolated between the centers of cells with one of
+    METHODS: "nearest" returns the value of the cell containing each point,
+    "bilinear" interpolates linearly between the four nearest cell centers,
+    and "bicubic" uses cubic convolution over the sixteen nearest. Beyond the
+    outermost cell centers, the edge cells are extended.
+
+    Points outside the DEM, or that would use cells without data, are
+    missing, and handled according to the `missing` policy:
+
+        - "raise": raises an IndexError
+        - "nan": returns NaN for missing points, as floats
+        - "mask": returns a masked array, with missing points masked
+
+    Attributes:
+    -----------
+    path : string
+        path to the DEM
+    band : int
+        band of the DEM sampled
+    missing : str
+        policy for missing points, one of MISSING_POLICIES
+    method : str
+        method of interpolating elevations, one of METHODS
+    bounds : tuple of four floats
+        (left, bottom, right, top) coordinates of the DEM
+    shape : tuple of two ints
+        number of rows and columns in the DEM
+    nodata : numeric, or None
+        value of cells without data
+    dtype : np.dtype
+        data type of the DEM
+    crs : string, or None
+        coordinate reference system of the DEM, as WKT
+    block_shape : tuple of two ints
+        number of rows and columns in each block of the DEM
+    cache_bytes : int
+        maximum size of the decoded blocks held in the cache, beyond the
+        block being read
+    hits : int
+        number of blocks retrieved from the cache
+    misses : int
+        number of blocks read from the DEM
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        band: int = 1,
+        missing: str = "raise",
+        cache_bytes: int = 256 * 2**20,
+        method: str = "nearest",
+        memmap: bool = False,
+        cache_dir: str | os.PathLike | None = None,
+    ):
+        """Opens a DEM for sampling.
+
+        Parameters
+        -----------
+        path : string, path to file
+            a digital elevation model in a format that can be read by
+            rasterio
+        band : int
+            band of the DEM to sample
+        missing : str
+            policy for points outside the DEM or on cells without data, one
+            of MISSING_POLICIES
+        cache_bytes : int
+            maximum size of the decoded blocks held in the cache
+        method : str
+            method of interpolating elevations, one of METHODS
+        memmap : bool
+            if True, the DEM is sampled from an uncompressed copy made by
+            `cache_raster`, which is memory-mapped rather than opened with
+            rasterio, so that many processes can share it without decoding
+            it or holding copies of its blocks
+        cache_dir : string, path to folder, or None
+            folder of the memory-mapped copy, as for `cache_raster`
+        """
+        if missing not in MISSING_POLICIES:
+            message = f"missing must be one of {MISSING_POLICIES}, not {missing!r}."
+            raise ValueError(message)
+        _check_method(method)
+        self.method = method
+        self.path = os.fspath(path)
+        self.band = band
+        self.missing = missing
+        if memmap:
+            self._src = None
+            self._memmap, metadata = open_cached_raster(self.path, cache_dir, band)
+            self.shape = self._memmap.shape
+            self.nodata = metadata["nodata"]
+            self.dtype = self._memmap.dtype
+            self.crs = metadata["crs"]
+            transform = rasterio.Affine(*metadata["transform"])
+            self.block_shape = MEMMAP_BLOCK_SHAPE
+        else:
+            self._memmap = None
+            self._src = rasterio.open(self.path)
+            self.shape = self._src.shape
+            self.nodata = self._src.nodata
+            self.dtype = np.dtype(self._src.dtypes[band - 1])
+            self.crs = self._src.crs.to_wkt() if self._src.crs else None
+            transform = self._src.transform
+            self.block_shape = tuple(self._src.block_shapes[band - 1])
+        self._inverse = _invert_transform(transform)
+        self.cache_bytes = int(cache_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._blocks = OrderedDict()
+        self._cached_bytes = 0
+
+        # bounds of the corners of the DEM, which may be rotated
+        cols, rows = np.meshgrid((0, self.shape[1]), (0, self.shape[0]))
+        xs = transform.a * cols + transform.b * rows + transform.c
+        ys = transform.d * cols + transform.e * rows + transform.f
+        self.bounds = (
+            float(xs.min()),
+            float(ys.min()),
+            float(xs.max()),
+            float(ys.max()),
+        )
+
+    def __enter__(self) -> DemSampler:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Closes the DEM."""
+        if self._src is not None:
+            self._src.close()
+        self._memmap = None
+
+    def cache_info(self) -> BlockCacheInfo:
+        """Reports hit and miss statistics and the size of the block cache."""
+        return BlockCacheInfo(
+            self.hits, self.misses, self.cache_bytes, self._cached_bytes
+        )
+
+    def cache_clear(self) -> None:
+        """Removes all blocks from the cache and resets statistics."""
+        self._blocks.clear()
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get_block(self, block_row: int, block_col: int) -> np.ndarray:
+        """Values of a block of the DEM, read on first use."""
+        block_height, block_width = self.block_shape
+        if self._memmap is not None:
+            # the operating system caches pages of memory-mapped rasters
+            return self._memmap[
+                block_row * block_height : (block_row + 1) * block_height,
+                block_col * block_width : (block_col + 1) * block_width,
+            ]
+
+        key = (block_row, block_col)
+        block = self._blocks.get(key)
+        if block is not None:
+            self.hits += 1
+            self._blocks.move_to_end(key)
+            return block
+
+        self.misses += 1
+        window = Window(
+            block_col * block_width,
+            block_row * block_height,
+            min(block_width, self.shape[1] - block_col * block_width),
+            min(block_height, self.shape[0] - block_row * block_height),
+        )
+        block = self._src.read(self.band, window=window)
+        self._blocks[key] = block
+        self._cached_bytes += block.nbytes
+        while self._cached_bytes > self.cache_bytes and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+        return block
+
+    def _read(
+        self, rows: np.ndarray, cols: np.ndarray, inside: np.ndarray
+    ) -> np.ndarray:
+        """Values of the cells at rows and columns, one block at a time.
+
+        Cells that are not inside the DEM are set to 0.
+        """
+        values = np.zeros(rows.shape, dtype=self.dtype)
+        points = np.flatnonzero(inside)
+        order, groups = self._group_by_block(rows.ravel()[points], cols.ravel()[points])
+        points = points[order]
+        rows, cols = rows.ravel()[points], cols.ravel()[points]
+        block_height, block_width = self.block_shape
+
+        sorted_values = np.empty(len(points), dtype=values.dtype)
+        for block_row, block_col, group in groups:
+            block = self._get_block(block_row, block_col)
+            sorted_values[group] = block[
+                rows[group] - block_row * block_height,
+                cols[group] - block_col * block_width,
+            ]
+        values.reshape(-1)[points] = sorted_values
+        return values
+
+    def _group_by_block(
+        self, rows: np.ndarray, cols: np.ndarray
+    ) -> (np.ndarray, list[tuple[int, int, slice]]):
+        """Groups cells by the block that contains them.
+
+        Grouping lets each block be read at most once per query.
+
+        Returns:
+        --------
+        order : array of ints
+            order of the cells that sorts them by block
+        groups : list of tuples
+            block_row and block_col of each block containing cells, and the
+            slice of the sorted cells within it
+        """
+        block_height, block_width = self.block_shape
+        block_rows, block_cols = rows // block_height, cols // block_width
+        num_block_cols = -(-self.shape[1] // block_width)
+        keys = block_rows * num_block_cols + block_cols
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.diff(keys, prepend=-1))
+        stops = np.append(starts[1:], len(order))
+        return order, [
+            (
+                int(keys[start] // num_block_cols),
+                int(keys[start] % num_block_cols),
+                slice(start, stop),
+            )
+            for start, stop in zip(starts, stops)
+        ]
+
+    def _read_window(
+        self, first_row: int, first_col: int, shape: tuple[int, int]
+    ) -> np.ndarray:
+        """Values of a window of cells, with edge cells extended beyond the DEM."""
+        num_rows, num_cols = self.shape
+        row_start, row_stop = max(first_row, 0), min(first_row + shape[0], num_rows)
+        col_start, col_stop = max(first_col, 0), min(first_col + shape[1], num_cols)
+        block_height, block_width = self.block_shape
+
+        window = np.empty(
+            (row_stop - row_start, col_stop - col_start),
+            dtype=self.dtype,
+        )
+        for block_row in range(
+            row_start // block_height, (row_stop - 1) // block_height + 1
+        ):
+            block_top = block_row * block_height
+            rows = slice(
+                max(row_start, block_top), min(row_stop, block_top + block_height)
+            )
+            for block_col in range(
+                col_start // block_width, (col_stop - 1) // block_width + 1
+            ):
+                block_left = block_col * block_width
+                cols = slice(
+                    max(col_start, block_left), min(col_stop, block_left + block_width)
+                )
+                window[
+                    rows.start - row_start : rows.stop - row_start,
+                    cols.start - col_start : cols.stop - col_start,
+                ] = self._get_block(block_row, block_col)[
+                    rows.start - block_top : rows.stop - block_top,
+                    cols.start - block_left : cols.stop - block_left,
+                ]
+
+        return np.pad(
+            window,
+            (
+                (row_start - first_row, first_row + shape[0] - row_stop),
+                (col_start - first_col, first_col + shape[1] - col_stop),
+            ),
+            mode="edge",
+        )
+
+    def _interpolate(
+        self, rows: np.ndarray, cols: np.ndarray, inside: np.ndarray, method: str
+    ) -> (np.ndarray, np.ndarray):
+        """Interpolates elevations at fractional rows and columns.
+
+        Parameters
+        -----------
+        rows, cols : arrays of floats
+            fractional row and column of each point, with cell centers at
+            half-integers
+        inside : array of bools
+            whether each point is within the DEM; other points are set to 0
+        method : str
+            "bilinear" or "bicubic"
+
+        Returns:
+        --------
+        values : array of floats with the shape of rows
+            interpolated elevation at each point
+        without_data : array of bools with the shape of rows
+            whether the neighboring cells of each point include any without
+            data
+        """
+        values = np.zeros(rows.shape)
+        without_data = np.zeros(rows.shape, dtype=bool)
+        points = np.flatnonzero(inside)
+        rows, cols = rows.ravel()[points] - 0.5, cols.ravel()[points] - 0.5
+        first_rows = np.floor(rows).astype(np.intp)
+        first_cols = np.floor(cols).astype(np.intp)
+
+        # points before the first cell center belong with the first block
+        order, groups = self._group_by_block(
+            np.maximum(first_rows, 0), np.maximum(first_cols, 0)
+        )
+        points, rows, cols = points[order], rows[order], cols[order]
+        first_rows, first_cols = first_rows[order], first_cols[order]
+        offsets, row_weights = _get_weights(rows - first_rows, method)
+        _, col_weights = _get_weights(cols - first_cols, method)
+
+        block_height, block_width = self.block_shape
+        sorted_values = np.empty(len(points))
+        sorted_without_data = np.zeros(len(points), dtype=bool)
+        for block_row, block_col, group in groups:
+            window_row = block_row * block_height - HALO
+            window_col = block_col * block_width - HALO
+            window = self._read_window(
+                window_row,
+                window_col,
+                (block_height + 2 * HALO, block_width + 2 * HALO),
+            )
+            # flat indices of the neighbors of each point within the window
+            starts = (first_rows[group] - window_row) * window.shape[1] + (
+                first_cols[group] - window_col
+            )
+            neighbors = window.ravel()[
+                starts[:, np.newaxis, np.newaxis]
+                + offsets[:, np.newaxis] * window.shape[1]
+                + offsets
+            ]
+            if self.nodata is not None:
+                sorted_without_data[group] = np.any(
+                    np.isnan(neighbors)
+                    if np.isnan(self.nodata)
+                    else neighbors == self.nodata,
+                    axis=(1, 2),
+                )
+            sorted_values[group] = np.einsum(
+                "ij,ijk,ik->i", row_weights[group], neighbors, col_weights[group]
+            )
+
+        values.reshape(-1)[points] = sorted_values
+        without_data.reshape(-1)[points] = sorted_without_data
+        return values, without_data
+
+    def index(
+        self, x: npt.ArrayLike, y: npt.ArrayLike
+    ) -> (np.ndarray, np.ndarray, np.ndarray):
+        """Rows and columns of the cells of the DEM containing points.
+
+        Parameters
+        -----------
+        x, y : numeric, or arrays of numeric values with the same shape
+            coordinates of points
+
+        Returns:
+        --------
+        rows, cols : arrays of ints with the shape of x
+            row and column of the cell containing each point
+        inside : array of bools with the shape of x
+            whether each point is within the DEM
+        """
+        rows, cols, inside = self._locate(x, y)
+        rows = np.where(inside, np.floor(rows), 0).astype(np.intp)
+        cols = np.where(inside, np.floor(cols), 0).astype(np.intp)
+        return rows, cols, inside
+
+    def _locate(
+        self, x: npt.ArrayLike, y: npt.ArrayLike
+    ) -> (np.ndarray, np.ndarray, np.ndarray):
+        """Fractional rows and columns of points, and whether they are inside."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if x.shape != y.shape:
+            message = f"Input shapes mismatch: {x.shape} and {y.shape}"
+            raise ValueError(message)
+
+        (a, b, c), (d, e, f) = self._inverse
+        cols = a * x + b * y + c
+        rows = d * x + e * y + f
+        with np.errstate(invalid="ignore"):
+            inside = (
+                (rows >= 0)
+                & (rows < self.shape[0])
+                & (cols >= 0)
+                & (cols < self.shape[1])
+            )
+        return rows, cols, inside
+
+    def sample(
+        self, x: npt.ArrayLike, y: npt.ArrayLike, method: str | None = None
+    ) -> np.ndarray:
+        """Elevations of the DEM at points.
+
+        Parameters
+        -----------
+        x, y : numeric, or arrays of numeric values with the same shape
+            coordinates of points
+        method : str, or None
+            method of interpolating elevations, one of METHODS. If None, the
+            method of the sampler is used.
+
+        Returns:
+        --------
+        elevations : array with the shape of x
+            elevation at each point, with the data type of the DEM for
+            "nearest" and as floats otherwise. Scalar coordinates return a
+            scalar.
+        """
+        method = self.method if method is None else method
+        _check_method(method)
+        if method == "nearest":
+            rows, cols, inside = self.index(x, y)
+            values = self._read(rows, cols, inside)
+            missing = ~inside
+            if self.nodata is not None:
+                missing |= (
+                    np.isnan(values) if np.isnan(self.nodata) else values == self.nodata
+                )
+        else:
+            rows, cols, inside = self._locate(x, y)
+            values, without_data = self._interpolate(rows, cols, inside, method)
+            missing = ~inside | without_data
+
+        if missing.any():
+            if self.missing == "raise":
+                message = (
+                    f"{np.count_nonzero(missing)} (x,y) location(s) outside "
+                    f"bounds of elevation raster, or without data: {self.bounds}"
+                )
+                raise IndexError(message)
+            if self.missing == "nan":
+                values = np.where(missing, np.nan, values)
+        if self.missing == "mask":
+            values = np.ma.masked_array(values, missing)
+
+        return values[()]
+
+    __call__ = sample
@@ -0,0 +1,158 @@
+"""Functions for simulating stem maps with field measurement error."""
+
+from __future__ import annotations
+
+from collections.abc import Callable
+
+import numpy as np
+from forest3d.models.dataframe import (
+    DIRECTIONS,
+    TreeListDataFrameModel,
+    _get_crown_parameters,
+)
+
+# smallest height, crown ratio, and crown radius a realization may have, so
+# that errors drawn for small trees never produce degenerate crowns
+MIN_SIZE = 0.01
+
+ErrorDistribution = float | Callable[[np.random.Generator, tuple], np.ndarray]
+
+
+def _draw_errors(
+    error: ErrorDistribution, rng: np.random.Generator, shape: tuple
+) -> np.ndarray | float:
+    """Draws measurement errors from a distribution.
+
+    Parameters
+    -----------
+    error : numeric, or callable
+        standard deviation of normally-distributed errors, or a function
+        that takes a random number generator and a shape and returns an
+        array of errors with that shape, e.g.,
+        ``lambda rng, shape: rng.uniform(-1, 1, shape)``
+    rng : np.random.Generator
+        random number generator to draw errors with
+    shape : tuple of ints
+        shape of the errors to draw
+
+    Returns:
+    --------
+    errors : array with shape shape, or 0
+        errors drawn, or 0 when the standard deviation is 0
+    """
+    if callable(error):
+        errors = np.asarray(error(rng, shape), dtype=float)
+        if errors.shape != shape:
+            message = f"Error distribution returned shape {errors.shape}, not {shape}."
+            raise ValueError(message)
+        return errors
+    if error < 0:
+        message = "Standard deviations of errors cannot be negative."
+        raise ValueError(message)
+    if error == 0:
+        return 0
+    return rng.normal(0, error, shape)
+
+
+def make_ensemble(
+    trees: TreeListDataFrameModel,
+    num_realizations: int,
+    stem_location_error: ErrorDistribution = 0.0,
+    height_error: ErrorDistribution = 0.0,
+    crown_ratio_error: ErrorDistribution = 0.0,
+    crown_radius_error: ErrorDistribution = 0.0,
+    seed: int | np.random.Generator | None = None,
+) -> dict[str, np.ndarray]:
+    """Draws realizations of a tree list with field measurement errors.
+
+    Errors are drawn for every tree in every realization at once, and added
+    to the measured values. Errors in stem location are drawn independently
+    in x and y. A single crown radius error is drawn for each tree when the
+    tree list has a single crown_radius column, and one for each direction
+    when it has crown radii for each direction. Heights and crown radii are
+    kept at or above MIN_SIZE, and crown ratios between MIN_SIZE and 1.
+
+    Parameters
+    -----------
+    trees : TreeListDataFrameModel
+        a validated dataframe or geodataframe of N measured trees
+    num_realizations : int
+        number of realizations, K, of the tree list to draw
+    stem_location_error, height_error, crown_ratio_error, crown_radius_error
+        : numeric, or callable
+        standard deviation of normally-distributed errors, in the units of
+        the tree list, or a function that takes a random number generator and
+        a shape and returns an array of errors with that shape
+    seed : int, np.random.Generator, or None
+        seed or generator for drawing errors
+
+    Returns:
+    --------
+    params : dict
+        arrays with shape (K, N, ...) keyed by the argument names of
+        `forest3d.utils.geometry._make_crown_hulls`. Parameters without
+        errors are read-only views of the measured values. Use
+        `flatten_ensemble` to build or rasterize the crowns of all
+        realizations in a single pass.
+    """
+    rng = np.random.default_rng(seed)
+    measured = _get_crown_parameters(trees)
+    num_trees = len(trees)
+    shape = (int(num_realizations), num_trees)
+
+    params = {
+        name: np.broadcast_to(values, shape + values.shape[1:])
+        for name, values in measured.items()
+    }
+
+    xy_errors = _draw_errors(stem_location_error, rng, shape + (2,))
+    if not np.isscalar(xy_errors):
+        stem_bases = params["stem_bases"].copy()
+        stem_bases[..., :2] += xy_errors
+        params["stem_bases"] = stem_bases
+
+    height_errors = _draw_errors(height_error, rng, shape)
+    if not np.isscalar(height_errors):
+        params["top_heights"] = np.maximum(
+            measured["top_heights"] + height_errors, MIN_SIZE
+        )
+
+    ratio_errors = _draw_errors(crown_ratio_error, rng, shape)
+    if not np.isscalar(ratio_errors):
+        params["crown_ratios"] = np.clip(
+            measured["crown_ratios"] + ratio_errors, MIN_SIZE, 1
+        )
+
+    radii_by_direction = all(
+        f"crown_radius_{direction}" in trees.columns for direction in DIRECTIONS
+    )
+    radius_errors = _draw_errors(
+        crown_radius_error, rng, shape + ((4,) if radii_by_direction else (1,))
+    )
+    if not np.isscalar(radius_errors):
+        params["crown_radii"] = np.maximum(
+            measured["crown_radii"] + radius_errors, MIN_SIZE
+        )
+
+    return params
+
+
+def flatten_ensemble(params: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Combines the realizations of an ensemble into a single tree list.
+
+    Parameters
+    -----------
+    params : dict
+        arrays with shape (K, N, ...), e.g., from `make_ensemble`
+
+    Returns:
+    --------
+    params : dict
+        arrays with shape (K * N, ...), in which the trees of realization k
+        are rows k * N to (k + 1) * N, which can be passed directly to
+        `forest3d.utils.geometry._make_crown_hulls` or
+        `forest3d.utils.raster.CrownRasterizer`
+    """
+    return {
+        name: values.reshape(-1, *values.shape[2:]) for name, values in params.items()
+    }
@@ -4,15 +4,50 @@ from __future__ import annotations
 
 import json
 import os
-import subprocess
-import warnings
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from tempfile import TemporaryDirectory
 
 import numpy as np
 import numpy.typing as npt
 import pdal
 import rasterio
+from forest3d.utils.catalog import _read_las_bounds
+from forest3d.utils.elevation import DemSampler
 from shapely.geometry import Point, Polygon
 
+# named levels of detail for crown hulls, as (number of heights, number of
+# angles) at which the crown surface is sampled
+CROWN_RESOLUTIONS = {
+    "coarse": (12, 16),
+    "default": (50, 32),
+    "fine": (100, 64),
+}
+
+# fewest points in a tile of a point cloud that is meshed; tiles with fewer
+# points, e.g., at the corners of the point cloud, are left empty
+MIN_TILE_POINTS = 100
+
+CrownCacheInfo = namedtuple("CrownCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+CrownProfiles = namedtuple(
+    "CrownProfiles",
+    [
+        "hull_apex",
+        "hull_base",
+        "thetas",
+        "periph_line_xs",
+        "periph_line_ys",
+        "periph_line_zs",
+        "top_radii",
+        "top_shapes",
+        "bottom_thetas",
+        "bottom_radii",
+        "bottom_shapes",
+    ],
+)
+
 
 def _arrays_equal_shape(*args: np.ndarray, raise_exc: bool = True) -> bool:
     """Confirms all inputs, when converted  arrays, have equal shape.
@@ -41,6 +76,38 @@ def _arrays_equal_shape(*args: np.ndarray, raise_exc: bool = True) -> bool:
     return equal_shapes
 
 
+def _get_crown_resolution(resolution: str | tuple[int, int]) -> tuple[int, int]:
+    """Resolves a crown resolution into the dimensions of a crown grid.
+
+    Parameters
+    -----------
+    resolution : string, or tuple of two ints
+        name of a level of detail in CROWN_RESOLUTIONS (e.g., "coarse",
+        "default", or "fine"), or the (number of heights, number of angles) at
+        which to sample the crown surface
+
+    Returns:
+    --------
+    num_heights, num_angles : ints
+        number of heights and angles at which crown surface is sampled
+    """
+    if isinstance(resolution, str):
+        if resolution not in CROWN_RESOLUTIONS:
+            message = (
+                f"Unrecognized crown resolution '{resolution}', "
+                f"expected one of {list(CROWN_RESOLUTIONS)}."
+            )
+            raise ValueError(message)
+        return CROWN_RESOLUTIONS[resolution]
+
+    num_heights, num_angles = (int(n) for n in resolution)
+    if num_heights < 2 or num_angles < 2:
+        message = "crown resolution must have at least 2 heights and 2 angles."
+        raise ValueError(message)
+
+    return num_heights, num_angles
+
+
 def _get_raster_bbox_as_polygon(path_to_raster: str | os.PathLike) -> Polygon:
     """Returns a Shapely Polygon defining the bounding box of a raster.
 
@@ -69,54 +136,42 @@ def _get_raster_bbox_as_polygon(path_to_raster: str | os.PathLike) -> Polygon:
 
 
 def get_elevation(
-    dem: str | os.PathLike, x: float | np.ndarray, y: float | np.ndarray
+    dem: str | os.PathLike | DemSampler,
+    x: float | np.ndarray,
+    y: float | np.ndarray,
+    missing: str = "raise",
+    method: str | None = None,
 ) -> float | np.ndarray:
     """Calculates elevations from a DEM at specified (x, y) coordinates.
 
     Parameters
     ----------
-    dem : string, path to file
-        A digital elevation model in a format that can be read by rasterio.
+    dem : string, path to file, or DemSampler
+        A digital elevation model in a format that can be read by rasterio,
+        or a DemSampler that has already opened one, e.g., to sample the same
+        DEM repeatedly.
     x : numeric, or numpy array of numeric values
         x-coordinate(s) of points to query
     y : numeric, or numpy array of numeric values
         y-coordinate(s) of points to query
+    missing : str
+        policy for points outside the DEM or on cells without data, one of
+        MISSING_POLICIES. Ignored when dem is a DemSampler.
+    method : str, or None
+        method of interpolating elevations between cell centers, one of
+        METHODS, e.g., "bilinear" to avoid stair-stepping on steep terrain.
+        If None, the method of the DemSampler is used, or "nearest" when dem
+        is a path.
 
     Returns:
     --------
     elev : numpy array
         elevation at specified (x, y) coordinates
     """
-    with rasterio.open(dem) as src:
-        BAND_ONE = 1
-        terrain = src.read(BAND_ONE)
-
-    # check that inputs are equal shape
-    _arrays_equal_shape(x, y)
-
-    coords = np.stack((x, y))
-    # have rasterio identify the rows and columns where these coordinates occur
-    if coords.shape == (2,):
-        rows, cols = src.index(x, y)
-    else:
-        rows, cols = [], []
-        for x_val, y_val in zip(x, y):
-            row, col = src.index(x_val, y_val)
-            rows.append(row), cols.append(row)
-    # rows, cols = src.index(*coords)
-    rows = np.array(rows)
-    cols = np.array(cols)
-    # index into the raster at these rows and columns
-    try:
-        elev = terrain[rows, cols]
-    except IndexError:
-        bounds = src.bounds
-        error_msg = f"""
-        (x,y) location outside bounds of elevation raster:
-        {bounds}"""
-        raise IndexError(error_msg)
-
-    return elev
+    if isinstance(dem, DemSampler):
+        return dem.sample(x, y, method)
+    with DemSampler(dem, missing=missing) as sampler:
+        return sampler.sample(x, y, method)
 
 
 def _get_treetop_location(
@@ -195,17 +250,21 @@ def _get_peripheral_points(
     crown_edge_heights: np.ndarray,
     top_height: float | np.ndarray,
     crown_ratio: float | np.ndarray,
+    dtype: npt.DTypeLike = float,
 ) -> np.ndarray:
     """Calculates the x,y,z coordinates of the points of maximum crown width.
 
-    One point for E, N, W, and S directions around a tree.
+    One point for E, N, W, and S directions around a tree. Inputs may carry
+    leading batch dimensions, e.g., crown_radii with shape (N, 4) and
+    top_height with shape (N,), in which case one set of points is returned
+    for each tree.
 
     Parameters
     -----------
-    crown_radii : array of numerics, shape (4,)
+    crown_radii : array of numerics, shape (4,) or (..., 4)
         distance from stem base to point of maximum crown width in each
         direction. Order of radii expected is E, N, W, S.
-    crown_edge_heights : array of numerics, shape (4,)
+    crown_edge_heights : array of numerics, shape (4,) or (..., 4)
         proportion of crown length above point of maximum crown width in each
         direction. Order expected is E, N, W, S. For example, values of
         (0, 0, 0, 0) would indicate that maximum crown width in all directions
@@ -216,43 +275,31 @@ def _get_peripheral_points(
         vertical height of the tree apex from the base of the stem
     crown_ratio : numeric, or array of numeric values
         ratio of live crown length to total tree height
+    dtype : data-type
+        floating point type of the coordinates returned
 
     Returns:
     --------
-    periph_pts : array with shape (4, 3)
+    periph_pts : array with shape (4, 3) or (..., 4, 3)
         (x,y,z) coordinates of points at maximum crown width
     """
+    crown_radii = np.asanyarray(crown_radii, dtype=dtype)
+    crown_edge_heights = np.asanyarray(crown_edge_heights, dtype=dtype)
+    top_height = np.asanyarray(top_height, dtype=dtype)[..., np.newaxis]
+    crown_ratio = np.asanyarray(crown_ratio, dtype=dtype)[..., np.newaxis]
+
     crown_base_height = top_height * (1 - crown_ratio)
     crown_length = crown_ratio * top_height
 
-    (crown_radius_east, crown_radius_north, crown_radius_west, crown_radius_south) = (
-        crown_radii
-    )
-    (crown_edgeht_east, crown_edgeht_north, crown_edgeht_west, crown_edgeht_south) = (
-        crown_edge_heights
-    )
-
-    east_point = np.array(
-        (crown_radius_east, 0, crown_base_height + crown_edgeht_east * crown_length),
-        dtype=float,
-    )
-
-    north_point = np.array(
-        (0, crown_radius_north, crown_base_height + crown_edgeht_north * crown_length),
-        dtype=float,
+    # unit vectors pointing E, N, W, and S
+    periph_xs = crown_radii * np.array((1, 0, -1, 0), dtype=dtype)
+    periph_ys = crown_radii * np.array((0, 1, 0, -1), dtype=dtype)
+    periph_zs = crown_base_height + crown_edge_heights * crown_length
+    periph_xs, periph_ys, periph_zs = np.broadcast_arrays(
+        periph_xs, periph_ys, periph_zs
     )
 
-    west_point = np.array(
-        (-crown_radius_west, 0, crown_base_height + crown_edgeht_west * crown_length),
-        dtype=float,
-    )
-
-    south_point = np.array(
-        (0, -crown_radius_south, crown_base_height + crown_edgeht_south * crown_length),
-        dtype=float,
-    )
-
-    return np.stack((east_point, north_point, west_point, south_point))
+    return np.stack((periph_xs, periph_ys, periph_zs), axis=-1)
 
 
 def _get_hull_center_xy(crown_radii: np.ndarray) -> np.ndarray:
@@ -263,25 +310,26 @@ def _get_hull_center_xy(crown_radii: np.ndarray) -> np.ndarray:
 
     Parameters
     -----------
-    crown_radii : array of numerics, shape (4,)
+    crown_radii : array of numerics, shape (4,) or (..., 4)
         distance from stem base to point of maximum crown width in each
         direction. Order of radii expected is E, N, W, S.
 
     Returns:
     --------
-    center_xy : array with shape (2,)
+    center_xy : array with shape (2,) or (..., 2)
         x,y coordinates of the center of the crown hull
     """
     crown_radii = np.asanyarray(crown_radii)
-    crown_radii_eastwest = crown_radii[0::2]
-    crown_radii_northsouth = crown_radii[1::2]
-    center_xy = np.array(
-        (np.diff(crown_radii_eastwest / 2), np.diff(crown_radii_northsouth) / 2)
-    )
-    return center_xy[:, 0]
+    crown_radii_eastwest = crown_radii[..., 0::2]
+    crown_radii_northsouth = crown_radii[..., 1::2]
+    center_x = np.diff(crown_radii_eastwest / 2, axis=-1)[..., 0]
+    center_y = np.diff(crown_radii_northsouth, axis=-1)[..., 0] / 2
+    return np.stack((center_x, center_y), axis=-1)
 
 
-def _get_hull_eccentricity(crown_radii: np.ndarray, crown_ratio: float) -> np.ndarray:
+def _get_hull_eccentricity(
+    crown_radii: np.ndarray, crown_ratio: float | np.ndarray
+) -> np.ndarray:
     """Calculates eccentricity-index values for an asymmetric hull.
 
     Represents a tree crown, with eccentricity-index values used to determine
@@ -299,38 +347,44 @@ def _get_hull_eccentricity(crown_radii: np.ndarray, crown_ratio: float) -> np.nd
 
     Parameters
     -----------
-    crown_radii : array of numerics, shape (4,)
+    crown_radii : array of numerics, shape (4,) or (..., 4)
         distance from stem base to point of maximum crown width in each
         direction. Order of radii expected is E, N, W, S.
-    crown_ratio : numeric
+    crown_ratio : numeric, or array of numeric values
         ratio of live crown length to total tree height
 
     Returns:
     --------
-    idx : array with shape (2, 2)
+    idx : array with shape (2, 2) or (..., 2, 2)
         eccentricity-index values for the top (0, ) and bottom of a tree (1, ).
     """
+    crown_radii = np.asanyarray(crown_radii)
+    crown_ratio = np.asanyarray(crown_ratio)[..., np.newaxis]
     center_xy = _get_hull_center_xy(crown_radii)
-    center_x, center_y = center_xy
-    crown_radii_eastwest = crown_radii[0::2]
-    crown_radii_northsouth = crown_radii[1::2]
+    crown_radii_eastwest = crown_radii[..., 0::2]
+    crown_radii_northsouth = crown_radii[..., 1::2]
 
-    eccen = np.array(
+    eccen = center_xy / np.stack(
         (
-            center_x / crown_radii_eastwest.mean(),  # x direction
-            center_y / crown_radii_northsouth.mean(),  # y direction
-        )
+            crown_radii_eastwest.mean(axis=-1),  # x direction
+            crown_radii_northsouth.mean(axis=-1),  # y direction
+        ),
+        axis=-1,
     )
-    return np.array(
+    return np.stack(
         (
             -2 / np.pi * np.arctan(eccen) * crown_ratio,  # top of tree, x and y
-            2 / np.pi * np.arctan(eccen) * crown_ratio,
-        )
-    )  # bottom of tree, x and y
+            2 / np.pi * np.arctan(eccen) * crown_ratio,  # bottom of tree, x and y
+        ),
+        axis=-2,
+    )
 
 
 def _get_hull_apex_and_base(
-    crown_radii: np.ndarray, top_height: float | np.ndarray, crown_ratio: float
+    crown_radii: np.ndarray,
+    top_height: float | np.ndarray,
+    crown_ratio: float | np.ndarray,
+    dtype: npt.DTypeLike = float,
 ) -> (np.ndarray, np.ndarray):
     """Calculates the (x,y,z) position of the apex and base of a tree crown.
 
@@ -339,60 +393,176 @@ def _get_hull_apex_and_base(
 
     Parameters
     -----------
-    crown_radii : array of numerics, shape (4,)
+    crown_radii : array of numerics, shape (4,) or (..., 4)
         distance from stem base to point of maximum crown width in each
         direction. Order of radii expected is E, N, W, S.
     top_height : numeric, or array of numeric values
         vertical height of the tree apex from the base of the stem
-    crown_ratio : numeric
+    crown_ratio : numeric, or array of numeric values
         ratio of live crown length to total tree height
-
+    dtype : data-type
+        floating point type of the coordinates returned
 
     Returns:
     --------
-    hull_apex, hull_base : arrays with shape (3,)
+    hull_apex, hull_base : arrays with shape (3,) or (..., 3)
         (x,y,z) coordinates for apex and base of hull representing tree crown
     """
-    crown_radii = np.asanyarray(crown_radii)
+    crown_radii = np.asanyarray(crown_radii, dtype=dtype)
+    top_height = np.asanyarray(top_height, dtype=dtype)
+    crown_ratio = np.asanyarray(crown_ratio, dtype=dtype)
 
     center_xy = _get_hull_center_xy(crown_radii)
     eccen_idx = _get_hull_eccentricity(crown_radii, crown_ratio)
 
-    center_x, center_y = center_xy
-    crown_radii_eastwest = crown_radii[0::2]
-    crown_radii_northsouth = crown_radii[1::2]
-    top_eccen_eastwest, top_eccen_northsouth = eccen_idx[0]
-    bottom_eccen_eastwest, bottom_eccen_northsouth = eccen_idx[1]
-
-    hull_apex = np.array(
-        (
-            center_x
-            + np.diff(crown_radii_eastwest)[0]
-            * top_eccen_eastwest,  # x location of crown apex
-            center_x
-            + np.diff(crown_radii_northsouth)[0]
-            * top_eccen_northsouth,  # y location of crown apex
+    center_x, center_y = center_xy[..., 0], center_xy[..., 1]
+    diff_eastwest = np.diff(crown_radii[..., 0::2], axis=-1)[..., 0]
+    diff_northsouth = np.diff(crown_radii[..., 1::2], axis=-1)[..., 0]
+    top_eccen_eastwest = eccen_idx[..., 0, 0]
+    top_eccen_northsouth = eccen_idx[..., 0, 1]
+    bottom_eccen_eastwest = eccen_idx[..., 1, 0]
+    bottom_eccen_northsouth = eccen_idx[..., 1, 1]
+
+    hull_apex = np.stack(
+        np.broadcast_arrays(
+            center_x + diff_eastwest * top_eccen_eastwest,  # x location of apex
+            center_x + diff_northsouth * top_eccen_northsouth,  # y location of apex
             top_height,
         ),
-        dtype=float,
+        axis=-1,
     )
 
-    hull_base = np.array(
-        (
-            center_x
-            + np.diff(crown_radii_eastwest)[0]
-            * bottom_eccen_eastwest,  # x location of crown base
-            center_y
-            + np.diff(crown_radii_northsouth)[0]
-            * bottom_eccen_northsouth,  # y location of crown base
+    hull_base = np.stack(
+        np.broadcast_arrays(
+            center_x + diff_eastwest * bottom_eccen_eastwest,  # x location of base
+            center_y + diff_northsouth * bottom_eccen_northsouth,  # y location of base
             top_height * (1 - crown_ratio),
         ),
-        dtype=float,
+        axis=-1,
     )
 
     return hull_apex, hull_base
 
 
+def _interp_periodic(
+    x: np.ndarray, xp: np.ndarray, fp: np.ndarray, period: float = 2 * np.pi
+) -> np.ndarray:
+    """One-dimensional periodic linear interpolation for a batch of functions.
+
+    Behaves like ``np.interp(x, xp, fp, period=period)`` applied separately to
+    each tree along the leading axis, without looping in Python over trees.
+
+    Parameters
+    -----------
+    x : array with shape (N, ...)
+        x-coordinates at which to evaluate the interpolated values for each of
+        N functions
+    xp : array with shape (N, K)
+        x-coordinates of the data points for each of N functions, need not be
+        sorted
+    fp : array with shape (N, K)
+        y-coordinates of the data points for each of N functions
+    period : numeric
+        period of the x-coordinates
+
+    Returns:
+    --------
+    y : array with same shape as x
+        interpolated values
+    """
+    x = np.asanyarray(x)
+    xp = np.mod(np.asanyarray(xp), period)
+    fp = np.asanyarray(fp)
+
+    order = np.argsort(xp, axis=-1)
+    xp = np.take_along_axis(xp, order, axis=-1)
+    fp = np.take_along_axis(fp, order, axis=-1)
+
+    # wrap the first and last data points around the period
+    xp = np.concatenate((xp[:, -1:] - period, xp, xp[:, :1] + period), axis=-1)
+    fp = np.concatenate((fp[:, -1:], fp, fp[:, :1]), axis=-1)
+
+    x_flat = np.mod(x, period).reshape(x.shape[0], -1)
+
+    # index of the data point at or to the left of each x, looping over the
+    # (few) data points rather than allocating an (N, M, K) comparison array
+    idx = np.zeros(x_flat.shape, dtype=np.intp)
+    for k in range(1, xp.shape[-1] - 1):
+        idx += x_flat >= xp[:, k : k + 1]
+
+    x_left = np.take_along_axis(xp, idx, axis=-1)
+    x_right = np.take_along_axis(xp, idx + 1, axis=-1)
+    f_left = np.take_along_axis(fp, idx, axis=-1)
+    f_right = np.take_along_axis(fp, idx + 1, axis=-1)
+
+    slopes = (f_right - f_left) / (x_right - x_left)
+    return (slopes * (x_flat - x_left) + f_left).reshape(x.shape)
+
+
+def get_plot_boundaries(
+    x: float | npt.ArrayLike,
+    y: float | npt.ArrayLike,
+    radius: float | npt.ArrayLike,
+    num_vertices: int = 32,
+    dem: str | os.PathLike | DemSampler | None = None,
+    missing: str = "raise",
+    method: str = "bilinear",
+) -> (np.ndarray, np.ndarray, np.ndarray):
+    """Returns coordinates of points along the circumferences of circular plots.
+
+    The vertices of every plot are generated together, and, when a DEM is
+    provided, draped on it by sampling the DEM once for all of them.
+
+    Parameters
+    -----------
+    x : numeric, or numpy array of numeric values with shape (P,)
+        x-coordinates of plot centers
+    y : numeric, or numpy array of numeric values with shape (P,)
+        y-coordinates of plot centers
+    radius : numeric, or numpy array of numeric values with shape (P,)
+        radii of plots
+    num_vertices : int
+        number of vertices, V, along each boundary. The last vertex repeats
+        the first, closing the boundary.
+    dem : string, path to file, DemSampler, or None
+        A digital elevation model in a format that can be read by rasterio,
+        or a DemSampler that has already opened one
+    missing : str
+        policy for vertices outside the DEM or on cells without data, one of
+        MISSING_POLICIES. Ignored when dem is a DemSampler.
+    method : str
+        method of interpolating elevations between cell centers, one of
+        METHODS
+
+    Returns:
+    --------
+    xs, ys, zs : numpy arrays, each with shape (P, V)
+        x, y, and z coordinates of the plot boundaries, with z of 0 when no
+        DEM is provided
+    """
+    x, y, radius = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(a, dtype=float)) for a in (x, y, radius))
+    )
+    if x.ndim != 1:
+        message = "Plot centers and radii must be numerics or 1-D arrays."
+        raise ValueError(message)
+    if num_vertices < 3:
+        message = "Plot boundaries need at least 3 vertices."
+        raise ValueError(message)
+
+    thetas = np.linspace(0, 2 * np.pi, num_vertices)
+    xs = radius[:, np.newaxis] * np.cos(thetas) + x[:, np.newaxis]
+    ys = radius[:, np.newaxis] * np.sin(thetas) + y[:, np.newaxis]
+
+    if dem is None:
+        zs = np.zeros_like(xs)
+    else:
+        zs = get_elevation(dem, xs.ravel(), ys.ravel(), missing, method)
+        zs = zs.reshape(xs.shape)
+
+    return xs, ys, zs
+
+
 def _get_circular_plot_boundary(
     x: np.ndarray,
     y: np.ndarray,
@@ -418,15 +588,281 @@ def _get_circular_plot_boundary(
     Returns:
     --------
     xs, ys, zs : numpy arrays, each with shape (32,)
-        x, y, and z coordinates of the plot boundary
+        x, y, and z coordinates of the plot boundary, or with shape (P, 32)
+        when P plots are given as arrays, as for `get_plot_boundaries`
     """
-    thetas = np.linspace(0, 2 * np.pi, 32)
-    xs = radius * np.cos(thetas) + x
-    ys = radius * np.sin(thetas) + y
+    xs, ys, zs = get_plot_boundaries(x, y, radius, dem=dem or None)
+    if all(np.ndim(a) == 0 for a in (x, y, radius)):
+        return xs[0], ys[0], zs[0]
+    return xs, ys, zs
 
-    zs = get_elevation(dem, xs, ys) if dem else np.zeros(32)
 
-    return xs, ys, zs
+def _get_crown_profiles(
+    top_heights: npt.NDArray,
+    crown_ratios: npt.NDArray,
+    crown_radii: npt.NDArray,
+    crown_edge_heights: npt.NDArray,
+    crown_shapes: npt.NDArray,
+    thetas: npt.NDArray,
+    dtype: npt.DTypeLike = float,
+) -> CrownProfiles:
+    """Calculates the peripheral line and crown profiles of many trees by angle.
+
+    The crown surface is described by profiles running from the apex down to
+    the peripheral line (the line of maximum crown width) and from the
+    peripheral line down to the crown base. Everything that describes these
+    profiles varies only by angle around the crown.
+
+    Coordinates are relative to the stem base, i.e., before any translation
+    of the crown to its location and lean.
+
+    Parameters
+    -----------
+    top_heights : array with shape (N,)
+        vertical height of the tree apex from the base of the stem
+    crown_ratios : array with shape (N,)
+        ratio of live crown length to total tree height
+    crown_radii : array with shape (N, 4)
+        distance from stem base to point of maximum crown width in each
+        direction. Order of radii expected is E, N, W, S.
+    crown_edge_heights : array with shape (N, 4)
+        proportion of crown length above point of maximum crown width in each
+        direction. Order expected is E, N, W, S.
+    crown_shapes : array with shape (N, 2, 4)
+        shape coefficients describing curvature of crown profiles
+        in each direction (E, N, W, S) for top and bottom of crown
+    thetas : array with shape (angles,) or (N, angles)
+        angles, relative to the crown apex, of the profiles
+    dtype : data-type
+        floating point type of the profiles
+
+    Returns:
+    --------
+    profiles : CrownProfiles
+        hull_apex and hull_base with shape (N, 3), and the following with
+        shape (N, angles): thetas; periph_line_xs, periph_line_ys, and
+        periph_line_zs, the coordinates of the peripheral line; top_radii and
+        top_shapes, the horizontal distance from the apex to the peripheral
+        line and the shape coefficient of the top of the crown;
+        bottom_thetas, bottom_radii, and bottom_shapes, the angle and
+        horizontal distance from the crown base to the peripheral line and
+        the shape coefficient of the bottom of the crown
+    """
+    periph_points = _get_peripheral_points(
+        crown_radii, crown_edge_heights, top_heights, crown_ratios, dtype
+    )
+    periph_points_xs = periph_points[..., 0]
+    periph_points_ys = periph_points[..., 1]
+    periph_points_zs = periph_points[..., 2]
+    hull_apex, hull_base = _get_hull_apex_and_base(
+        crown_radii, top_heights, crown_ratios, dtype
+    )
+    crown_shapes = np.asanyarray(crown_shapes, dtype=dtype)
+
+    # per-tree (N, 1) columns, to broadcast against (N, angles) rows
+    apex_x, apex_y, apex_z = (hull_apex[:, i, np.newaxis] for i in range(3))
+    base_x, base_y, _ = (hull_base[:, i, np.newaxis] for i in range(3))
+    thetas = np.broadcast_to(
+        np.asanyarray(thetas, dtype=dtype), (len(hull_apex), np.shape(thetas)[-1])
+    )
+
+    # radii and heights along the peripheral line, by angle theta relative to
+    # the apex, using linear interpolation between peripheral points
+    apex_vs_periph_points_thetas = np.arctan2(
+        periph_points_ys - apex_y, periph_points_xs - apex_x
+    )
+    top_periph_points_radii = np.hypot(
+        periph_points_ys - apex_y, periph_points_xs - apex_x
+    )
+    top_radii = _interp_periodic(
+        thetas, apex_vs_periph_points_thetas, top_periph_points_radii
+    )
+    periph_line_xs = top_radii * np.cos(thetas) + apex_x
+    periph_line_ys = top_radii * np.sin(thetas) + apex_y
+    periph_line_zs = apex_z - _interp_periodic(
+        thetas, apex_vs_periph_points_thetas, apex_z - periph_points_zs
+    )
+    top_shapes = _interp_periodic(
+        thetas, apex_vs_periph_points_thetas, crown_shapes[:, 0]
+    )
+
+    # angles and radii of the peripheral line relative to the crown base
+    base_vs_periph_points_thetas = np.arctan2(
+        periph_points_ys - base_y, periph_points_xs - base_x
+    )
+    bottom_thetas = np.arctan2(periph_line_ys - base_y, periph_line_xs - base_x)
+    bottom_radii = np.hypot(periph_line_xs - base_x, periph_line_ys - base_y)
+    bottom_shapes = _interp_periodic(
+        bottom_thetas, base_vs_periph_points_thetas, crown_shapes[:, 1]
+    )
+
+    return CrownProfiles(
+        hull_apex,
+        hull_base,
+        thetas,
+        periph_line_xs,
+        periph_line_ys,
+        periph_line_zs,
+        top_radii,
+        top_shapes,
+        bottom_thetas,
+        bottom_radii,
+        bottom_shapes,
+    )
+
+
+def _fill_crown_grid(
+    grid_zs: np.ndarray,
+    hull_apex: tuple,
+    hull_base: tuple,
+    translate: tuple,
+    thetas: np.ndarray,
+    periph_line_zs: np.ndarray,
+    top_radii: np.ndarray,
+    top_shapes: np.ndarray,
+    bottom_thetas: np.ndarray,
+    bottom_radii: np.ndarray,
+    bottom_shapes: np.ndarray,
+    out: tuple,
+) -> np.ndarray:
+    """Evaluates the crown surface on a grid of heights and angles, in place.
+
+    Peripheral line attributes vary only by angle and grid heights vary only
+    by height, so inputs only need to broadcast against the grid, e.g., with
+    shape (1, angles) and (heights, 1) for a single tree, or (N, 1, angles)
+    and (N, heights, 1) for N trees. Every operation writes into the output
+    arrays, selecting the top or bottom profile of the crown with the `where`
+    argument of NumPy ufuncs rather than by indexing with boolean masks.
+
+    Parameters
+    -----------
+    grid_zs : array
+        heights at which to calculate crown surface
+    hull_apex, hull_base, translate : tuples of three arrays or numerics
+        (x,y,z) coordinates of the crown apex and base, and of the translation
+        from (0,0,0) to the tree top
+    thetas : array
+        angles, relative to the apex, at which to calculate crown surface
+    periph_line_zs : array
+        height of the peripheral line (maximum crown width) at each angle
+    top_radii, top_shapes : arrays
+        radial distance from apex to the peripheral line, and shape
+        coefficients of the top of the crown, at each angle
+    bottom_thetas, bottom_radii, bottom_shapes : arrays
+        angle and radial distance from crown base to the peripheral line, and
+        shape coefficients of the bottom of the crown, at each angle
+    out : tuple of three arrays
+        arrays with the shape of the grid to write x, y, and z coordinates to
+
+    Returns:
+    --------
+    grid_top : boolean array
+        whether each point on the grid belongs to the top of the crown
+    """
+    crown_xs, crown_ys, crown_zs = out
+
+    # cast inputs to the type of the output arrays, so that all operations on
+    # the grid are carried out at that precision
+    def cast(*arrs):
+        return (np.asarray(arr, dtype=crown_xs.dtype) for arr in arrs)
+
+    apex_x, apex_y, apex_z = cast(*hull_apex)
+    base_x, base_y, base_z = cast(*hull_base)
+    translate_x, translate_y, translate_z = cast(*translate)
+    grid_zs, thetas, periph_line_zs, top_radii, top_shapes = cast(
+        grid_zs, thetas, periph_line_zs, top_radii, top_shapes
+    )
+    bottom_thetas, bottom_radii, bottom_shapes = cast(
+        bottom_thetas, bottom_radii, bottom_shapes
+    )
+
+    # identify those points in the grid that are above or below the
+    # peripheral line
+    grid_top = grid_zs >= periph_line_zs
+    grid_bottom = grid_zs < periph_line_zs
+
+    # shape coefficient of the applicable profile, held in crown_ys for now
+    np.copyto(crown_ys, bottom_shapes, where=grid_bottom)
+    np.copyto(crown_ys, top_shapes, where=grid_top)
+
+    # calculate crown radius at each height z, using crown_xs as the work
+    # array; the vertical distance from the peripheral line is |z - z_periph|
+    # for both the top and bottom of the crown
+    np.subtract(grid_zs, periph_line_zs, out=crown_xs)
+    np.abs(crown_xs, out=crown_xs)
+    np.power(crown_xs, crown_ys, out=crown_xs)
+    np.divide(
+        crown_xs, (apex_z - periph_line_zs) ** top_shapes, out=crown_xs, where=grid_top
+    )
+    np.divide(
+        crown_xs,
+        (periph_line_zs - base_z) ** bottom_shapes,
+        out=crown_xs,
+        where=grid_bottom,
+    )
+    np.subtract(1, crown_xs, out=crown_xs)
+    np.multiply(crown_xs, top_radii**top_shapes, out=crown_xs, where=grid_top)
+    np.multiply(crown_xs, bottom_radii**bottom_shapes, out=crown_xs, where=grid_bottom)
+    np.divide(1, crown_ys, out=crown_ys)
+    np.power(crown_xs, crown_ys, out=crown_xs)
+
+    # calculate cartesian coordinates of crown edge points
+    np.multiply(crown_xs, np.sin(thetas), out=crown_ys, where=grid_top)
+    np.multiply(crown_xs, np.sin(bottom_thetas), out=crown_ys, where=grid_bottom)
+    np.add(crown_ys, apex_y, out=crown_ys, where=grid_top)
+    np.add(crown_ys, base_y, out=crown_ys, where=grid_bottom)
+    np.add(crown_ys, translate_y, out=crown_ys)
+
+    np.multiply(crown_xs, np.cos(thetas), out=crown_xs, where=grid_top)
+    np.multiply(crown_xs, np.cos(bottom_thetas), out=crown_xs, where=grid_bottom)
+    np.add(crown_xs, apex_x, out=crown_xs, where=grid_top)
+    np.add(crown_xs, base_x, out=crown_xs, where=grid_bottom)
+    np.add(crown_xs, translate_x, out=crown_xs)
+
+    np.add(grid_zs, translate_z, out=crown_zs)
+
+    return grid_top
+
+
+def _check_out(
+    out: tuple | None, shape: tuple[int, ...], dtype: npt.DTypeLike = float
+) -> tuple:
+    """Allocates output arrays, or confirms caller-supplied ones can be used.
+
+    Parameters
+    -----------
+    out : tuple of three arrays, or None
+        arrays to write x, y, and z coordinates to
+    shape : tuple of ints
+        shape of the crown grid(s) to be written
+    dtype : data-type
+        floating point type of the coordinates
+
+    Returns:
+    --------
+    out : tuple of three arrays
+        views of the output arrays with the requested shape
+    """
+    if out is None:
+        return tuple(np.empty(shape, dtype=dtype) for _ in range(3))
+
+    if len(out) != 3:
+        message = "out must be a tuple of three arrays for x, y, and z."
+        raise ValueError(message)
+
+    size = np.prod(shape)
+    for arr in out:
+        if arr.size != size or not arr.flags.c_contiguous or not arr.flags.writeable:
+            message = (
+                f"out arrays must be writeable, C-contiguous, and have {size} "
+                f"elements to hold crown grid(s) with shape {shape}."
+            )
+            raise ValueError(message)
+        if arr.dtype != np.dtype(dtype):
+            message = f"out arrays must have dtype {np.dtype(dtype)}, not {arr.dtype}."
+            raise ValueError(message)
+
+    return tuple(arr.reshape(shape) for arr in out)
 
 
 def _make_crown_hull(
@@ -439,6 +875,9 @@ def _make_crown_hull(
     crown_edge_heights: npt.NDArray((4,), float),
     crown_shapes: npt.NDArray((4, 2), float),
     top_only: bool = False,
+    resolution: str | tuple[int, int] = "default",
+    out: tuple | None = None,
+    dtype: npt.DTypeLike = float,
 ) -> (np.ndarray, np.ndarray, np.ndarray):
     """Makes a crown hull.
 
@@ -472,7 +911,25 @@ def _make_crown_hull(
     top_only : bool
         if True, will return only top portion of the crown, i.e., the points
         above the maximum crown width
+    resolution : string, or tuple of two ints
+        name of a level of detail in CROWN_RESOLUTIONS, or the (number of
+        heights, number of angles) at which to sample the crown surface
+    out : tuple of three arrays, or None
+        if provided, C-contiguous arrays with heights * angles elements that
+        the x, y, and z coordinates of the crown are written to, and which
+        are returned. Cannot be combined with top_only.
+    dtype : data-type
+        floating point type of the crown coordinates, e.g., np.float32 to
+        halve memory use. Single precision resolves about 0.1 m at 1e6 m from
+        the origin, so stem locations in projected coordinates (e.g., UTM) may
+        be better expressed relative to a local origin.
     """
+    num_heights, num_angles = _get_crown_resolution(resolution)
+    if top_only and out is not None:
+        message = "out cannot be used with top_only."
+        raise ValueError(message)
+    grid_out = _check_out(out, (num_heights, num_angles), dtype)
+
     translate_x, translate_y, translate_z = _get_treetop_location(
         stem_base, top_height, lean_direction, lean_severity
     )
@@ -485,11 +942,14 @@ def _make_crown_hull(
     hull_apex, hull_base = _get_hull_apex_and_base(crown_radii, top_height, crown_ratio)
     apex_x, apex_y, apex_z = hull_apex
     base_x, base_y, base_z = hull_base
+    top_shapes_measured, bottom_shapes_measured = np.asanyarray(crown_shapes)
 
     # places where we'll calculate crown surface
-    thetas = np.linspace(0, 2 * np.pi, 32)  # angles
-    zs = np.linspace(base_z, apex_z, 50)  # heights
-    grid_thetas, grid_zs = np.meshgrid(thetas, zs)
+    thetas = np.linspace(0, 2 * np.pi, num_angles)  # angles
+    zs = np.linspace(base_z, apex_z, num_heights)  # heights
+
+    # everything on the peripheral line varies only by angle, so it is
+    # calculated once per angle rather than at every point on the grid
 
     # calculate height difference between apex and peripheral points
     periph_points_height_from_apex = apex_z - periph_points_zs
@@ -507,128 +967,392 @@ def _make_crown_hull(
     # calculate radii along peripheral line (maximum crown widths by angle
     # theta using linear interpolation)
     apex_periph_line_radii = np.interp(
-        grid_thetas,
-        apex_vs_periph_points_thetas,
-        top_periph_points_radii,
-        period=2 * np.pi,
+        thetas, apex_vs_periph_points_thetas, top_periph_points_radii, period=2 * np.pi
     )
 
     # convert peripheral line to x,y,z coords
-    periph_line_xs = apex_periph_line_radii * np.cos(grid_thetas) + apex_x
-    periph_line_ys = apex_periph_line_radii * np.sin(grid_thetas) + apex_y
+    periph_line_xs = apex_periph_line_radii * np.cos(thetas) + apex_x
+    periph_line_ys = apex_periph_line_radii * np.sin(thetas) + apex_y
     periph_line_zs = apex_z - np.interp(
-        grid_thetas,
+        thetas,
         apex_vs_periph_points_thetas,
         periph_points_height_from_apex,
         period=2 * np.pi,
     )
 
-    # identify those points in the grid that are higher than the periph line
-    grid_top = grid_zs >= periph_line_zs
-
     # calculate the shape coefficients at each angle theta (relative to apex)
     # using linear interpolation
-    top_shapes_measured = crown_shapes[0]
-    bottom_shapes_measured = crown_shapes[1]
     top_shapes_interp = np.interp(
-        grid_thetas[grid_top],
-        apex_vs_periph_points_thetas,
-        top_shapes_measured,
-        period=2 * np.pi,
+        thetas, apex_vs_periph_points_thetas, top_shapes_measured, period=2 * np.pi
     )
 
-    # calculate crown radius at each height z for top of crown
-    hull_radii = np.empty_like(grid_zs)
-    hull_radii[grid_top] = (
-        (
-            1
-            - (grid_zs[grid_top] - periph_line_zs[grid_top]) ** top_shapes_interp
-            / (apex_z - periph_line_zs[grid_top]) ** top_shapes_interp
-        )
-        * apex_periph_line_radii[grid_top] ** top_shapes_interp
-    ) ** (1 / top_shapes_interp)
-
-    # calculate cartesian coordinates of crown edge points
-    grid_xs = np.empty_like(grid_zs)
-    grid_ys = np.empty_like(grid_zs)
-    grid_xs[grid_top] = hull_radii[grid_top] * np.cos(grid_thetas[grid_top]) + apex_x
-    grid_ys[grid_top] = hull_radii[grid_top] * np.sin(grid_thetas[grid_top]) + apex_y
-
-    crown_xs = np.empty_like(grid_zs)
-    crown_ys = np.empty_like(grid_zs)
-    crown_zs = np.empty_like(grid_zs)
-
-    crown_xs[grid_top] = grid_xs[grid_top] + translate_x
-    crown_ys[grid_top] = grid_ys[grid_top] + translate_y
-    crown_zs[grid_top] = grid_zs[grid_top] + translate_z
-
-    if top_only:
-        return (
-            crown_xs[grid_top].flatten(),
-            crown_ys[grid_top].flatten(),
-            crown_zs[grid_top].flatten(),
-        )
-
-    # generate the full crown
     # calculate the angle between peripheral points and base axis
     base_vs_periph_points_thetas = np.arctan2(
         periph_points_ys - base_y, periph_points_xs - base_x
     )
 
-    # identify those points in the grid that are higher than the
-    # peripheral line
-    grid_bottom = grid_zs < periph_line_zs
-
-    # calculate the angles between points on the peripheral line and crown
-    # base
-    bottom_periph_line_thetas = np.empty_like(grid_thetas)
-    bottom_periph_line_thetas[grid_bottom] = np.arctan2(
-        periph_line_ys[grid_bottom] - base_y, periph_line_xs[grid_bottom] - base_x
+    # calculate the angles and radial distances between points on the
+    # peripheral line and crown base
+    bottom_periph_line_thetas = np.arctan2(
+        periph_line_ys - base_y, periph_line_xs - base_x
     )
-
-    # calculate radial distance between points on the peripheral line and
-    # crown base
     base_periph_line_radii = np.hypot(periph_line_xs - base_x, periph_line_ys - base_y)
 
     # calculate the shape coefficients at each angle theta (relative to
     # crown base) using linear interpolation
     bottom_shapes_interp = np.interp(
-        bottom_periph_line_thetas[grid_bottom],
+        bottom_periph_line_thetas,
         base_vs_periph_points_thetas,
         bottom_shapes_measured,
         period=2 * np.pi,
     )
 
-    # calculate crown radius at height z
-    hull_radii[grid_bottom] = (
-        (
-            1
-            - (periph_line_zs[grid_bottom] - grid_zs[grid_bottom])
-            ** bottom_shapes_interp
-            / (periph_line_zs[grid_bottom] - base_z) ** bottom_shapes_interp
-        )
-        * base_periph_line_radii[grid_bottom] ** bottom_shapes_interp
-    ) ** (1 / bottom_shapes_interp)
+    grid_top = _fill_crown_grid(
+        zs[:, np.newaxis],
+        (apex_x, apex_y, apex_z),
+        (base_x, base_y, base_z),
+        (translate_x, translate_y, translate_z),
+        thetas,
+        periph_line_zs,
+        apex_periph_line_radii,
+        top_shapes_interp,
+        bottom_periph_line_thetas,
+        base_periph_line_radii,
+        bottom_shapes_interp,
+        grid_out,
+    )
+    crown_xs, crown_ys, crown_zs = grid_out
 
-    # calculate cartesian coordinates of crown edge points
-    grid_xs[grid_bottom] = (
-        hull_radii[grid_bottom] * np.cos(bottom_periph_line_thetas[grid_bottom])
-        + base_x
+    if top_only:
+        return crown_xs[grid_top], crown_ys[grid_top], crown_zs[grid_top]
+
+    if out is not None:
+        return out
+
+    return crown_xs.reshape(-1), crown_ys.reshape(-1), crown_zs.reshape(-1)
+
+
+def _make_crown_hulls(
+    stem_bases: npt.NDArray,
+    top_heights: npt.NDArray,
+    crown_ratios: npt.NDArray,
+    lean_directions: npt.NDArray | None,
+    lean_severities: npt.NDArray | None,
+    crown_radii: npt.NDArray,
+    crown_edge_heights: npt.NDArray,
+    crown_shapes: npt.NDArray,
+    top_only: bool = False,
+    resolution: str | tuple[int, int] = "default",
+    out: tuple | None = None,
+    dtype: npt.DTypeLike = float,
+) -> (np.ndarray, np.ndarray, np.ndarray):
+    """Makes crown hulls for many trees in a single vectorized pass.
+
+    Produces the same crown surfaces as calling `_make_crown_hull` once for
+    each tree, but without any per-tree Python overhead.
+
+    Parameters
+    ----------
+    stem_bases : array with shape (N, 3)
+        (x,y,z) coordinates of stem bases
+    top_heights : array with shape (N,)
+        vertical height of the tree apex from the base of the stem
+    crown_ratios : array with shape (N,)
+        ratio of live crown length to total tree height
+    lean_directions : array with shape (N,), or None
+        direction of tree lean, in degrees with 0 = east, 90 = north,
+        180 = west, etc. If None, trees will not lean.
+    lean_severities : array with shape (N,), or None
+        how much tree is leaning, in degrees from vertical; 0 = no lean,
+        and 90 meaning the tree is horizontal. If None, trees will not lean.
+    crown_radii : array with shape (N, 4)
+        distance from stem base to point of maximum crown width in each
+        direction. Order of radii expected is E, N, W, S.
+    crown_edge_heights : array with shape (N, 4)
+        proportion of crown length above point of maximum crown width in each
+        direction. Order expected is E, N, W, S.
+    crown_shapes : array with shape (N, 2, 4)
+        shape coefficients describing curvature of crown profiles
+        in each direction (E, N, W, S) for top and bottom of crown
+    top_only : bool
+        if True, points below the maximum crown width will be set to NaN
+    resolution : string, or tuple of two ints
+        name of a level of detail in CROWN_RESOLUTIONS, or the (number of
+        heights, number of angles) at which to sample the crown surface
+    out : tuple of three arrays, or None
+        if provided, C-contiguous arrays with N * heights * angles elements
+        that the x, y, and z coordinates of the crowns are written to
+    dtype : data-type
+        floating point type of the crown coordinates, e.g., np.float32 to
+        halve memory use. Single precision resolves about 0.1 m at 1e6 m from
+        the origin, so stem locations in projected coordinates (e.g., UTM) may
+        be better expressed relative to a local origin.
+
+    Returns:
+    --------
+    crown_xs, crown_ys, crown_zs : arrays with shape (N, heights, angles)
+        x, y, and z coordinates of the crown surface of each tree, e.g., with
+        shape (N, 50, 32) for the default resolution
+    """
+    num_heights, num_angles = _get_crown_resolution(resolution)
+    stem_bases = np.asanyarray(stem_bases, dtype=dtype)
+    top_heights = np.asanyarray(top_heights, dtype=dtype)
+    crown_ratios = np.asanyarray(crown_ratios, dtype=dtype)
+    crown_radii = np.asanyarray(crown_radii, dtype=dtype)
+    crown_edge_heights = np.asanyarray(crown_edge_heights, dtype=dtype)
+    crown_shapes = np.asanyarray(crown_shapes, dtype=dtype)
+    num_trees = len(top_heights)
+    grid_out = _check_out(out, (num_trees, num_heights, num_angles), dtype)
+
+    translate = _get_treetop_location(
+        stem_bases.T, top_heights, lean_directions, lean_severities
+    )
+    profiles = _get_crown_profiles(
+        top_heights,
+        crown_ratios,
+        crown_radii,
+        crown_edge_heights,
+        crown_shapes,
+        np.linspace(0, 2 * np.pi, num_angles, dtype=dtype),
+        dtype,
     )
-    grid_ys[grid_bottom] = (
-        hull_radii[grid_bottom] * np.sin(bottom_periph_line_thetas[grid_bottom])
-        + base_y
+    hull_apex, hull_base = profiles.hull_apex, profiles.hull_base
+    grid_zs = np.linspace(hull_base[:, 2], hull_apex[:, 2], num_heights, axis=-1)
+
+    def per_angle(arr):
+        return arr[:, np.newaxis, :]
+
+    def per_tree(arr):
+        return arr[:, np.newaxis, np.newaxis]
+
+    grid_top = _fill_crown_grid(
+        grid_zs[:, :, np.newaxis],
+        tuple(per_tree(hull_apex[:, i]) for i in range(3)),
+        tuple(per_tree(hull_base[:, i]) for i in range(3)),
+        tuple(per_tree(arr) for arr in translate),
+        per_angle(profiles.thetas),
+        per_angle(profiles.periph_line_zs),
+        per_angle(profiles.top_radii),
+        per_angle(profiles.top_shapes),
+        per_angle(profiles.bottom_thetas),
+        per_angle(profiles.bottom_radii),
+        per_angle(profiles.bottom_shapes),
+        grid_out,
     )
 
-    crown_xs[grid_bottom] = grid_xs[grid_bottom] + translate_x
-    crown_ys[grid_bottom] = grid_ys[grid_bottom] + translate_y
-    crown_zs[grid_bottom] = grid_zs[grid_bottom] + translate_z
+    if top_only:
+        for coords in grid_out:
+            np.copyto(coords, np.nan, where=~grid_top)
+
+    return grid_out
+
+
+class CrownShapeCache:
+    """A least-recently-used cache of crown shapes for use in repeated builds.
+
+    A crown hull is only translated by the location of its stem base, so
+    crowns are cached at a stem base of (0, 0, 0), keyed on the parameters
+    that determine their shape. Retrieving a cached crown only requires adding
+    the stem base to the cached coordinates.
+
+    Attributes:
+    -----------
+    maxsize : int, or None
+        maximum number of crown shapes to hold before the least recently used
+        shape is evicted. If None, the cache can grow without bound.
+    hits : int
+        number of crowns retrieved from the cache
+    misses : int
+        number of crowns that had to be calculated
+    """
+
+    def __init__(self, maxsize: int | None = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._shapes = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def cache_info(self) -> CrownCacheInfo:
+        """Reports hit and miss statistics and the size of the cache."""
+        return CrownCacheInfo(self.hits, self.misses, self.maxsize, len(self))
+
+    def cache_clear(self) -> None:
+        """Removes all crown shapes and resets statistics."""
+        self._shapes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def make_crown_hull(
+        self,
+        stem_base: npt.NDArray((3,), float),
+        top_height: float,
+        crown_ratio: float,
+        lean_direction: float,
+        lean_severity: float,
+        crown_radii: npt.NDArray((4,), float),
+        crown_edge_heights: npt.NDArray((4,), float),
+        crown_shapes: npt.NDArray((2, 4), float),
+        top_only: bool = False,
+        resolution: str | tuple[int, int] = "default",
+        dtype: npt.DTypeLike = float,
+    ) -> (np.ndarray, np.ndarray, np.ndarray):
+        """Makes a crown hull, reusing a cached crown shape when available.
+
+        Accepts the same parameters and returns the same coordinates as
+        `_make_crown_hull`.
+        """
+        key = (
+            float(top_height),
+            float(crown_ratio),
+            float(lean_direction),
+            float(lean_severity),
+            np.asarray(crown_radii, dtype=float).tobytes(),
+            np.asarray(crown_edge_heights, dtype=float).tobytes(),
+            np.asarray(crown_shapes, dtype=float).tobytes(),
+            bool(top_only),
+            _get_crown_resolution(resolution),
+            np.dtype(dtype),
+        )
+
+        shape = self._shapes.get(key)
+        if shape is None:
+            self.misses += 1
+            shape = _make_crown_hull(
+                (0.0, 0.0, 0.0),
+                top_height,
+                crown_ratio,
+                lean_direction,
+                lean_severity,
+                crown_radii,
+                crown_edge_heights,
+                crown_shapes,
+                top_only,
+                resolution,
+                dtype=dtype,
+            )
+            for coords in shape:
+                coords.flags.writeable = False
+
+            if self.maxsize is None or self.maxsize > 0:
+                self._shapes[key] = shape
+                if self.maxsize is not None and len(self._shapes) > self.maxsize:
+                    self._shapes.popitem(last=False)
+        else:
+            self.hits += 1
+            self._shapes.move_to_end(key)
+
+        stem_x, stem_y, stem_z = np.asarray(stem_base, dtype=dtype)
+        crown_xs, crown_ys, crown_zs = shape
+
+        return crown_xs + stem_x, crown_ys + stem_y, crown_zs + stem_z
+
+
+@cache
+def _get_crown_grid_faces(num_heights: int, num_angles: int) -> np.ndarray:
+    """Builds and caches the triangle faces of a crown grid of a given size."""
+    if num_heights < 3 or num_angles < 4:
+        message = "crown meshes need at least 3 heights and 4 angles."
+        raise ValueError(message)
+
+    # the last angle (2*pi) repeats the first, so faces wrap around to the
+    # first column of the grid instead of using the last one
+    num_columns = num_angles - 1
+    cols = np.arange(num_columns)
+    next_cols = (cols + 1) % num_columns
+
+    def vertex(row, col):
+        return row * num_angles + col
+
+    # quads between rows 1 and num_heights - 2, each split into two triangles
+    rows = np.arange(1, num_heights - 2)[:, np.newaxis]
+    lower_left, lower_right = vertex(rows, cols), vertex(rows, next_cols)
+    upper_left, upper_right = vertex(rows + 1, cols), vertex(rows + 1, next_cols)
+    side_faces = np.stack(
+        (
+            np.stack((lower_left, lower_right, upper_right), axis=-1),
+            np.stack((lower_left, upper_right, upper_left), axis=-1),
+        ),
+        axis=-2,
+    ).reshape(-1, 3)
+
+    # the first and last rows collapse to the crown base and apex, so they
+    # are closed with fans of triangles around a single vertex
+    base = np.full(num_columns, vertex(0, 0))
+    base_faces = np.stack((base, vertex(1, next_cols), vertex(1, cols)), axis=-1)
+    apex = np.full(num_columns, vertex(num_heights - 1, 0))
+    apex_faces = np.stack(
+        (vertex(num_heights - 2, cols), vertex(num_heights - 2, next_cols), apex),
+        axis=-1,
+    )
+
+    faces = np.concatenate((base_faces, side_faces, apex_faces))
+    faces.flags.writeable = False
+    return faces
+
+
+def get_crown_faces(resolution: str | tuple[int, int] = "default") -> np.ndarray:
+    """Returns the triangle faces connecting the vertices of a crown grid.
+
+    Every crown of a given resolution has the same connectivity, so faces
+    are only built once per resolution and then shared. Vertices are indexed
+    in the order of a flattened (heights, angles) crown grid, as returned by
+    `_make_crown_hull`. Faces wrap around the seam where the last angle
+    (2*pi) repeats the first, and the crown base and apex are each closed by a
+    fan of triangles around a single vertex. This assumes the first and last
+    rows of the grid collapse to points, which is the case whenever the
+    maximum crown width lies strictly between the crown base and apex.
+    Triangles are ordered counter-clockwise when viewed from outside the
+    crown.
+
+    Parameters
+    -----------
+    resolution : string, or tuple of two ints
+        name of a level of detail in CROWN_RESOLUTIONS, or the (number of
+        heights, number of angles) at which the crown surface is sampled
+
+    Returns:
+    --------
+    faces : read-only integer array with shape (F, 3)
+        indices of the three vertices of each triangle
+    """
+    return _get_crown_grid_faces(*_get_crown_resolution(resolution))
+
+
+def _make_forest_mesh(
+    crown_xs: np.ndarray, crown_ys: np.ndarray, crown_zs: np.ndarray
+) -> (np.ndarray, np.ndarray):
+    """Combines the crown grids of many trees into a single triangle mesh.
+
+    Parameters
+    -----------
+    crown_xs, crown_ys, crown_zs : arrays with shape (N, heights, angles)
+        x, y, and z coordinates of the crown surfaces of N trees, e.g., as
+        returned by `_make_crown_hulls`
+
+    Returns:
+    --------
+    vertices : array with shape (N * heights * angles, 3)
+        (x,y,z) coordinates of the vertices of all crowns
+    faces : integer array with shape (N * F, 3)
+        indices into vertices of the three vertices of each triangle
+    """
+    num_trees, num_heights, num_angles = np.shape(crown_xs)
+    vertices = np.stack((crown_xs, crown_ys, crown_zs), axis=-1).reshape(-1, 3)
+
+    crown_faces = _get_crown_grid_faces(num_heights, num_angles)
+    offsets = np.arange(num_trees, dtype=np.int64) * (num_heights * num_angles)
+    faces = crown_faces + offsets[:, np.newaxis, np.newaxis]
 
-    return crown_xs.flatten(), crown_ys.flatten(), crown_zs.flatten()
+    return vertices, faces.reshape(-1, 3)
 
 
 def poisson_pipeline(
-    infile: str | os.PathLike, outfile: str | os.PathLike, depth: int = 8
+    infile: str | os.PathLike,
+    outfile: str | os.PathLike | None = None,
+    depth: int = 8,
 ) -> dict:
     """Makes a dictionary describing PDAL pipeline for generating Poisson surface mesh.
 
@@ -636,8 +1360,9 @@ def poisson_pipeline(
     -----------
     infile : str, path to file
         input file to be converted into a mesh
-    outfile : str, path to file
-        output file for storing Poisson surface mesh
+    outfile : str, path to file, or None
+        output file for storing Poisson surface mesh. If None, the pipeline
+        has no writer, and the mesh is only kept in memory.
     depth : int
         maximum depth of octree used to organize surface points
 
@@ -646,51 +1371,444 @@ def poisson_pipeline(
     pipeline : dict
         recipe for executing PDAL pipeline
     """
-    return {
-        "pipeline": [
-            infile,
-            {"type": "filters.normal"},
-            {"type": "filters.poisson", "depth": depth, "density": "true"},
-            {"type": "filters.normal"},
+    stages = [
+        os.fspath(infile),
+        {"type": "filters.normal"},
+        {"type": "filters.poisson", "depth": depth, "density": "true"},
+        {"type": "filters.normal"},
+    ]
+    if outfile is not None:
+        stages.append(
             {
                 "type": "writers.ply",
-                "filename": outfile,
+                "filename": os.fspath(outfile),
                 "storage_mode": "default",
                 "faces": "true",
-            },
-        ]
-    }
+            }
+        )
+    return {"pipeline": stages}
+
+
+def _get_mesh_arrays(pipeline: pdal.Pipeline) -> (np.ndarray, np.ndarray):
+    """Vertices and faces of the mesh made by an executed PDAL pipeline.
+
+    Parameters
+    -----------
+    pipeline : pdal.Pipeline
+        an executed pipeline whose last view is a mesh, e.g., from
+        `poisson_pipeline`
+
+    Returns:
+    --------
+    vertices : array with shape (M, 3)
+        (x,y,z) coordinates of the vertices of the mesh
+    faces : integer array with shape (F, 3)
+        indices into vertices of the three vertices of each triangle
+    """
+    points = pipeline.arrays[-1]
+    mesh = pipeline.meshes[-1]
+    vertices = np.stack((points["X"], points["Y"], points["Z"]), axis=-1)
+    faces = np.stack((mesh["A"], mesh["B"], mesh["C"]), axis=-1).astype(np.int64)
+    return vertices, faces
 
 
 def poisson_mesh(
-    infile: str | os.PathLike, outfile: str | os.PathLike, depth: int = 8
-) -> None:
+    infile: str | os.PathLike,
+    outfile: str | os.PathLike | None = None,
+    depth: int = 8,
+    return_arrays: bool = False,
+) -> (np.ndarray, np.ndarray) | None:
     """Generates a Poisson surface mesh from point cloud and output in PLY file format.
 
+    The pipeline runs within this process using the python extension to
+    PDAL, and any error raised by PDAL, such as an invalid pipeline or an
+    unreadable input file, is raised as a RuntimeError.
+
     Parameters
     -----------
     infile : string, path to file
         LAS or LAZ format point cloud to read from disk
-    outfile : string, path to file
-        PLY format file to save mesh to disk
+    outfile : string, path to file, or None
+        PLY format file to save mesh to disk. If None, no file is written,
+        and the vertices and faces of the mesh are returned.
     depth : int
         Maximum depth of octree used for mesh construction. Increasing this
         value will provide more detailed mesh and require more computation time
+    return_arrays : bool
+        if True, the vertices and faces of the mesh are returned even when
+        it is also written to outfile
+
+    Returns:
+    --------
+    vertices : array with shape (M, 3)
+        (x,y,z) coordinates of the vertices of the mesh, only returned when
+        outfile is None or return_arrays is True
+    faces : integer array with shape (F, 3)
+        indices into vertices of the three vertices of each triangle
+    """
+    pipeline = pdal.Pipeline(json.dumps(poisson_pipeline(infile, outfile, depth)))
+    pipeline.execute()
+
+    if outfile is None or return_arrays:
+        return _get_mesh_arrays(pipeline)
+    return None
+
+
+def _get_mesh_tiles(
+    bounds: tuple[float, float, float, float], tile_size: float, overlap: float
+) -> list[tuple[tuple[float, ...], tuple[float, ...]]]:
+    """Splits the extent of a point cloud into overlapping tiles.
+
+    Parameters
+    -----------
+    bounds : tuple of four numerics
+        (left, bottom, right, top) coordinates of the point cloud
+    tile_size : numeric
+        width and height of the tiles, before they are overlapped
+    overlap : numeric
+        distance each tile extends into its neighbors, less than half of
+        tile_size, so that each point is read by at most four tiles
+
+    Returns:
+    --------
+    tiles : list of tuples of (read_bounds, trim_bounds)
+        (left, bottom, right, top) bounds of the points read for each tile,
+        and of the faces kept from its mesh. The trim bounds of the tiles
+        partition the plane, with infinite outer edges, so every face is
+        kept by exactly one tile.
     """
-    pipeline_json = json.dumps(poisson_pipeline(infile, outfile, depth))
-
-    # validate the pipeline using python extension to PDAL
-    pipeline = pdal.Pipeline(pipeline_json)
-    PDAL = "pdal"
-    CMD_PIPELINE = "pipeline"
-    ARG_STDIN = "--stdin"
-    UTF8 = "utf-8"
-
-    if pipeline.validate():
-        proc = subprocess.run(
-            [PDAL, CMD_PIPELINE, ARG_STDIN],
-            capture_output=True,
-            input=pipeline_json.encode(UTF8),
+    if tile_size <= 0 or not 0 <= 2 * overlap < tile_size:
+        message = (
+            "tile_size must be positive, and overlap cannot be negative or "
+            "half of tile_size or more."
+        )
+        raise ValueError(message)
+    left, bottom, right, top = bounds
+    num_cols = max(int(np.ceil((right - left) / tile_size)), 1)
+    num_rows = max(int(np.ceil((top - bottom) / tile_size)), 1)
+    x_edges = left + tile_size * np.arange(num_cols + 1)
+    y_edges = bottom + tile_size * np.arange(num_rows + 1)
+    x_trims = np.concatenate(([-np.inf], x_edges[1:-1], [np.inf]))
+    y_trims = np.concatenate(([-np.inf], y_edges[1:-1], [np.inf]))
+
+    tiles = []
+    for row in range(num_rows):
+        for col in range(num_cols):
+            read_bounds = (
+                float(x_edges[col] - overlap),
+                float(y_edges[row] - overlap),
+                float(x_edges[col + 1] + overlap),
+                float(y_edges[row + 1] + overlap),
+            )
+            trim_bounds = (
+                float(x_trims[col]),
+                float(y_trims[row]),
+                float(x_trims[col + 1]),
+                float(y_trims[row + 1]),
+            )
+            tiles.append((read_bounds, trim_bounds))
+    return tiles
+
+
+def _trim_mesh(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    bounds: tuple[float, float, float, float],
+) -> (np.ndarray, np.ndarray):
+    """Keeps the faces of a mesh whose centroids fall within bounds.
+
+    Parameters
+    -----------
+    vertices : array with shape (M, 3)
+        (x,y,z) coordinates of the vertices of the mesh
+    faces : integer array with shape (F, 3)
+        indices into vertices of the three vertices of each triangle
+    bounds : tuple of four numerics
+        (left, bottom, right, top) bounds, including the left and bottom
+        edges but not the right and top edges
+
+    Returns:
+    --------
+    vertices, faces : arrays
+        the faces kept, and only the vertices they use, reindexed
+    """
+    left, bottom, right, top = bounds
+    centroids = vertices[faces].mean(axis=1)
+    keep = (
+        (centroids[:, 0] >= left)
+        & (centroids[:, 0] < right)
+        & (centroids[:, 1] >= bottom)
+        & (centroids[:, 1] < top)
+    )
+    used, inverse = np.unique(faces[keep].ravel(), return_inverse=True)
+    return vertices[used], inverse.reshape(-1, 3).astype(np.int64)
+
+
+def _get_point_tiles(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    bounds: tuple[float, float, float, float],
+    tile_size: float,
+    overlap: float,
+) -> (np.ndarray, np.ndarray):
+    """Tiles from `_get_mesh_tiles` whose read bounds contain each point.
+
+    Parameters
+    -----------
+    xs, ys : arrays with shape (N,)
+        coordinates of points within bounds
+    bounds, tile_size, overlap
+        as for `_get_mesh_tiles`
+
+    Returns:
+    --------
+    points, tiles : integer arrays with shape (K,)
+        index of a point and of a tile that reads it, for each of the K
+        (point, tile) pairs, sorted by tile
+    """
+    left, bottom, right, top = bounds
+    num_cols = max(int(np.ceil((right - left) / tile_size)), 1)
+    num_rows = max(int(np.ceil((top - bottom) / tile_size)), 1)
+
+    def first_and_last(coords, origin, num_tiles):
+        return [
+            np.clip(
+                np.floor((coords - origin + offset) / tile_size), 0, num_tiles - 1
+            ).astype(np.int64)
+            for offset in (-overlap, overlap)
+        ]
+
+    first_cols, last_cols = first_and_last(xs, left, num_cols)
+    first_rows, last_rows = first_and_last(ys, bottom, num_rows)
+
+    # overlap is less than half a tile, so each point is read by at most two
+    # tiles along each axis
+    indices = np.arange(len(xs))
+    every = np.ones(len(xs), dtype=bool)
+    points, tiles = [], []
+    for rows, use_rows in ((first_rows, every), (last_rows, last_rows != first_rows)):
+        for cols, use_cols in (
+            (first_cols, every),
+            (last_cols, last_cols != first_cols),
+        ):
+            use = use_rows & use_cols
+            points.append(indices[use])
+            tiles.append((rows * num_cols + cols)[use])
+    points, tiles = np.concatenate(points), np.concatenate(tiles)
+    order = np.argsort(tiles, kind="stable")
+    return points[order], tiles[order]
+
+
+def _split_points(
+    infile: str,
+    tiles: list,
+    bounds: tuple[float, float, float, float],
+    tile_size: float,
+    overlap: float,
+    work_dir: str,
+    chunk_size: int,
+) -> (list[int], np.dtype | None):
+    """Splits a point cloud into a file of points for each tile.
+
+    The point cloud is streamed once, a chunk at a time, and each chunk's
+    points are appended to the files of every tile that reads them, so only
+    a chunk of points is held in memory at once.
+
+    Returns:
+    --------
+    counts : list of ints
+        number of points in the file of each tile, named tile_<i>.points
+        within work_dir
+    dtype : np.dtype, or None
+        data type of the points, or None if the point cloud has no points
+    """
+    counts = [0] * len(tiles)
+    dtype = None
+    reader = pdal.Pipeline(json.dumps({"pipeline": [infile]}))
+    for chunk in reader.iterator(chunk_size=chunk_size):
+        if not len(chunk):
+            continue
+        dtype = chunk.dtype
+        points, point_tiles = _get_point_tiles(
+            chunk["X"], chunk["Y"], bounds, tile_size, overlap
+        )
+        tile_ids, starts = np.unique(point_tiles, return_index=True)
+        stops = np.append(starts[1:], len(point_tiles))
+        for tile_id, start, stop in zip(tile_ids, starts, stops):
+            path = os.path.join(work_dir, f"tile_{tile_id}.points")
+            with open(path, "ab") as f:
+                f.write(chunk[points[start:stop]].tobytes())
+            counts[tile_id] += stop - start
+    return counts, dtype
+
+
+def _mesh_tile(
+    work_dir: str,
+    tile_id: int,
+    dtype: np.dtype,
+    trim_bounds: tuple[float, float, float, float],
+    depth: int,
+) -> (str, str):
+    """Meshes the points of a tile, in a worker process.
+
+    The points written for the tile by `_split_points` are meshed as for
+    `poisson_mesh`, trimmed to the trim bounds of the tile, and saved, so
+    that meshes are not sent back to the parent process.
+
+    Returns:
+    --------
+    vertices_path, faces_path : strings
+        .npy files of the vertices and faces of the trimmed mesh
+    """
+    points_path = os.path.join(work_dir, f"tile_{tile_id}.points")
+    points = np.fromfile(points_path, dtype=dtype)
+    os.remove(points_path)
+
+    stages = poisson_pipeline(points_path, None, depth)["pipeline"][1:]
+    pipeline = pdal.Pipeline(json.dumps({"pipeline": stages}), arrays=[points])
+    del points
+    pipeline.execute()
+    vertices, faces = _trim_mesh(*_get_mesh_arrays(pipeline), trim_bounds)
+
+    vertices_path = os.path.join(work_dir, f"tile_{tile_id}_vertices.npy")
+    faces_path = os.path.join(work_dir, f"tile_{tile_id}_faces.npy")
+    np.save(vertices_path, vertices)
+    np.save(faces_path, faces)
+    return vertices_path, faces_path
+
+
+def _write_ply(path: str | os.PathLike, meshes: list[tuple[str, str]]) -> None:
+    """Writes the meshes of many tiles, one at a time, to a binary PLY file.
+
+    Parameters
+    -----------
+    path : string, path to file
+        PLY file to write
+    meshes : list of tuples of two strings
+        .npy files of the vertices, with shape (M, 3), and faces, with shape
+        (F, 3), of each mesh, with faces indexing the vertices of their mesh.
+        If empty, a PLY file without vertices or faces is written.
+    """
+    sizes = [
+        (len(np.load(vertices, mmap_mode="r")), len(np.load(faces, mmap_mode="r")))
+        for vertices, faces in meshes
+    ]
+    # with no meshes, e.g., when no tile had enough points, the file is empty
+    num_vertices = sum(num_mesh_vertices for num_mesh_vertices, _ in sizes)
+    num_faces = sum(num_mesh_faces for _, num_mesh_faces in sizes)
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {num_vertices}\n"
+        "property double x\n"
+        "property double y\n"
+        "property double z\n"
+        f"element face {num_faces}\n"
+        "property list uchar int vertex_indices\n"
+        "end_header\n"
+    )
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        for vertices, _ in meshes:
+            vertices = np.load(vertices, mmap_mode="r")
+            f.write(np.ascontiguousarray(vertices, dtype="<f8").tobytes())
+        offset = 0
+        for (_, faces), (num_mesh_vertices, num_mesh_faces) in zip(meshes, sizes):
+            records = np.empty(
+                num_mesh_faces, dtype=[("count", "u1"), ("indices", "<i4", (3,))]
+            )
+            records["count"] = 3
+            records["indices"] = np.load(faces, mmap_mode="r") + offset
+            f.write(records.tobytes())
+            offset += num_mesh_vertices
+
+
+def tiled_poisson_mesh(
+    infile: str | os.PathLike,
+    outfile: str | os.PathLike | None = None,
+    depth: int = 8,
+    tile_size: float = 250.0,
+    overlap: float = 25.0,
+    max_workers: int | None = None,
+    chunk_size: int = 1_000_000,
+    return_arrays: bool = False,
+    work_dir: str | os.PathLike | None = None,
+) -> (np.ndarray, np.ndarray) | None:
+    """Generates a Poisson surface mesh of a large point cloud tile by tile.
+
+    The extent of the point cloud, read from its header, is split into
+    square tiles that each extend into their neighbors by overlap. The point
+    cloud is read once, streaming it a chunk at a time into a file of points
+    for each tile. The points of each tile are then meshed at the given
+    octree depth in a pool of worker processes, so that memory is bounded by
+    the points of the tiles being meshed at once rather than by the whole
+    point cloud. Each tile's mesh is trimmed to the faces whose centroids
+    fall within the tile before it was overlapped, which discards the edges
+    of each mesh where Poisson reconstruction is least reliable, and saved
+    to disk. The trimmed meshes are then written to outfile one at a time.
+    The tiles are not welded, so small gaps may remain along tile edges.
+
+    Parameters
+    -----------
+    infile : string, path to file
+        LAS or LAZ format point cloud to read from disk
+    outfile : string, path to file, or None
+        PLY format file to save mesh to disk. If None, no file is written,
+        and the vertices and faces of the mesh are returned.
+    depth : int
+        Maximum depth of the octree used to mesh each tile
+    tile_size : numeric
+        width and height of the tiles, in the units of the point cloud
+    overlap : numeric
+        distance each tile extends into its neighbors, less than half of
+        tile_size
+    max_workers : int, or None
+        number of worker processes. If None, one per processor.
+    chunk_size : int
+        number of points streamed at a time while splitting the point cloud
+    return_arrays : bool
+        if True, the vertices and faces of the mesh are returned even when
+        it is also written to outfile. The whole mesh is then held in memory.
+    work_dir : string, path to folder, or None
+        folder for the points and meshes of tiles, which needs room for a
+        copy of the point cloud. If None, a temporary folder is used.
+        Files are removed when meshing finishes.
+
+    Returns:
+    --------
+    vertices : array with shape (M, 3)
+        (x,y,z) coordinates of the vertices of the mesh, only returned when
+        outfile is None or return_arrays is True
+    faces : integer array with shape (F, 3)
+        indices into vertices of the three vertices of each triangle
+    """
+    infile = os.fspath(infile)
+    bounds = _read_las_bounds(infile)
+    tiles = _get_mesh_tiles(bounds, tile_size, overlap)
+
+    with TemporaryDirectory(dir=work_dir) as temp_dir:
+        counts, dtype = _split_points(
+            infile, tiles, bounds, tile_size, overlap, temp_dir, chunk_size
+        )
+        tile_ids = [i for i, count in enumerate(counts) if count >= MIN_TILE_POINTS]
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = [
+                executor.submit(
+                    _mesh_tile, temp_dir, tile_id, dtype, tiles[tile_id][1], depth
+                )
+                for tile_id in tile_ids
+            ]
+            meshes = [future.result() for future in futures]
+
+        if outfile is not None:
+            _write_ply(outfile, meshes)
+        if outfile is not None and not return_arrays:
+            return None
+
+        vertices = [np.load(vertices) for vertices, _ in meshes]
+        offsets = np.cumsum([0] + [len(tile) for tile in vertices[:-1]])
+        faces = [np.load(faces) + offset for (_, faces), offset in zip(meshes, offsets)]
+        return (
+            np.concatenate([np.empty((0, 3))] + vertices),
+            np.concatenate([np.empty((0, 3), dtype=np.int64)] + faces),
         )
-        if proc.returncode != 0:
-            warnings.warn(proc.stderr.decode())
@@ -0,0 +1,231 @@
+"""Functions for measuring the size and shape of modeled tree crowns."""
+
+from __future__ import annotations
+
+import math
+from functools import cache
+
+import numpy as np
+import numpy.typing as npt
+from forest3d.utils.geometry import _get_crown_profiles, _make_crown_hulls
+
+
+@cache
+def _get_profile_integral_table() -> (np.ndarray, np.ndarray):
+    """Tabulates the area under a unit crown profile for a range of shapes."""
+    log_shapes = np.linspace(np.log(0.01), np.log(100.0), 4097)
+    integrals = np.array(
+        [
+            math.exp(
+                math.lgamma(1 + 1 / shape)
+                + math.lgamma(1 + 2 / shape)
+                - math.lgamma(1 + 3 / shape)
+            )
+            for shape in np.exp(log_shapes)
+        ]
+    )
+    return log_shapes, np.log(integrals)
+
+
+def _profile_integral(crown_shapes: np.ndarray) -> np.ndarray:
+    """Integrates the square of a unit crown profile along its length.
+
+    A crown profile with shape coefficient p has a radius of
+    (1 - t**p)**(1/p) at a proportion t of its length, so the integral of its
+    squared radius is the closed form Gamma(1 + 1/p) * Gamma(1 + 2/p) /
+    Gamma(1 + 3/p). This is smooth in log(p), so it is interpolated from a
+    table of its logarithm rather than evaluating gamma functions element by
+    element.
+
+    Parameters
+    -----------
+    crown_shapes : array
+        shape coefficients of crown profiles
+
+    Returns:
+    --------
+    integrals : array with same shape as crown_shapes
+        integral of (1 - t**p)**(2/p) for t from 0 to 1
+    """
+    log_shapes, log_integrals = _get_profile_integral_table()
+    return np.exp(np.interp(np.log(crown_shapes), log_shapes, log_integrals))
+
+
+def _trapezoid(values: np.ndarray, spacing: float | np.ndarray) -> np.ndarray:
+    """Integrates values along their last axis with the trapezoidal rule."""
+    return np.sum((values[..., :-1] + values[..., 1:]) / 2 * spacing, axis=-1)
+
+
+def crown_volume(
+    top_heights: npt.NDArray,
+    crown_ratios: npt.NDArray,
+    crown_radii: npt.NDArray,
+    crown_edge_heights: npt.NDArray,
+    crown_shapes: npt.NDArray,
+    num_angles: int = 361,
+) -> np.ndarray:
+    """Calculates the volume enclosed by the crowns of many trees.
+
+    In cylindrical coordinates about the crown apex, the top of the crown
+    encloses 1/2 * R**2 * H * integral((1 - t**p)**(2/p)) per radian at each
+    angle, where R and H are the horizontal and vertical distance from the
+    apex to the peripheral line and p is the shape coefficient. The profile
+    integral has a closed form, so only the integral around the crown needs
+    to be evaluated numerically. The bottom of the crown is integrated the
+    same way about the crown base.
+
+    When the apex and base are not vertically aligned, the horizontal
+    surfaces separating these two solids differ, and the volume between them
+    is added as a line integral around the peripheral line.
+
+    Parameters
+    -----------
+    top_heights : array with shape (N,)
+        vertical height of the tree apex from the base of the stem
+    crown_ratios : array with shape (N,)
+        ratio of live crown length to total tree height
+    crown_radii : array with shape (N, 4)
+        distance from stem base to point of maximum crown width in each
+        direction. Order of radii expected is E, N, W, S.
+    crown_edge_heights : array with shape (N, 4)
+        proportion of crown length above point of maximum crown width in each
+        direction. Order expected is E, N, W, S.
+    crown_shapes : array with shape (N, 2, 4)
+        shape coefficients describing curvature of crown profiles
+        in each direction (E, N, W, S) for top and bottom of crown
+    num_angles : int
+        number of angles around the crown used for numerical integration
+
+    Returns:
+    --------
+    volume : array with shape (N,)
+        volume of each crown, in cubic units of the inputs
+    """
+    thetas = np.linspace(0, 2 * np.pi, num_angles)
+    profiles = _get_crown_profiles(
+        top_heights, crown_ratios, crown_radii, crown_edge_heights, crown_shapes, thetas
+    )
+    apex_z = profiles.hull_apex[:, 2:3]
+    base_z = profiles.hull_base[:, 2:3]
+
+    top_volumes = (
+        profiles.top_radii**2
+        * (apex_z - profiles.periph_line_zs)
+        * _profile_integral(profiles.top_shapes)
+        / 2
+    )
+    bottom_volumes = (
+        profiles.bottom_radii**2
+        * (profiles.periph_line_zs - base_z)
+        * _profile_integral(profiles.bottom_shapes)
+        / 2
+    )
+
+    # the bottom of the crown is integrated by angle relative to the crown
+    # base, which is not evenly spaced
+    bottom_thetas = np.unwrap(profiles.bottom_thetas, axis=-1)
+
+    # by the divergence theorem, the volume between the horizontal surfaces
+    # swept from the apex and from the base to the peripheral line is
+    # 1/2 * integral(((apex - base) x periph)_z dz) along the peripheral line
+    offset_x, offset_y = (profiles.hull_apex - profiles.hull_base)[:, :2].T
+    gap_volumes = (
+        offset_x[:, np.newaxis] * profiles.periph_line_ys
+        - offset_y[:, np.newaxis] * profiles.periph_line_xs
+    ) / 2
+
+    return (
+        _trapezoid(top_volumes, np.diff(thetas))
+        + _trapezoid(bottom_volumes, np.diff(bottom_thetas, axis=-1))
+        + _trapezoid(gap_volumes, np.diff(profiles.periph_line_zs, axis=-1))
+    )
+
+
+def crown_projected_area(
+    top_heights: npt.NDArray,
+    crown_ratios: npt.NDArray,
+    crown_radii: npt.NDArray,
+    crown_edge_heights: npt.NDArray,
+    crown_shapes: npt.NDArray,
+    num_angles: int = 361,
+) -> np.ndarray:
+    """Calculates the area of the vertical projection of the crowns of many trees.
+
+    The crown narrows above and below the peripheral line (the line of
+    maximum crown width), so its projection onto the ground is the area
+    enclosed by the peripheral line.
+
+    Parameters
+    -----------
+    top_heights, crown_ratios, crown_radii, crown_edge_heights, crown_shapes
+        crown parameters, as for `crown_volume`
+    num_angles : int
+        number of points along the peripheral line
+
+    Returns:
+    --------
+    area : array with shape (N,)
+        projected area of each crown, in square units of the inputs
+    """
+    thetas = np.linspace(0, 2 * np.pi, num_angles)
+    profiles = _get_crown_profiles(
+        top_heights, crown_ratios, crown_radii, crown_edge_heights, crown_shapes, thetas
+    )
+    xs, ys = profiles.periph_line_xs, profiles.periph_line_ys
+
+    # shoelace formula; the last angle repeats the first, closing the polygon
+    cross = xs[:, :-1] * ys[:, 1:] - xs[:, 1:] * ys[:, :-1]
+    return np.abs(cross.sum(axis=-1)) / 2
+
+
+def crown_surface_area(
+    top_heights: npt.NDArray,
+    crown_ratios: npt.NDArray,
+    crown_radii: npt.NDArray,
+    crown_edge_heights: npt.NDArray,
+    crown_shapes: npt.NDArray,
+    resolution: str | tuple[int, int] = "fine",
+) -> np.ndarray:
+    """Calculates the surface area of the crowns of many trees.
+
+    The surface area has no closed form for asymmetric crowns, so it is
+    summed over the triangles of each crown grid, split the same way as
+    `forest3d.utils.geometry.get_crown_faces`.
+
+    Parameters
+    -----------
+    top_heights, crown_ratios, crown_radii, crown_edge_heights, crown_shapes
+        crown parameters, as for `crown_volume`
+    resolution : string, or tuple of two ints
+        name of a level of detail in CROWN_RESOLUTIONS, or the (number of
+        heights, number of angles) at which to sample each crown surface
+
+    Returns:
+    --------
+    area : array with shape (N,)
+        surface area of each crown, in square units of the inputs
+    """
+    num_trees = len(top_heights)
+    crowns = _make_crown_hulls(
+        np.zeros((num_trees, 3)),
+        top_heights,
+        crown_ratios,
+        None,
+        None,
+        crown_radii,
+        crown_edge_heights,
+        crown_shapes,
+        resolution=resolution,
+    )
+    vertices = np.stack(crowns, axis=-1)
+
+    # corners of each quad on the grid; the last angle repeats the first, so
+    # quads wrap around the crown, and quads at the base and apex collapse to
+    # single triangles
+    lower_left = vertices[:, :-1, :-1]
+    diagonal = vertices[:, 1:, 1:] - lower_left
+    lower = np.cross(vertices[:, :-1, 1:] - lower_left, diagonal)
+    upper = np.cross(diagonal, vertices[:, 1:, :-1] - lower_left)
+
+    areas = np.linalg.norm(lower, axis=-1) + np.linalg.norm(upper, axis=-1)
+    return areas.sum(axis=(1, 2)) / 2
@@ -0,0 +1,413 @@
+"""Functions for rasterizing modeled tree crowns onto regular grids."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import numpy as np
+import numpy.typing as npt
+import rasterio
+from forest3d.models.dataframe import TreeListDataFrameModel, _get_crown_parameters
+from forest3d.utils.containment import (
+    _expand_counts,
+    _get_crown_surfaces,
+    _get_crown_tops,
+)
+
+
+class RasterGrid:
+    """A north-up grid of square raster cells.
+
+    Attributes:
+    -----------
+    origin : array with shape (2,)
+        (x,y) coordinates of the upper left corner of the grid
+    cell_size : float
+        width and height of grid cells
+    shape : tuple of two ints
+        number of rows and columns in the grid
+    """
+
+    def __init__(
+        self,
+        origin: npt.ArrayLike,
+        cell_size: float,
+        shape: tuple[int, int],
+    ):
+        self.origin = np.array(origin, dtype=float)
+        self.cell_size = float(cell_size)
+        self.shape = tuple(int(size) for size in shape)
+        if self.origin.shape != (2,) or len(self.shape) != 2:
+            message = "origin must be an (x,y) pair and shape a (rows, cols) pair."
+            raise ValueError(message)
+        if not self.cell_size > 0:
+            message = "cell_size must be greater than 0."
+            raise ValueError(message)
+
+    def __repr__(self) -> str:
+        return (
+            f"RasterGrid(origin=({self.origin[0]}, {self.origin[1]}), "
+            f"cell_size={self.cell_size}, shape={self.shape})"
+        )
+
+    @classmethod
+    def from_profile(cls, profile: dict) -> RasterGrid:
+        """Copies the grid of a raster from its rasterio profile.
+
+        Parameters
+        -----------
+        profile : dict
+            profile of a raster, e.g., the `profile` attribute of a dataset
+            opened with rasterio, with transform, height, and width
+
+        Returns:
+        --------
+        grid : RasterGrid
+            grid with the same cells as the raster
+        """
+        transform = profile["transform"]
+        if (
+            transform.b
+            or transform.d
+            or transform.a <= 0
+            or transform.a != -transform.e
+        ):
+            message = "Only north-up rasters with square cells are supported."
+            raise ValueError(message)
+        return cls(
+            (transform.c, transform.f),
+            transform.a,
+            (profile["height"], profile["width"]),
+        )
+
+    @property
+    def transform(self) -> rasterio.Affine:
+        """Affine transform from (col, row) to (x,y) coordinates."""
+        return rasterio.Affine(
+            self.cell_size, 0, self.origin[0], 0, -self.cell_size, self.origin[1]
+        )
+
+    @property
+    def bounds(self) -> (float, float, float, float):
+        """Left, bottom, right, and top coordinates of the grid."""
+        left, top = self.origin
+        rows, cols = self.shape
+        return (
+            left,
+            top - rows * self.cell_size,
+            left + cols * self.cell_size,
+            top,
+        )
+
+    def cell_centers(
+        self, rows: slice = slice(None), cols: slice = slice(None)
+    ) -> (np.ndarray, np.ndarray):
+        """Coordinates of the centers of grid cells.
+
+        Parameters
+        -----------
+        rows, cols : slices
+            rows and columns of the grid to return the cell centers of
+
+        Returns:
+        --------
+        xs : array with shape (cols,)
+            x-coordinates of the centers of each column of cells
+        ys : array with shape (rows,)
+            y-coordinates of the centers of each row of cells
+        """
+        num_rows, num_cols = self.shape
+        xs = self.origin[0] + (np.arange(num_cols)[cols] + 0.5) * self.cell_size
+        ys = self.origin[1] - (np.arange(num_rows)[rows] + 0.5) * self.cell_size
+        return xs, ys
+
+    def window(self, bounds: tuple[float, float, float, float]) -> tuple[slice, slice]:
+        """Rows and columns of the cells that overlap a bounding box.
+
+        Parameters
+        -----------
+        bounds : tuple of four numerics
+            (left, bottom, right, top) coordinates of the bounding box
+
+        Returns:
+        --------
+        rows, cols : slices
+            rows and columns of the grid overlapping the bounding box, clipped
+            to the extent of the grid
+        """
+        left, bottom, right, top = bounds
+        num_rows, num_cols = self.shape
+        cols = (np.array((left, right)) - self.origin[0]) / self.cell_size
+        rows = (self.origin[1] - np.array((top, bottom))) / self.cell_size
+        first_col, stop_col = np.clip(
+            (np.floor(cols[0]), np.ceil(cols[1])), 0, num_cols
+        )
+        first_row, stop_row = np.clip(
+            (np.floor(rows[0]), np.ceil(rows[1])), 0, num_rows
+        )
+        return slice(int(first_row), int(stop_row)), slice(
+            int(first_col), int(stop_col)
+        )
+
+    def subgrid(self, rows: slice, cols: slice) -> RasterGrid:
+        """A grid covering some of the rows and columns of this grid.
+
+        Parameters
+        -----------
+        rows, cols : slices
+            contiguous rows and columns of the grid
+
+        Returns:
+        --------
+        grid : RasterGrid
+            grid of the cells in those rows and columns
+        """
+        num_rows, num_cols = self.shape
+        row_start, row_stop, _ = rows.indices(num_rows)
+        col_start, col_stop, _ = cols.indices(num_cols)
+        return RasterGrid(
+            (
+                self.origin[0] + col_start * self.cell_size,
+                self.origin[1] - row_start * self.cell_size,
+            ),
+            self.cell_size,
+            (max(row_stop - row_start, 0), max(col_stop - col_start, 0)),
+        )
+
+    def coarsen(self, factor: int) -> RasterGrid:
+        """A grid with cells covering blocks of factor by factor cells.
+
+        Parameters
+        -----------
+        factor : int
+            number of cells of this grid along each side of the coarser cells
+
+        Returns:
+        --------
+        grid : RasterGrid
+            grid with the same origin, extended to cover any partial blocks at
+            the bottom and right edges of this grid
+        """
+        factor = int(factor)
+        if factor < 1:
+            message = "factor must be a positive integer."
+            raise ValueError(message)
+        num_rows, num_cols = self.shape
+        return RasterGrid(
+            self.origin,
+            self.cell_size * factor,
+            (-(-num_rows // factor), -(-num_cols // factor)),
+        )
+
+    def tiles(self, tile_shape: tuple[int, int]) -> Iterator[tuple[slice, slice]]:
+        """Splits the grid into tiles of at most tile_shape cells.
+
+        Parameters
+        -----------
+        tile_shape : tuple of two ints
+            maximum number of rows and columns in each tile
+
+        Yields:
+        -------
+        rows, cols : slices
+            rows and columns of the grid covered by each tile
+        """
+        num_rows, num_cols = self.shape
+        tile_rows, tile_cols = tile_shape
+        for row in range(0, num_rows, tile_rows):
+            for col in range(0, num_cols, tile_cols):
+                yield (
+                    slice(row, min(row + tile_rows, num_rows)),
+                    slice(col, min(col + tile_cols, num_cols)),
+                )
+
+
+class CrownRasterizer:
+    """Rasterizes the top surface of the crowns of a tree list.
+
+    The top of each crown is a single height at each location within its
+    peripheral line (the line of maximum crown width), so the crown surface
+    seen from above is evaluated directly at the center of each grid cell the
+    crown covers, and the highest crown is kept in each cell. No crown hull
+    is built, so the points below the top of the crown that a hull would
+    include are never evaluated, and rasters have no gaps however fine their
+    cells are.
+
+    The crowns are tabulated once, so the same trees can be rasterized
+    repeatedly onto different grids, or moved and rotated as a rigid body,
+    e.g., when searching for the location of a plot.
+
+    Attributes:
+    -----------
+    num_trees : int
+        number of trees to rasterize
+    bounds : array with shape (N, 6)
+        (xmin, ymin, zmin, xmax, ymax, zmax) bounding box of each crown
+    """
+
+    def __init__(self, tree_params: dict[str, npt.NDArray], num_angles: int = 361):
+        """Tabulates the crowns of many trees.
+
+        Parameters
+        -----------
+        tree_params : dict
+            arrays describing N trees, keyed by the argument names of
+            `forest3d.utils.geometry._make_crown_hulls`
+        num_angles : int
+            number of angles at which the bottom of each crown is tabulated
+        """
+        self._surfaces = _get_crown_surfaces(tree_params, num_angles)
+        self.bounds = self._surfaces.bounds
+        self.num_trees = len(self.bounds)
+
+    @classmethod
+    def from_tree_list(
+        cls, trees: TreeListDataFrameModel, num_angles: int = 361
+    ) -> CrownRasterizer:
+        """Tabulates the crowns of every tree in a tree list.
+
+        Parameters
+        -----------
+        trees : TreeListDataFrameModel
+            a validated dataframe or geodataframe
+        num_angles : int
+            number of angles at which the bottom of each crown is tabulated
+        """
+        return cls(_get_crown_parameters(trees), num_angles)
+
+    def _get_moved_bounds(
+        self,
+        dx: float,
+        dy: float,
+        rotation: float,
+        center: np.ndarray,
+        tree_offsets: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """Horizontal bounding boxes of crowns after rotation and translation."""
+        xmins, ymins, _, xmaxs, ymaxs, _ = self.bounds.T
+        if tree_offsets is not None:
+            xmins, xmaxs = xmins + tree_offsets[:, 0], xmaxs + tree_offsets[:, 0]
+            ymins, ymaxs = ymins + tree_offsets[:, 1], ymaxs + tree_offsets[:, 1]
+        corner_xs = np.stack((xmins, xmaxs, xmaxs, xmins), axis=-1) - center[0]
+        corner_ys = np.stack((ymins, ymins, ymaxs, ymaxs), axis=-1) - center[1]
+        theta = np.deg2rad(rotation)
+        xs = np.cos(theta) * corner_xs - np.sin(theta) * corner_ys + center[0] + dx
+        ys = np.sin(theta) * corner_xs + np.cos(theta) * corner_ys + center[1] + dy
+        return np.column_stack((xs.min(-1), ys.min(-1), xs.max(-1), ys.max(-1)))
+
+    def rasterize(
+        self,
+        grid: RasterGrid,
+        dx: float = 0,
+        dy: float = 0,
+        dz: float = 0,
+        rotation: float = 0,
+        center: npt.ArrayLike | None = None,
+        fill_value: float = 0.0,
+        tile_shape: tuple[int, int] = (512, 512),
+        out: np.ndarray | None = None,
+        tree_offsets: npt.ArrayLike | None = None,
+    ) -> np.ndarray:
+        """Rasterizes the highest crown surface in each cell of a grid.
+
+        Trees are rotated about the center, then moved, as a rigid body
+        before rasterizing, as in `forest3d.scene.ForestScene.transform`.
+        The grid is processed one tile at a time, with only the crowns that
+        overlap each tile, which bounds memory use for large extents.
+
+        Parameters
+        -----------
+        grid : RasterGrid
+            grid of cells to rasterize the crowns onto
+        dx, dy, dz : numeric
+            distance to move the trees in the x, y, and z directions
+        rotation : numeric
+            angle of rotation of the trees about the center, in degrees
+            counter-clockwise
+        center : array with shape (2,), or None
+            (x,y) coordinates to rotate the trees about. If None, the mean
+            location of the crowns is used.
+        fill_value : numeric
+            value of cells not covered by any crown
+        tile_shape : tuple of two ints
+            maximum number of rows and columns rasterized at once
+        out : array with shape grid.shape, or None
+            if provided, an array, e.g., a memory-mapped array, that the
+            raster is written to, and which is returned
+        tree_offsets : array with shape (N, 2), or None
+            (x,y) distance to move each tree before the trees are rotated and
+            moved together, e.g., to correct errors in the measured distance
+            of each tree from the plot center
+
+        Returns:
+        --------
+        chm : array with shape grid.shape
+            height of the highest crown surface at the center of each cell.
+            Heights share the datum of the stem bases, so with stems at a
+            height of zero the raster is a canopy height model.
+        """
+        if out is None:
+            out = np.empty(grid.shape, dtype=float)
+        elif out.shape != grid.shape:
+            message = f"out must have the shape of the grid, {grid.shape}."
+            raise ValueError(message)
+
+        if center is None:
+            center = (self.bounds[:, 0:2] + self.bounds[:, 3:5]).mean(axis=0) / 2
+        center = np.asarray(center, dtype=float)
+        theta = np.deg2rad(rotation)
+        cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+        translations = self._surfaces.translate
+        if tree_offsets is not None:
+            tree_offsets = np.asarray(tree_offsets, dtype=float)
+            if tree_offsets.shape != (self.num_trees, 2):
+                message = f"tree_offsets must have shape ({self.num_trees}, 2)."
+                raise ValueError(message)
+            translations = translations.copy()
+            translations[:, :2] += tree_offsets
+
+        # cells whose centers fall within the bounding box of each crown
+        moved = self._get_moved_bounds(dx, dy, rotation, center, tree_offsets)
+        left, top = grid.origin
+        first_cols = np.ceil((moved[:, 0] - left) / grid.cell_size - 0.5)
+        last_cols = np.floor((moved[:, 2] - left) / grid.cell_size - 0.5)
+        first_rows = np.ceil((top - moved[:, 3]) / grid.cell_size - 0.5)
+        last_rows = np.floor((top - moved[:, 1]) / grid.cell_size - 0.5)
+
+        for rows, cols in grid.tiles(tile_shape):
+            # cell ranges of crowns, clipped to the tile
+            tile_first_cols = np.maximum(first_cols, cols.start).astype(np.intp)
+            tile_last_cols = np.minimum(last_cols, cols.stop - 1).astype(np.intp)
+            tile_first_rows = np.maximum(first_rows, rows.start).astype(np.intp)
+            tile_last_rows = np.minimum(last_rows, rows.stop - 1).astype(np.intp)
+            num_cols = np.maximum(tile_last_cols - tile_first_cols + 1, 0)
+            num_rows = np.maximum(tile_last_rows - tile_first_rows + 1, 0)
+
+            # every pairing of a crown with a cell in its bounding box
+            tree_ids, offsets = _expand_counts(num_cols * num_rows)
+            cell_cols = tile_first_cols[tree_ids] + offsets % num_cols[tree_ids]
+            cell_rows = tile_first_rows[tree_ids] + offsets // num_cols[tree_ids]
+
+            # cell centers, moved back to where the crowns were tabulated
+            xs = left + (cell_cols + 0.5) * grid.cell_size - dx - center[0]
+            ys = top - (cell_rows + 0.5) * grid.cell_size - dy - center[1]
+            xs, ys = (
+                cos_theta * xs + sin_theta * ys + center[0],
+                -sin_theta * xs + cos_theta * ys + center[1],
+            )
+
+            translate = translations[tree_ids]
+            covered, zs = _get_crown_tops(
+                xs - translate[:, 0], ys - translate[:, 1], tree_ids, self._surfaces
+            )
+            zs += translate[:, 2] + dz
+
+            # keep the highest crown in each cell
+            tile_cols = cols.stop - cols.start
+            heights = np.full((rows.stop - rows.start) * tile_cols, -np.inf)
+            cells = (cell_rows - rows.start) * tile_cols + cell_cols - cols.start
+            np.maximum.at(heights, cells[covered], zs[covered])
+            heights[np.isneginf(heights)] = fill_value
+            out[rows, cols] = heights.reshape(-1, tile_cols)
+
+        return out
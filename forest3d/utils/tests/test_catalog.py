@@ -0,0 +1,89 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+import rasterio
+import shapely
+from forest3d.utils.catalog import CATALOG_NAME, TileCatalog, _read_las_bounds
+
+
+def _write_las_header(path, bounds):
+    """Writes the public header block of a LAS 1.2 file without points."""
+    left, bottom, right, top = bounds
+    header = bytearray(227)
+    header[:4] = b"LASF"
+    header[24:26] = bytes([1, 2])
+    struct.pack_into("<6d", header, 179, right, left, top, bottom, 50.0, 0.0)
+    with open(path, "wb") as f:
+        f.write(header)
+
+
+def _write_raster(path, bounds):
+    """Writes a raster with 10 m cells covering bounds."""
+    left, bottom, right, top = bounds
+    profile = {
+        "driver": "GTiff", "height": int((top - bottom) / 10),
+        "width": int((right - left) / 10), "count": 1, "dtype": "float32",
+        "transform": rasterio.Affine(10.0, 0, left, 0, -10.0, top),
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(np.zeros((profile["height"], profile["width"]),
+                           dtype=np.float32), 1)
+
+
+@pytest.fixture
+def tile_dir(tmp_path):
+    """A folder of lidar and DEM tiles in a 2 x 2 grid of 1 km tiles."""
+    (tmp_path / "dems").mkdir()
+    for i in range(2):
+        for j in range(2):
+            bounds = (1000 * i, 1000 * j, 1000 * (i + 1), 1000 * (j + 1))
+            _write_las_header(tmp_path / f"tile_{i}_{j}.laz", bounds)
+            _write_raster(tmp_path / "dems" / f"dem_{i}_{j}.tif", bounds)
+    (tmp_path / "README.txt").write_text("not a tile")
+    return tmp_path
+
+
+def test_las_header_bounds(tmp_path):
+    """Bounds are read from the header of LAS files, which must be LAS."""
+    path = tmp_path / "points.las"
+    _write_las_header(path, (10.0, 20.0, 30.0, 40.0))
+    assert _read_las_bounds(path) == (10.0, 20.0, 30.0, 40.0)
+
+    (tmp_path / "bad.las").write_bytes(b"PK" + bytes(300))
+    with pytest.raises(ValueError):
+        _read_las_bounds(tmp_path / "bad.las")
+
+
+def test_catalog_query(tile_dir):
+    """Tiles intersecting an area are found, by kind."""
+    catalog = TileCatalog(tile_dir)
+    assert len(catalog) == 8
+    assert (tile_dir / CATALOG_NAME).exists()
+
+    plot = shapely.Point(1500, 500).buffer(100)
+    assert catalog.query(plot, kind="lidar") == [str(tile_dir / "tile_1_0.laz")]
+    assert catalog.query(plot, kind="raster") == [
+        str(tile_dir / "dems" / "dem_1_0.tif")]
+    assert len(catalog.query((950, 950, 1050, 1050))) == 8
+    assert catalog.query((5000, 5000, 5100, 5100)) == []
+
+
+def test_catalog_refreshes_incrementally(tile_dir):
+    """Saved footprints are reused, and only new or changed tiles are read."""
+    TileCatalog(tile_dir)
+    catalog = TileCatalog(tile_dir, refresh=False)
+    assert len(catalog) == 8
+    assert catalog.refresh() == 0
+
+    _write_las_header(tile_dir / "tile_2_0.laz", (2000, 0, 3000, 1000))
+    _write_las_header(tile_dir / "tile_0_0.laz", (0, 0, 500, 500))
+    os.remove(tile_dir / "dems" / "dem_1_1.tif")
+    assert catalog.refresh() == 3
+    assert catalog.query((2500, 500, 2501, 501)) == [
+        str(tile_dir / "tile_2_0.laz")]
+    assert catalog.query((700, 700, 701, 701), kind="lidar") == []
+
+    reopened = TileCatalog(tile_dir, refresh=False)
+    assert reopened.tiles == catalog.tiles
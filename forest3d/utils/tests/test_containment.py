@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.utils.containment import CrownIndex, points_in_crown
+from forest3d.utils.metrics import crown_volume
+
+RNG = np.random.default_rng(11)
+NUM_TREES = 5
+TREES = {
+    'stem_bases': RNG.uniform(-50, 50, (NUM_TREES, 3)),
+    'top_heights': RNG.uniform(10, 60, NUM_TREES),
+    'crown_ratios': RNG.uniform(0.2, 0.9, NUM_TREES),
+    'lean_directions': RNG.uniform(0, 360, NUM_TREES),
+    'lean_severities': RNG.uniform(0, 20, NUM_TREES),
+    'crown_radii': RNG.uniform(3, 6, (NUM_TREES, 4)),
+    'crown_edge_heights': RNG.uniform(0.1, 0.7, (NUM_TREES, 4)),
+    'crown_shapes': RNG.uniform(0.8, 3.0, (NUM_TREES, 2, 4)),
+}
+
+
+def test_points_in_spherical_crown():
+    """Points are inside a spherical crown when within its radius."""
+    radius = 5.0
+    sphere = {
+        'stem_bases': np.array([[10.0, 20.0, 100.0]]),
+        'top_heights': np.array([2 * radius]),
+        'crown_ratios': np.ones(1),
+        'crown_radii': np.full((1, 4), radius),
+        'crown_edge_heights': np.full((1, 4), 0.5),
+        'crown_shapes': np.full((1, 2, 4), 2.0),
+    }
+    center = np.array((10.0, 20.0, 100.0 + radius))
+    points = RNG.uniform(-1.2 * radius, 1.2 * radius, (100_000, 3)) + center
+    dists = np.linalg.norm(points - center, axis=-1)
+    clear = np.abs(dists - radius) > 0.01
+
+    inside = points_in_crown(points, sphere)
+
+    assert inside.shape == (100_000,)
+    assert np.array_equal(inside[clear], dists[clear] < radius)
+
+
+def test_points_in_crown_matches_volume():
+    """Share of random points inside each crown matches the crown volume."""
+    volumes = crown_volume(TREES['top_heights'], TREES['crown_ratios'],
+                           TREES['crown_radii'], TREES['crown_edge_heights'],
+                           TREES['crown_shapes'])
+    num_points = 200_000
+
+    for tree_id in range(NUM_TREES):
+        params = {key: value[tree_id:tree_id+1] for key, value in TREES.items()}
+        params['stem_bases'] = np.zeros((1, 3))
+        params['lean_severities'] = np.zeros(1)
+        half_width = 1.5 * params['crown_radii'].max()
+        bottom = params['top_heights'][0] * (1 - params['crown_ratios'][0])
+        top = params['top_heights'][0]
+        points = np.column_stack((
+            RNG.uniform(-half_width, half_width, (num_points, 2)),
+            RNG.uniform(bottom, top, num_points),
+        ))
+        box_volume = (2 * half_width)**2 * (top - bottom)
+
+        inside = points_in_crown(points, params)
+
+        assert np.isclose(inside.mean() * box_volume, volumes[tree_id],
+                          rtol=0.03)
+
+
+def test_points_in_crown_follow_trees():
+    """Moving trees and points together does not change containment."""
+    tree_ids = RNG.integers(-1, NUM_TREES, 50_000)
+    points = TREES['stem_bases'][tree_ids] + RNG.uniform(-8, 8, (50_000, 3))
+    points[:, 2] += RNG.uniform(0, 60, 50_000)
+    shift = np.array((1000.0, -500.0, 20.0))
+    moved = dict(TREES, stem_bases=TREES['stem_bases'] + shift)
+
+    inside = points_in_crown(points, TREES, tree_ids)
+
+    assert inside.any()
+    assert not inside[tree_ids < 0].any()
+    assert np.array_equal(inside, points_in_crown(points + shift, moved, tree_ids))
+
+
+def test_points_in_crown_needs_tree_ids():
+    """Points must be matched to trees when there is more than one tree."""
+    with pytest.raises(ValueError):
+        points_in_crown(np.zeros((10, 3)), TREES)
+
+
+def test_crown_index_matches_every_crown():
+    """Indexed points are assigned to the highest crown containing them."""
+    num_trees = 60
+    trees = {
+        'stem_bases': np.column_stack((RNG.uniform(0, 60, (num_trees, 2)),
+                                       np.zeros(num_trees))),
+        'top_heights': RNG.uniform(10, 40, num_trees),
+        'crown_ratios': RNG.uniform(0.2, 0.9, num_trees),
+        'crown_radii': RNG.uniform(2, 5, (num_trees, 4)),
+        'crown_edge_heights': RNG.uniform(0.1, 0.7, (num_trees, 4)),
+        'crown_shapes': RNG.uniform(0.8, 3.0, (num_trees, 2, 4)),
+    }
+    points = np.column_stack((RNG.uniform(-10, 70, (20_000, 2)),
+                              RNG.uniform(0, 45, 20_000)))
+
+    index = CrownIndex(trees)
+    tree_ids = index.query(points)
+
+    inside = np.column_stack([
+        points_in_crown(points, trees, np.full(len(points), tree_id))
+        for tree_id in range(num_trees)
+    ])
+    highest = np.where(inside, trees['top_heights'], -np.inf).argmax(axis=1)
+    expected = np.where(inside.any(axis=1), highest, -1)
+
+    assert (tree_ids >= 0).any()
+    assert np.array_equal(tree_ids, expected)
+
+
+def test_crown_index_from_tree_list():
+    """Points away from every crown are not assigned to a tree."""
+    df = pd.DataFrame({
+        "stem_x": [0.0, 20.0],
+        "stem_y": [0.0, 0.0],
+        "species": ["A", "B"],
+        "crown_ratio": [0.5, 0.5],
+        "dbh": [10.0, 12.0],
+        "top_height": [20.0, 30.0],
+    })
+    index = CrownIndex.from_tree_list(TreeListDataFrameModel(df))
+    points = np.array([
+        [0.0, 0.0, 15.0],  # inside the first crown
+        [20.0, 0.0, 25.0],  # inside the second crown
+        [10.0, 0.0, 15.0],  # between the crowns
+        [500.0, 500.0, 15.0],  # off the grid
+    ])
+
+    assert index.num_trees == 2
+    assert index.query(points).tolist() == [0, 1, -1, -1]
@@ -0,0 +1,225 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+import rasterio
+from forest3d.utils.elevation import (
+    METHODS,
+    DemSampler,
+    cache_raster,
+    open_cached_raster,
+)
+from forest3d.utils.geometry import (_get_circular_plot_boundary,
+                                     get_elevation, get_plot_boundaries)
+
+# cells hold 1000 * row + col, so sampled values identify their cell
+TRANSFORM = rasterio.Affine(2.0, 0, 500000.0, 0, -2.0, 5200000.0)
+SHAPE = (50, 80)
+VALUES = (1000 * np.arange(SHAPE[0])[:, np.newaxis]
+          + np.arange(SHAPE[1])).astype(np.float32)
+VALUES[10, 20] = -9999
+
+
+@pytest.fixture
+def dem_path(tmp_path):
+    """A small DEM with one cell without data."""
+    path = tmp_path / "dem.tif"
+    profile = {
+        "driver": "GTiff", "height": SHAPE[0], "width": SHAPE[1], "count": 1,
+        "dtype": "float32", "transform": TRANSFORM, "nodata": -9999,
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(VALUES, 1)
+    return path
+
+
+def test_sampler_matches_cells(dem_path):
+    """Points are sampled from the cells that contain them."""
+    rng = np.random.default_rng(0)
+    rows = rng.integers(11, SHAPE[0], 1000)
+    cols = rng.integers(0, SHAPE[1], 1000)
+    xs = TRANSFORM.c + (cols + rng.uniform(0, 1, 1000)) * TRANSFORM.a
+    ys = TRANSFORM.f + (rows + rng.uniform(0, 1, 1000)) * TRANSFORM.e
+
+    with DemSampler(dem_path) as sampler:
+        elevations = sampler(xs, ys)
+        single = sampler(xs[0], ys[0])
+
+    assert np.array_equal(elevations, VALUES[rows, cols])
+    assert np.ndim(single) == 0 and single == VALUES[rows[0], cols[0]]
+    assert np.array_equal(get_elevation(dem_path, xs, ys), elevations)
+
+
+def test_sampler_missing_policies(dem_path):
+    """Points outside the DEM or without data follow the missing policy."""
+    xs = np.array([500001.0, 499999.0, 500041.0, 500001.0])
+    ys = np.array([5199999.0, 5199999.0, 5199979.0, 5199000.0])
+
+    with pytest.raises(IndexError):
+        get_elevation(dem_path, xs, ys)
+
+    with DemSampler(dem_path, missing="nan") as sampler:
+        assert np.allclose(sampler(xs, ys), [0, np.nan, np.nan, np.nan],
+                           equal_nan=True)
+
+    with DemSampler(dem_path, missing="mask") as sampler:
+        masked = sampler(xs, ys)
+        assert masked.mask.tolist() == [False, True, True, True]
+        assert masked[0] == 0
+
+    with pytest.raises(ValueError):
+        DemSampler(dem_path, missing="clip")
+
+
+def test_sampler_reads_only_blocks_queried(tmp_path):
+    """Only blocks containing points are read, within the memory budget."""
+    path = tmp_path / "tiled.tif"
+    shape = (64, 96)
+    values = np.arange(np.prod(shape), dtype=np.float32).reshape(shape)
+    profile = {
+        "driver": "GTiff", "height": shape[0], "width": shape[1], "count": 1,
+        "dtype": "float32", "transform": TRANSFORM, "tiled": True,
+        "blockxsize": 16, "blockysize": 16,
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(values, 1)
+
+    rows = np.array([0, 5, 17, 63, 40])
+    cols = np.array([0, 15, 20, 95, 95])
+    xs = TRANSFORM.c + (cols + 0.5) * TRANSFORM.a
+    ys = TRANSFORM.f + (rows + 0.5) * TRANSFORM.e
+
+    with DemSampler(path, cache_bytes=2 * 16 * 16 * 4) as sampler:
+        assert sampler.block_shape == (16, 16)
+        assert np.array_equal(sampler(xs, ys), values[rows, cols])
+        # four distinct blocks were read, but at most two are kept
+        info = sampler.cache_info()
+        assert (info.hits, info.misses) == (0, 4)
+        assert info.currbytes <= info.maxbytes
+
+        assert np.array_equal(sampler(xs[3:], ys[3:]), values[rows[3:], cols[3:]])
+        assert sampler.cache_info().hits == 2
+
+
+@pytest.mark.parametrize("method", ["bilinear", "bicubic"])
+def test_sampler_interpolates_planes(tmp_path, method):
+    """Interpolated elevations reproduce a sloping plane between cell centers
+    and the DEM at cell centers."""
+    path = tmp_path / "plane.tif"
+    shape = (40, 60)
+    rows, cols = np.mgrid[: shape[0], : shape[1]] + 0.5
+    plane = 100 + 0.3 * cols - 0.8 * rows
+    profile = {
+        "driver": "GTiff", "height": shape[0], "width": shape[1], "count": 1,
+        "dtype": "float64", "transform": TRANSFORM, "tiled": True,
+        "blockxsize": 16, "blockysize": 16,
+    }
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(plane, 1)
+
+    rng = np.random.default_rng(3)
+    point_rows = rng.uniform(2, shape[0] - 2, 500)
+    point_cols = rng.uniform(2, shape[1] - 2, 500)
+    xs = TRANSFORM.c + point_cols * TRANSFORM.a
+    ys = TRANSFORM.f + point_rows * TRANSFORM.e
+
+    with DemSampler(path, method=method) as sampler:
+        assert np.allclose(sampler(xs, ys), 100 + 0.3 * point_cols - 0.8 * point_rows)
+        centers = sampler(TRANSFORM.c + cols * TRANSFORM.a,
+                          TRANSFORM.f + rows * TRANSFORM.e)
+        assert np.allclose(centers, plane)
+    assert np.allclose(get_elevation(path, xs, ys, method=method),
+                       100 + 0.3 * point_cols - 0.8 * point_rows)
+
+
+def test_interpolation_near_missing_data(dem_path):
+    """Points interpolated from cells without data are missing."""
+    # between the centers of the cell without data and the cell after it
+    x = TRANSFORM.c + 21.0 * TRANSFORM.a
+    y = TRANSFORM.f + 10.5 * TRANSFORM.e
+
+    with DemSampler(dem_path, missing="nan", method="bilinear") as sampler:
+        assert np.isnan(sampler(x, y))
+        assert np.isclose(sampler(x, y + 3 * TRANSFORM.e), 13020.5)
+        with pytest.raises(ValueError):
+            sampler(x, y, method="spline")
+
+
+def _sample_memmap(args):
+    """Samples a memory-mapped DEM in a worker process."""
+    path, cache_dir, xs, ys = args
+    with DemSampler(path, missing="nan", memmap=True, cache_dir=cache_dir) as sampler:
+        return sampler(xs, ys)
+
+
+def test_memmap_cache(dem_path, tmp_path):
+    """DEMs are cached once, sampled like the source, and recached when the
+    source changes."""
+    cache_dir = tmp_path / "cache"
+    array_path, metadata = cache_raster(dem_path, cache_dir)
+    assert metadata["shape"] == list(SHAPE) and metadata["nodata"] == -9999
+    assert np.array_equal(np.load(array_path, mmap_mode="r"), VALUES)
+    modified = os.stat(array_path).st_mtime_ns
+    assert cache_raster(dem_path, cache_dir)[0] == array_path
+    assert os.stat(array_path).st_mtime_ns == modified
+
+    rng = np.random.default_rng(1)
+    xs = TRANSFORM.c + rng.uniform(-2, SHAPE[1] + 2, 300) * TRANSFORM.a
+    ys = TRANSFORM.f + rng.uniform(-2, SHAPE[0] + 2, 300) * TRANSFORM.e
+    for method in METHODS:
+        with DemSampler(dem_path, missing="nan", method=method) as sampler:
+            expected = sampler(xs, ys)
+        with DemSampler(dem_path, missing="nan", method=method, memmap=True,
+                        cache_dir=cache_dir) as sampler:
+            assert sampler.crs == metadata["crs"]
+            assert np.allclose(sampler(xs, ys), expected, equal_nan=True)
+
+    with ProcessPoolExecutor(2) as executor:
+        sampled = list(executor.map(_sample_memmap,
+                                    [(dem_path, cache_dir, xs, ys)] * 2))
+    assert all(np.array_equal(s, sampled[0], equal_nan=True) for s in sampled)
+
+    profile = {
+        "driver": "GTiff", "height": SHAPE[0], "width": SHAPE[1], "count": 1,
+        "dtype": "float32", "transform": TRANSFORM, "nodata": -9999,
+    }
+    with rasterio.open(dem_path, "w", **profile) as dst:
+        dst.write(VALUES + 1, 1)
+    values, metadata = open_cached_raster(dem_path, cache_dir)
+    assert np.array_equal(values, VALUES + 1)
+    assert metadata["mtime_ns"] == os.stat(dem_path).st_mtime_ns
+
+
+def test_plot_boundaries_draped(dem_path):
+    """Boundaries of many plots are generated and draped on the DEM at once."""
+    x = TRANSFORM.c + np.array([20.0, 60.0, 100.0])
+    y = TRANSFORM.f - np.array([40.0, 50.0, 70.0])
+    radius = np.array([5.0, 10.0, 15.0])
+
+    xs, ys, zs = get_plot_boundaries(x, y, radius, num_vertices=12)
+    assert xs.shape == ys.shape == zs.shape == (3, 12)
+    assert np.allclose(np.hypot(xs - x[:, np.newaxis], ys - y[:, np.newaxis]),
+                       radius[:, np.newaxis])
+    assert np.allclose(xs[:, 0], xs[:, -1]) and not zs.any()
+
+    with DemSampler(dem_path, method="bilinear") as sampler:
+        _, _, draped = get_plot_boundaries(x, y, radius, 12, dem=sampler)
+        assert np.array_equal(draped, sampler(xs, ys))
+
+    single = _get_circular_plot_boundary(x[0], y[0], radius[0])
+    assert all(coords.shape == (32,) for coords in single)
+    assert _get_circular_plot_boundary(x, y, radius)[2].shape == (3, 32)
+
+
+def test_get_elevation_keeps_sampler_method(dem_path):
+    """Samplers passed to get_elevation interpolate with their own method
+    unless another method is given."""
+    # between the centers of four cells, away from the cell without data
+    x = TRANSFORM.c + 31.0 * TRANSFORM.a
+    y = TRANSFORM.f + 21.0 * TRANSFORM.e
+
+    with DemSampler(dem_path, method="bilinear") as sampler:
+        assert np.isclose(get_elevation(sampler, x, y), 20530.5)
+        assert get_elevation(sampler, x, y, method="nearest") == 21031
+    assert get_elevation(dem_path, x, y) == 21031
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from forest3d.models.dataframe import TreeListDataFrameModel
+from forest3d.utils.ensemble import MIN_SIZE, flatten_ensemble, make_ensemble
+from forest3d.utils.geometry import _make_crown_hulls
+
+RNG = np.random.default_rng(11)
+NUM_TREES = 25
+TREES = TreeListDataFrameModel(pd.DataFrame({
+    'stem_x': RNG.uniform(0, 40, NUM_TREES),
+    'stem_y': RNG.uniform(0, 40, NUM_TREES),
+    'species': ['A'] * NUM_TREES,
+    'crown_ratio': RNG.uniform(0.3, 0.8, NUM_TREES),
+    'dbh': RNG.uniform(10, 50, NUM_TREES),
+    'top_height': RNG.uniform(10, 35, NUM_TREES),
+    'crown_radius': RNG.uniform(2, 4, NUM_TREES),
+}))
+
+
+def test_ensemble_errors_have_requested_spread():
+    """Errors are drawn for every tree in every realization."""
+    params = make_ensemble(TREES, 2000, stem_location_error=0.5,
+                           height_error=1.0, crown_ratio_error=0.05,
+                           crown_radius_error=0.3, seed=1)
+
+    assert params['stem_bases'].shape == (2000, NUM_TREES, 3)
+    assert params['crown_radii'].shape == (2000, NUM_TREES, 4)
+    assert params['crown_shapes'].shape == (2000, NUM_TREES, 2, 4)
+
+    xy_errors = params['stem_bases'][..., :2] - TREES[['stem_x', 'stem_y']].values
+    height_errors = params['top_heights'] - TREES['top_height'].values
+    assert np.allclose(xy_errors.std(axis=0), 0.5, rtol=0.1)
+    assert np.allclose(height_errors.std(axis=0), 1.0, rtol=0.1)
+    assert np.allclose(params['stem_bases'][..., 2], 0)
+
+    # one measured radius per tree, so every direction shares its error
+    radii = params['crown_radii']
+    assert np.allclose(radii, radii[..., :1])
+    assert np.all(radii >= MIN_SIZE)
+    assert np.all((params['crown_ratios'] >= MIN_SIZE)
+                  & (params['crown_ratios'] <= 1))
+
+
+def test_ensemble_is_reproducible():
+    """Realizations depend only on the seed, and parameters without error
+    are unchanged."""
+    first = make_ensemble(TREES, 3, height_error=1.0, seed=5)
+    second = make_ensemble(TREES, 3, height_error=1.0, seed=5)
+
+    assert np.array_equal(first['top_heights'], second['top_heights'])
+    assert not np.array_equal(first['top_heights'][0], first['top_heights'][1])
+    assert np.array_equal(first['crown_ratios'][2], TREES['crown_ratio'].values)
+
+
+def test_ensemble_custom_distribution():
+    """Errors can be drawn from any distribution."""
+    params = make_ensemble(
+        TREES, 4, stem_location_error=lambda rng, shape: np.ones(shape))
+    assert np.allclose(params['stem_bases'][..., 0], TREES['stem_x'].values + 1)
+
+    with pytest.raises(ValueError):
+        make_ensemble(TREES, 4, height_error=lambda rng, shape: np.ones(3))
+    with pytest.raises(ValueError):
+        make_ensemble(TREES, 4, height_error=-1)
+
+
+def test_flattened_ensemble_builds_crowns():
+    """Flattened realizations can be built in a single pass."""
+    params = flatten_ensemble(make_ensemble(TREES, 3, height_error=1.0, seed=2))
+    xs, ys, zs = _make_crown_hulls(**params)
+
+    assert xs.shape[0] == 3 * NUM_TREES
+    assert np.allclose(zs.max(axis=(1, 2)), params['top_heights'], rtol=1e-3)
+
+
+def test_large_crown_ratio_errors_keep_crowns():
+    """Crown ratios pushed below zero still give crowns with some length."""
+    params = make_ensemble(TREES, 20, crown_ratio_error=1.0, seed=3)
+    assert np.any(params['crown_ratios'] == MIN_SIZE)
+
+    xs, ys, zs = _make_crown_hulls(**flatten_ensemble(params))
+    assert np.all(np.isfinite(xs) & np.isfinite(ys) & np.isfinite(zs))
+    assert np.all(zs.max(axis=(1, 2)) - zs.min(axis=(1, 2)) > 0)
+    assert np.all(xs.max(axis=(1, 2)) - xs.min(axis=(1, 2)) > 0)
@@ -2,8 +2,12 @@ import os
 
 import numpy as np
 import pytest
-from forest3d.utils.geometry import (_get_raster_bbox_as_polygon,
-                                     _get_treetop_location, get_elevation)
+from forest3d.utils.geometry import (_get_mesh_arrays, _get_mesh_tiles,
+                                     _get_point_tiles,
+                                     _get_raster_bbox_as_polygon,
+                                     _get_treetop_location, _trim_mesh,
+                                     _write_ply, get_elevation,
+                                     poisson_pipeline)
 from shapely.geometry import Polygon
 
 THIS_DIR = os.path.dirname(__file__)
@@ -105,4 +109,107 @@ def test_treetop_getter_input_arrays_diff_shapes():
         args = [x, y, z, height]
 
         with pytest.raises(ValueError):
-            _get_treetop_location(*args)
\ No newline at end of file
+            _get_treetop_location(*args)
+
+def test_poisson_pipeline_writer_optional():
+    """The PLY writer is only added when an output file is given."""
+    written = poisson_pipeline("points.laz", "mesh.ply", depth=10)
+    assert written["pipeline"][-1]["type"] == "writers.ply"
+    assert written["pipeline"][2]["depth"] == 10
+
+    in_memory = poisson_pipeline("points.laz")
+    assert [stage["type"] for stage in in_memory["pipeline"][1:]] == [
+        "filters.normal", "filters.poisson", "filters.normal"]
+
+
+def test_mesh_arrays_from_pipeline():
+    """Vertices and faces are read from the last view of a pipeline."""
+    points = np.zeros(4, dtype=[("X", float), ("Y", float), ("Z", float)])
+    points["X"] = [0, 1, 0, 1]
+    points["Z"] = [5, 6, 7, 8]
+    mesh = np.array([(0, 1, 2), (1, 3, 2)],
+                    dtype=[("A", np.uint32), ("B", np.uint32), ("C", np.uint32)])
+
+    class ExecutedPipeline:
+        arrays = [points]
+        meshes = [mesh]
+
+    vertices, faces = _get_mesh_arrays(ExecutedPipeline())
+    assert vertices.shape == (4, 3) and np.array_equal(vertices[:, 2], [5, 6, 7, 8])
+    assert faces.dtype == np.int64
+    assert faces.tolist() == [[0, 1, 2], [1, 3, 2]]
+
+
+def test_mesh_tiles_trimmed_without_overlap():
+    """Tiles overlap when read, but every face is kept by exactly one tile."""
+    tiles = _get_mesh_tiles((0, 0, 25, 10), tile_size=10, overlap=2)
+    assert len(tiles) == 3
+    assert tiles[0][0] == (-2, -2, 12, 12)
+
+    # a grid mesh over the extent, split into two triangles per cell
+    xs, ys = np.meshgrid(np.arange(26.0), np.arange(11.0))
+    vertices = np.stack((xs.ravel(), ys.ravel(), np.zeros(xs.size)), axis=-1)
+    corners = (np.arange(10)[:, np.newaxis] * 26 + np.arange(25)).ravel()
+    faces = np.concatenate((
+        np.stack((corners, corners + 1, corners + 27), axis=-1),
+        np.stack((corners, corners + 27, corners + 26), axis=-1),
+    ))
+
+    trimmed = [_trim_mesh(vertices, faces, trim) for _, trim in tiles]
+    assert sum(len(f) for _, f in trimmed) == len(faces)
+    tile_vertices, tile_faces = trimmed[2]
+    assert tile_faces.max() == len(tile_vertices) - 1
+    assert np.all(tile_vertices[tile_faces].mean(axis=1)[:, 0] >= 20)
+
+
+def test_point_tiles_match_read_bounds():
+    """Points are assigned to every tile whose read bounds contain them."""
+    bounds, tile_size, overlap = (0, 0, 35, 22), 10, 3
+    tiles = _get_mesh_tiles(bounds, tile_size, overlap)
+    rng = np.random.default_rng(4)
+    xs, ys = rng.uniform(0, 35, 2000), rng.uniform(0, 22, 2000)
+
+    points, point_tiles = _get_point_tiles(xs, ys, bounds, tile_size, overlap)
+    assert np.all(np.diff(point_tiles) >= 0)
+    for tile_id, (read_bounds, _) in enumerate(tiles):
+        left, bottom, right, top = read_bounds
+        inside = (xs >= left) & (xs < right) & (ys >= bottom) & (ys < top)
+        assert set(points[point_tiles == tile_id]) == set(np.flatnonzero(inside))
+
+    with pytest.raises(ValueError):
+        _get_mesh_tiles(bounds, tile_size, overlap=5)
+
+
+def test_write_ply(tmp_path):
+    """Meshes of tiles are written, one at a time, to a binary PLY file."""
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 1.5]])
+    faces = np.array([[0, 1, 2]])
+    meshes = []
+    for tile in range(2):
+        meshes.append((str(tmp_path / f"{tile}_vertices.npy"),
+                       str(tmp_path / f"{tile}_faces.npy")))
+        np.save(meshes[-1][0], vertices + tile)
+        np.save(meshes[-1][1], faces)
+    path = tmp_path / "mesh.ply"
+    _write_ply(path, meshes)
+
+    data = path.read_bytes()
+    header, body = data.split(b"end_header\n")
+    assert b"element vertex 6" in header and b"element face 2" in header
+    assert len(body) == 6 * 3 * 8 + 2 * (1 + 3 * 4)
+    assert np.array_equal(np.frombuffer(body[:144], "<f8").reshape(6, 3),
+                          np.concatenate((vertices, vertices + 1)))
+    records = np.frombuffer(body[144:], [("count", "u1"), ("indices", "<i4", 3)])
+    assert records["count"].tolist() == [3, 3]
+    assert records["indices"].tolist() == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_write_ply_without_meshes(tmp_path):
+    """A PLY file without vertices or faces is written when no tile has a
+    mesh."""
+    path = tmp_path / "empty.ply"
+    _write_ply(path, [])
+
+    header, body = path.read_bytes().split(b"end_header\n")
+    assert b"element vertex 0" in header and b"element face 0" in header
+    assert body == b""
@@ -1,9 +1,27 @@
 import os
 
 import numpy as np
+import pytest
 from forest3d.models.dataclass import Tree
-from forest3d.utils.geometry import (_get_hull_apex_and_base,
-                                     _get_treetop_location)
+from forest3d.utils.geometry import (CROWN_RESOLUTIONS, CrownShapeCache,
+                                     _get_hull_apex_and_base,
+                                     _get_peripheral_points,
+                                     _get_treetop_location, _make_crown_hull,
+                                     _make_crown_hulls, _make_forest_mesh,
+                                     get_crown_faces)
+
+RNG = np.random.default_rng(42)
+NUM_TREES = 20
+BATCH = {
+    'stem_bases': RNG.uniform(-50, 50, (NUM_TREES, 3)),
+    'top_heights': RNG.uniform(10, 60, NUM_TREES),
+    'crown_ratios': RNG.uniform(0.2, 0.9, NUM_TREES),
+    'lean_directions': RNG.uniform(0, 360, NUM_TREES),
+    'lean_severities': RNG.uniform(0, 20, NUM_TREES),
+    'crown_radii': RNG.uniform(1, 8, (NUM_TREES, 4)),
+    'crown_edge_heights': RNG.uniform(0.1, 0.7, (NUM_TREES, 4)),
+    'crown_shapes': RNG.uniform(0.8, 3.0, (NUM_TREES, 2, 4)),
+}
 
 
 def test_stem_x_hull_isolation():
@@ -136,4 +154,202 @@ def test_hull_apex_and_base_consisten():
     base2 = (tree.stem_x, tree.stem_y, crown_z.min())
 
     assert np.allclose(apex1, apex2)
-    assert np.allclose(base1, base2)
\ No newline at end of file
+    assert np.allclose(base1, base2)
+
+
+def test_peripheral_points_broadcast():
+    """_get_peripheral_points returns one set of points per tree for batches."""
+
+    batched = _get_peripheral_points(
+        BATCH['crown_radii'], BATCH['crown_edge_heights'],
+        BATCH['top_heights'], BATCH['crown_ratios'])
+    assert batched.shape == (NUM_TREES, 4, 3)
+
+    single = _get_peripheral_points(
+        BATCH['crown_radii'][3], BATCH['crown_edge_heights'][3],
+        BATCH['top_heights'][3], BATCH['crown_ratios'][3])
+    assert single.shape == (4, 3)
+    assert np.allclose(batched[3], single)
+
+def test_apex_and_base_broadcast():
+    """_get_hull_apex_and_base returns one apex and base per tree for batches."""
+
+    apexes, bases = _get_hull_apex_and_base(
+        BATCH['crown_radii'], BATCH['top_heights'], BATCH['crown_ratios'])
+    assert apexes.shape == bases.shape == (NUM_TREES, 3)
+
+    apex, base = _get_hull_apex_and_base(
+        BATCH['crown_radii'][5], BATCH['top_heights'][5], BATCH['crown_ratios'][5])
+    assert np.allclose(apexes[5], apex)
+    assert np.allclose(bases[5], base)
+
+def test_batched_hulls_match_single_hulls():
+    """_make_crown_hulls produces the same crowns as _make_crown_hull."""
+
+    xs, ys, zs = _make_crown_hulls(**BATCH)
+    assert xs.shape == ys.shape == zs.shape == (NUM_TREES, 50, 32)
+
+    for i in range(NUM_TREES):
+        x, y, z = _make_crown_hull(*(BATCH[key][i] for key in BATCH))
+        assert np.allclose(x, xs[i].flatten(), equal_nan=True)
+        assert np.allclose(y, ys[i].flatten(), equal_nan=True)
+        assert np.allclose(z, zs[i].flatten(), equal_nan=True)
+
+def test_batched_hulls_top_only():
+    """_make_crown_hulls masks points below maximum crown width with top_only."""
+
+    xs, ys, zs = _make_crown_hulls(**BATCH, top_only=True)
+    x, y, z = _make_crown_hull(*(BATCH[key][0] for key in BATCH), top_only=True)
+
+    assert np.allclose(np.sort(z), np.sort(zs[0][~np.isnan(zs[0])]))
+
+def test_batched_hulls_resolution():
+    """_make_crown_hulls samples crowns at the requested resolution."""
+
+    xs, ys, zs = _make_crown_hulls(**BATCH, resolution='fine')
+    assert xs.shape == (NUM_TREES, *CROWN_RESOLUTIONS['fine'])
+
+    xs, ys, zs = _make_crown_hulls(**BATCH, resolution=(7, 9))
+    x, y, z = _make_crown_hull(*(BATCH[key][0] for key in BATCH), resolution=(7, 9))
+    assert xs.shape == (NUM_TREES, 7, 9)
+    assert np.allclose(x, xs[0].flatten())
+
+def test_unknown_resolution():
+    """ValueError raised for unrecognized crown resolution names."""
+
+    with pytest.raises(ValueError):
+        _make_crown_hulls(**BATCH, resolution='ultra')
+
+def test_crown_cache_matches_uncached_crowns():
+    """Crowns from CrownShapeCache match crowns calculated from scratch."""
+
+    cache = CrownShapeCache()
+    params = [BATCH[key][0] for key in BATCH]
+    for stem_base in [(0, 0, 0), (10, -5, 300), (2.5, 7.5, 1.0)]:
+        params[0] = stem_base
+        cached = cache.make_crown_hull(*params)
+        expected = _make_crown_hull(*params)
+        for coords, expected_coords in zip(cached, expected):
+            assert np.allclose(coords, expected_coords, equal_nan=True)
+
+    info = cache.cache_info()
+    assert info.misses == 1
+    assert info.hits == 2
+    assert info.currsize == 1
+
+def test_crown_cache_lru_eviction():
+    """CrownShapeCache evicts the least recently used crown shape."""
+
+    cache = CrownShapeCache(maxsize=2)
+    trees = [[BATCH[key][i] for key in BATCH] for i in range(3)]
+    cache.make_crown_hull(*trees[0])
+    cache.make_crown_hull(*trees[1])
+    cache.make_crown_hull(*trees[0])  # tree 1 is now least recently used
+    cache.make_crown_hull(*trees[2])  # evicts tree 1
+    assert len(cache) == 2
+
+    cache.make_crown_hull(*trees[0])
+    assert cache.cache_info().hits == 2
+    cache.make_crown_hull(*trees[1])
+    assert cache.cache_info().misses == 4
+
+def test_tree_with_crown_cache():
+    """Trees sharing a cache reuse crown shapes when only location changes."""
+
+    cache = CrownShapeCache()
+    x1, y1, z1 = Tree(species='Douglas-fir', dbh=7.5, top_height=85,
+                      stem_x=0, stem_y=0, crown_cache=cache).crown
+    x2, y2, z2 = Tree(species='Douglas-fir', dbh=7.5, top_height=85,
+                      stem_x=10, stem_y=0, crown_cache=cache).crown
+
+    assert cache.cache_info().hits == 1
+    assert np.allclose(x1 + 10, x2)
+    assert np.allclose(y1, y2)
+
+def test_crown_hull_out_buffers():
+    """_make_crown_hull writes into and returns caller-supplied arrays."""
+
+    params = [BATCH[key][0] for key in BATCH]
+    out = tuple(np.full(50 * 32, np.nan) for _ in range(3))
+    result = _make_crown_hull(*params, out=out)
+    expected = _make_crown_hull(*params)
+
+    for result_coords, out_coords, expected_coords in zip(result, out, expected):
+        assert result_coords is out_coords
+        assert np.allclose(out_coords, expected_coords)
+
+def test_batched_hulls_out_buffers():
+    """_make_crown_hulls writes into caller-supplied arrays."""
+
+    out = tuple(np.empty((NUM_TREES, 50, 32)) for _ in range(3))
+    _make_crown_hulls(**BATCH, out=out)
+    expected = _make_crown_hulls(**BATCH)
+
+    for out_coords, expected_coords in zip(out, expected):
+        assert np.allclose(out_coords, expected_coords)
+
+def test_crown_hull_invalid_out_buffers():
+    """ValueError raised for out arrays of the wrong size or with top_only."""
+
+    params = [BATCH[key][0] for key in BATCH]
+    with pytest.raises(ValueError):
+        _make_crown_hull(*params, out=tuple(np.empty(10) for _ in range(3)))
+    with pytest.raises(ValueError):
+        _make_crown_hull(*params, top_only=True,
+                         out=tuple(np.empty(50 * 32) for _ in range(3)))
+
+def test_float32_hulls_agree_with_float64():
+    """Single precision crowns agree with double precision within tolerance."""
+
+    xs64, ys64, zs64 = _make_crown_hulls(**BATCH)
+    xs32, ys32, zs32 = _make_crown_hulls(**BATCH, dtype=np.float32)
+    for coords32, coords64 in ((xs32, xs64), (ys32, ys64), (zs32, zs64)):
+        assert coords32.dtype == np.float32
+        assert np.allclose(coords32, coords64, atol=1e-3, equal_nan=True)
+
+    params = [BATCH[key][0] for key in BATCH]
+    single32 = _make_crown_hull(*params, dtype=np.float32)
+    single64 = _make_crown_hull(*params)
+    for coords32, coords64 in zip(single32, single64):
+        assert coords32.dtype == np.float32
+        assert np.allclose(coords32, coords64, atol=1e-3)
+
+def test_tree_float32_crown():
+    """Trees can generate single precision crowns."""
+
+    tree = Tree(species='Douglas-fir', dbh=7.5, top_height=85,
+                stem_x=0, stem_y=0, dtype=np.float32)
+    x, y, z = tree.crown
+    assert tree.dtype == 'float32'
+    assert x.dtype == y.dtype == z.dtype == np.float32
+
+def test_crown_faces_closed_surface():
+    """Crown faces form a closed, consistently oriented surface."""
+
+    faces = get_crown_faces('coarse')
+    assert faces is get_crown_faces(CROWN_RESOLUTIONS['coarse'])
+
+    # every directed edge is shared with exactly one reversed edge
+    edges = np.concatenate((faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]))
+    directed = set(map(tuple, edges))
+    assert len(directed) == len(edges)
+    assert all((end, start) in directed for start, end in directed)
+
+def test_crown_faces_point_outward():
+    """Crown faces enclose a positive volume, i.e., normals point outward."""
+
+    x, y, z = _make_crown_hull(*(BATCH[key][0] for key in BATCH))
+    vertices = np.stack((x, y, z), axis=-1)
+    a, b, c = (vertices[idx] for idx in get_crown_faces().T)
+    volume = np.einsum('ij,ij->i', a, np.cross(b, c)).sum() / 6
+    assert volume > 0
+
+def test_forest_mesh_offsets_faces():
+    """Faces of each tree in a forest mesh refer to that tree's vertices."""
+
+    vertices, faces = _make_forest_mesh(*_make_crown_hulls(**BATCH))
+    crown_faces = get_crown_faces()
+    assert vertices.shape == (NUM_TREES * 50 * 32, 3)
+    assert faces.shape == (NUM_TREES * len(crown_faces), 3)
+    assert np.array_equal(faces[-len(crown_faces):],
+                          crown_faces + (NUM_TREES - 1) * 50 * 32)
@@ -0,0 +1,67 @@
+import numpy as np
+from forest3d.utils.geometry import _make_crown_hulls, _make_forest_mesh
+from forest3d.utils.metrics import (crown_projected_area, crown_surface_area,
+                                    crown_volume)
+
+RNG = np.random.default_rng(7)
+NUM_TREES = 10
+CROWNS = {
+    'top_heights': RNG.uniform(10, 60, NUM_TREES),
+    'crown_ratios': RNG.uniform(0.2, 0.9, NUM_TREES),
+    'crown_radii': RNG.uniform(1, 8, (NUM_TREES, 4)),
+    'crown_edge_heights': RNG.uniform(0.1, 0.7, (NUM_TREES, 4)),
+    'crown_shapes': RNG.uniform(0.8, 3.0, (NUM_TREES, 2, 4)),
+}
+
+
+def _spheres(radius, num_trees=3):
+    """Crown parameters of spherical crowns resting on the ground."""
+    return {
+        'top_heights': np.full(num_trees, 2 * radius),
+        'crown_ratios': np.ones(num_trees),
+        'crown_radii': np.full((num_trees, 4), radius),
+        'crown_edge_heights': np.full((num_trees, 4), 0.5),
+        'crown_shapes': np.full((num_trees, 2, 4), 2.0),
+    }
+
+
+def test_sphere_metrics():
+    """Metrics of a spherical crown match closed-form values."""
+    radius = 5.0
+    spheres = _spheres(radius)
+
+    volume = crown_volume(**spheres)
+    projected_area = crown_projected_area(**spheres)
+    surface_area = crown_surface_area(**spheres)
+
+    assert volume.shape == projected_area.shape == surface_area.shape == (3,)
+    assert np.allclose(volume, 4 / 3 * np.pi * radius**3, rtol=1e-5)
+    assert np.allclose(projected_area, np.pi * radius**2, rtol=1e-3)
+    assert np.allclose(surface_area, 4 * np.pi * radius**2, rtol=1e-2)
+
+
+def test_volume_matches_mesh():
+    """Crown volumes agree with the volume enclosed by fine crown meshes."""
+    num_trees = len(CROWNS['top_heights'])
+    xs, ys, zs = _make_crown_hulls(np.zeros((num_trees, 3)),
+                                   lean_directions=None,
+                                   lean_severities=None,
+                                   resolution=(200, 180),
+                                   **CROWNS)
+
+    mesh_volumes = []
+    for i in range(num_trees):
+        vertices, faces = _make_forest_mesh(xs[i:i+1], ys[i:i+1], zs[i:i+1])
+        a, b, c = (vertices[faces[:, j]] for j in range(3))
+        mesh_volumes.append(np.einsum('ij,ij->i', a, np.cross(b, c)).sum() / 6)
+
+    assert np.allclose(crown_volume(**CROWNS), mesh_volumes, rtol=1e-2)
+
+
+def test_projected_area_contains_crown_radii():
+    """Projected area encloses the quadrilateral joining the crown radii."""
+    area = crown_projected_area(**CROWNS)
+    radii = CROWNS['crown_radii']
+    inner_area = (radii[:, 0] + radii[:, 2]) * (radii[:, 1] + radii[:, 3]) / 2
+
+    assert np.all(area > inner_area)
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+import rasterio
+from forest3d.utils.containment import CrownIndex
+from forest3d.utils.raster import CrownRasterizer, RasterGrid
+
+RNG = np.random.default_rng(5)
+NUM_TREES = 40
+TREES = {
+    'stem_bases': np.column_stack((RNG.uniform(0, 50, (NUM_TREES, 2)),
+                                   RNG.uniform(0, 2, NUM_TREES))),
+    'top_heights': RNG.uniform(10, 40, NUM_TREES),
+    'crown_ratios': RNG.uniform(0.2, 0.9, NUM_TREES),
+    'lean_directions': RNG.uniform(0, 360, NUM_TREES),
+    'lean_severities': RNG.uniform(0, 10, NUM_TREES),
+    'crown_radii': RNG.uniform(2, 5, (NUM_TREES, 4)),
+    'crown_edge_heights': RNG.uniform(0.1, 0.7, (NUM_TREES, 4)),
+    'crown_shapes': RNG.uniform(0.8, 3.0, (NUM_TREES, 2, 4)),
+}
+GRID = RasterGrid(origin=(-10, 60), cell_size=0.5, shape=(140, 140))
+
+
+def test_grid_from_profile():
+    """A grid copied from a rasterio profile has the same transform."""
+    transform = rasterio.Affine(0.5, 0, 500000.0, 0, -0.5, 5200000.0)
+    grid = RasterGrid.from_profile(
+        {'transform': transform, 'height': 100, 'width': 200})
+
+    assert grid.transform == transform
+    assert grid.shape == (100, 200)
+    assert grid.bounds == (500000.0, 5199950.0, 500100.0, 5200000.0)
+
+    with pytest.raises(ValueError):
+        RasterGrid.from_profile({'transform': rasterio.Affine(0.5, 0, 0, 0, -1, 0),
+                                 'height': 1, 'width': 1})
+
+
+def test_rasterize_sphere():
+    """Rasterized spherical crown matches the height of the sphere."""
+    radius = 5.0
+    sphere = {
+        'stem_bases': np.array([[0.0, 0.0, 100.0]]),
+        'top_heights': np.array([2 * radius]),
+        'crown_ratios': np.ones(1),
+        'crown_radii': np.full((1, 4), radius),
+        'crown_edge_heights': np.full((1, 4), 0.5),
+        'crown_shapes': np.full((1, 2, 4), 2.0),
+    }
+    grid = RasterGrid(origin=(-8, 8), cell_size=0.25, shape=(64, 64))
+    xs, ys = np.meshgrid(*grid.cell_centers())
+    dists = np.hypot(xs, ys)
+
+    chm = CrownRasterizer(sphere).rasterize(grid, fill_value=-1)
+
+    covered = dists < radius
+    expected = 100 + radius + np.sqrt(radius**2 - dists[covered]**2)
+    assert np.allclose(chm[covered], expected)
+    assert np.all(chm[dists > radius + 1e-6] == -1)
+
+
+def test_rasterize_is_top_of_crowns():
+    """Cells hold the height of the highest crown surface above them."""
+    chm = CrownRasterizer(TREES).rasterize(GRID)
+    xs, ys = np.meshgrid(*GRID.cell_centers())
+    covered = chm > 0
+    index = CrownIndex(TREES)
+
+    below = np.column_stack((xs[covered], ys[covered], chm[covered] - 1e-3))
+    above = np.column_stack((xs[covered], ys[covered], chm[covered] + 1e-3))
+
+    assert covered.mean() > 0.2
+    assert np.mean(index.query(below) >= 0) > 0.99
+    assert np.all(index.query(above) == -1)
+
+
+def test_rasterize_in_tiles():
+    """Rasterizing in small tiles gives the same raster."""
+    rasterizer = CrownRasterizer(TREES)
+    chm = rasterizer.rasterize(GRID)
+    out = np.zeros(GRID.shape, dtype=np.float32)
+
+    tiled = rasterizer.rasterize(GRID, tile_shape=(33, 17), out=out)
+
+    assert tiled is out
+    assert np.allclose(tiled, chm, atol=1e-4)
+
+
+def test_rasterize_moved_trees():
+    """Moving and rotating trees moves and rotates the raster."""
+    rasterizer = CrownRasterizer(TREES)
+    center = (25.0, 25.0)
+    grid = RasterGrid(origin=(-10, 60), cell_size=0.5, shape=(140, 140))
+    chm = rasterizer.rasterize(grid, center=center)
+
+    moved = rasterizer.rasterize(grid, dx=1.0, dy=-1.5, dz=2.0, center=center)
+    assert np.allclose(moved[3:, 2:], np.where(chm > 0, chm + 2, 0)[:-3, :-2])
+
+    rotated = rasterizer.rasterize(grid, rotation=90, center=center)
+    assert np.allclose(rotated, np.rot90(chm))
+
+
+def test_grid_window():
+    """Windows cover the cells overlapping a bounding box."""
+    rows, cols = GRID.window((0, 10, 20.2, 40))
+    subgrid = GRID.subgrid(rows, cols)
+
+    assert (rows, cols) == (slice(40, 100), slice(20, 61))
+    assert subgrid.shape == (60, 41)
+    assert np.allclose(subgrid.origin, (0, 40))
+    assert GRID.window((-100, -100, -50, -50)) == (slice(140, 140), slice(0, 0))
+
+
+def test_grid_coarsen():
+    """Coarser grids share the origin and cover partial blocks."""
+    coarse = RasterGrid((0, 10), 0.5, (7, 4)).coarsen(3)
+
+    assert coarse.shape == (3, 2)
+    assert coarse.cell_size == 1.5
+    assert np.allclose(coarse.origin, (0, 10))
+
+
+def test_rasterize_tree_offsets():
+    """Moving every tree by the same offset moves the whole plot."""
+    rasterizer = CrownRasterizer(TREES)
+    center = (25, 25)
+    offsets = np.tile((1.0, -1.5), (rasterizer.num_trees, 1))
+
+    assert np.allclose(
+        rasterizer.rasterize(GRID, center=center, tree_offsets=offsets),
+        rasterizer.rasterize(GRID, dx=1.0, dy=-1.5, center=center),
+    )
+    with pytest.raises(ValueError):
+        rasterizer.rasterize(GRID, tree_offsets=offsets[1:])
@@ -7,8 +7,9 @@ import numpy as np
 import pandas as pd
 import seaborn as sns
 from forest3d.models.dataclass import Tree
-from forest3d.models.dataframe import TreeListDataFrameModel
-from forest3d.utils.geometry import get_elevation
+from forest3d.models.dataframe import TreeListDataFrameModel, _get_crown_parameters
+from forest3d.utils.elevation import DemSampler
+from forest3d.utils.geometry import _make_crown_hulls, get_elevation
 from ipywidgets import Accordion, FloatSlider, HBox, Layout, Text, VBox
 
 warnings.filterwarnings("ignore", message="invalid value encountered in double_scalars")
@@ -307,7 +308,9 @@ def plot_tree_with_widgets():
     return HBox([controls, tree_scatter], layout=Layout(width="100%"))
 
 
-def plot_tree_list(trees: TreeListDataFrameModel, dem=None, sample=None):
+def plot_tree_list(
+    trees: TreeListDataFrameModel, dem=None, sample=None, resolution="default"
+):
     """Plots an interactive 3D view of a tree list.
 
     Parameters
@@ -316,19 +319,25 @@ def plot_tree_list(trees: TreeListDataFrameModel, dem=None, sample=None):
     dem : path to elevation raster
         raster readable by rasterio, will be used to calculate elevation on
         a grid and produce
+    resolution : string, or tuple of two ints
+        level of detail of the tree crowns, either the name of a preset in
+        CROWN_RESOLUTIONS or the (number of heights, number of angles) at
+        which to sample each crown surface
     """
     spp = pd.unique(trees.species)
     palette = sns.color_palette("colorblind", len(spp))
 
     # get elevation raster to display as surface underneath trees
     if dem is not None:
-        # calculate z locations of the tree stems based on the dem
-        trees["stem_z"] = get_elevation(dem, trees["stem_x"], trees["stem_y"])
-        # calculate a dem to display as a surface in the plot
         xs = np.linspace(trees.stem_x.min(), trees.stem_x.max(), 100)
         ys = np.linspace(trees.stem_y.min(), trees.stem_y.max(), 100)
         xx, yy = np.meshgrid(xs, ys)
-        elevation = get_elevation(dem, xx.flatten(), yy.flatten())
+        # open the dem once for both the stems and the surface
+        with DemSampler(dem, method="bilinear") as sampler:
+            # calculate z locations of the tree stems based on the dem
+            trees["stem_z"] = get_elevation(sampler, trees["stem_x"], trees["stem_y"])
+            # calculate a dem to display as a surface in the plot
+            elevation = get_elevation(sampler, xx.flatten(), yy.flatten())
         elevation_surface = elevation.reshape(xs.shape[0], ys.shape[0])
     else:
         if "stem_z" not in trees.columns:
@@ -341,27 +350,21 @@ def plot_tree_list(trees: TreeListDataFrameModel, dem=None, sample=None):
     else:
         pass
 
+    # calculate the crown coordinates of all trees at once, including any
+    # optional columns of crown radii, shapes, edge heights, and lean
+    crown_xs, crown_ys, crown_zs = _make_crown_hulls(
+        **_get_crown_parameters(trees), resolution=resolution
+    )
+
     ipv.figure(width=800)
-    for _, row in trees.iterrows():
-        # calculate the tree's crown coordinates
-        tree = Tree(
-            species=row.species,
-            dbh=row.dbh,
-            top_height=row.top_height,
-            stem_x=row.stem_x,
-            stem_y=row.stem_y,
-            stem_z=row.stem_z,
-            crown_ratio=row.crown_ratio,
-            crown_radius=row.crown_radius,
-        )
-        x, y, z = tree.crown
+    for i, species in enumerate(trees.species):
         # find out the spp index to give it a unique color
-        spp_idx = np.where(spp == row.species)[0][0]
+        spp_idx = np.where(spp == species)[0][0]
         # plot the tree crown
         ipv.plot_surface(
-            x.reshape((50, 32)),
-            y.reshape((50, 32)),
-            z.reshape((50, 32)),
+            crown_xs[i],
+            crown_ys[i],
+            crown_zs[i],
             color=[palette[spp_idx]],
         )
     if dem is not None: